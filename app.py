@@ -1,47 +1,149 @@
-from flask import Flask, request, jsonify, render_template, redirect, url_for, current_app, send_file
+from flask import Blueprint, Flask, request, jsonify, render_template, redirect, url_for, current_app, Response, stream_with_context, abort
 from config import Config
-from database import db
+from database import db, init_db, read_engine
+from migrations import upgrade, current_version
 from models import *
 from services.enhanced_dispatch_service import EnhancedDispatchService
 from services.cad_service import CADService
-import io
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
+from services.spatial_index import SpatialIndex
+from services.counters import StatisticsCounters
+from services.broadcaster import EventBroadcaster
+from services.job_queue import JobQueue
+from services.dispatch_scheduler import DispatchScheduler, AssignmentPlanner
+from services.state_cache import HotStateCache
+from services.report_engine import ReportEngine
+from services.classifier import IncidentClassifier, load_lexicon
+from services.archive import CallArchive
+from services.fleet import FleetSnapshot
+from services.outbox import OutboxRelay, make_transport
+from services.telemetry import TelemetryPipeline
+from services.rollups import RollupStore
+from services.coordination import ClusterBroadcaster, ClusterCounters, DatabaseCoordinator, SharedReportStore
+from services import instrumentation
+import click
+import datetime
+import json
+import random
+import threading
 
-app = Flask(__name__)
-app.config.from_object(Config)
-db.init_app(app)
+bp = Blueprint("dispatch", __name__, cli_group=None)
 
-with app.app_context():
-    db.create_all()
 
-    # DEVELOPMENT ONLY: Clear all units for a fresh start
-    EmergencyUnit.query.delete()
-    db.session.commit()
+class DispatchApp(Flask):
+    """Flask app whose dispatch services are built on first use rather than at startup"""
 
-    # Add 5 units per type if none exist
-    if EmergencyUnit.query.count() == 0:
-        for i in range(1, 6):
-            db.session.add(EmergencyUnit(unit_id=f"POLICE-{i:02d}", service_type=EmergencyType.POLICE))
-        for i in range(1, 6):
-            db.session.add(EmergencyUnit(unit_id=f"FIRE-{i:02d}", service_type=EmergencyType.FIRE))
-        for i in range(1, 6):
-            db.session.add(EmergencyUnit(unit_id=f"EMS-{i:02d}", service_type=EmergencyType.MEDICAL))
-        db.session.commit()
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._services = None
+        self._services_lock = threading.Lock()
 
-    # Only add dispatcher if not already present
-    if not Dispatcher.query.filter_by(dispatcher_id="DISP-001").first():
-        dispatcher = Dispatcher(
-            dispatcher_id="DISP-001",
-            name="John Dispatcher"
+    def services(self):
+        """The shared services, built once (needs an application context the first time)"""
+        if self._services is None:
+            with self._services_lock:
+                if self._services is None:
+                    self._services = build_services(self)
+        return self._services
+
+    dispatch_service = property(lambda self: self.services()["dispatch_service"])
+    cad_service = property(lambda self: self.services()["cad_service"])
+    job_queue = property(lambda self: self.services()["job_queue"])
+    scheduler = property(lambda self: self.services()["scheduler"])
+    outbox_relay = property(lambda self: self.services()["outbox_relay"])
+    telemetry = property(lambda self: self.services()["telemetry"])
+    report_engine = property(lambda self: self.services()["report_engine"])
+    rollups = property(lambda self: self.services()["rollups"])
+    coordinator = property(lambda self: self.services()["coordinator"])
+
+
+def build_services(app):
+    coordinator = None
+    if app.config['CLUSTER_MODE']:
+        coordinator = DatabaseCoordinator(
+            app, worker_id=app.config['CLUSTER_WORKER_ID'], interval=app.config['CLUSTER_SYNC_INTERVAL'],
+            retention=app.config['CLUSTER_EVENT_RETENTION'], lease_seconds=app.config['CLUSTER_LEASE_SECONDS'],
+            recount_interval=app.config['CLUSTER_RECOUNT_INTERVAL']
         )
-        db.session.add(dispatcher)
-        db.session.commit()
+        counters, broadcaster = ClusterCounters(coordinator), ClusterBroadcaster(coordinator)
+    else:
+        counters, broadcaster = StatisticsCounters(), EventBroadcaster()
+    lexicon_path = app.config['CLASSIFIER_LEXICON']
+    classifier = IncidentClassifier(load_lexicon(lexicon_path)) if lexicon_path else None
+    state_cache = HotStateCache()
+    rollups = RollupStore()
+    dispatch_service = EnhancedDispatchService(spatial_index=SpatialIndex(
+        cell_km=app.config['SPATIAL_INDEX_CELL_KM'],
+        reference_latitude=app.config['DISPATCH_REFERENCE_LATITUDE']
+    ), counters=counters, broadcaster=broadcaster, state_cache=state_cache, classifier=classifier,
+        fleet=FleetSnapshot(reference_latitude=app.config['DISPATCH_REFERENCE_LATITUDE']), rollups=rollups)
+    job_queue = JobQueue(app, workers=app.config['JOB_QUEUE_WORKERS'], broadcaster=dispatch_service.broadcaster)
+    dispatch_service.job_queue = job_queue
+    scheduler = DispatchScheduler(
+        app, dispatch_service,
+        planner=AssignmentPlanner(time_budget=app.config['SCHEDULER_TIME_BUDGET']),
+        interval=app.config['SCHEDULER_INTERVAL'], coordinator=coordinator
+    )
+    if app.config['SCHEDULER_ENABLED']:
+        scheduler.start()
+    outbox_relay = OutboxRelay(
+        app, make_transport(app.config['OUTBOX_TRANSPORT'], app.config['OUTBOX_FILE']),
+        batch_size=app.config['OUTBOX_BATCH_SIZE'], interval=app.config['OUTBOX_FLUSH_INTERVAL'],
+        max_attempts=app.config['OUTBOX_MAX_ATTEMPTS'], backoff=app.config['OUTBOX_BACKOFF_SECONDS'],
+        max_backoff=app.config['OUTBOX_MAX_BACKOFF_SECONDS']
+    )
+    if app.config['OUTBOX_RELAY_ENABLED']:
+        outbox_relay.start()
+    telemetry = TelemetryPipeline(app, dispatch_service, interval=app.config['TELEMETRY_FLUSH_INTERVAL'],
+                                  max_batch=app.config['TELEMETRY_MAX_BATCH'])
+    dispatch_service.telemetry = telemetry
+    if app.config['TELEMETRY_ENABLED']:
+        telemetry.start()
+    if coordinator is not None:
+        # Views first, so dashboards never hear of a change before this worker's caches have it
+        coordinator.subscribe(dispatch_service.apply_remote_events)
+        coordinator.subscribe(job_queue.apply_remote_events)
+        coordinator.subscribe(broadcaster.deliver)
+        coordinator.start()
+    return {
+        "dispatch_service": dispatch_service,
+        "cad_service": CADService(counters=counters, state_cache=state_cache, fleet=dispatch_service.fleet),
+        "job_queue": job_queue,
+        "scheduler": scheduler,
+        "outbox_relay": outbox_relay,
+        "telemetry": telemetry,
+        "report_engine": ReportEngine(counters, dispatch_service.analytics, job_queue, rollups=rollups,
+                                      store=SharedReportStore() if coordinator is not None else None),
+        "rollups": rollups,
+        "coordinator": coordinator
+    }
 
-    app.dispatch_service = EnhancedDispatchService()
-    app.cad_service = CADService()
 
-@app.route("/")
+def create_app(config=None):
+    """Application factory; config overrides Config. Schema and seed data are CLI commands (init-db, seed-units)"""
+    app = DispatchApp(__name__)
+    app.config.from_object(Config)
+    app.config.update(config or {})
+    init_db(app)
+    app.profiler = instrumentation.SamplingProfiler(
+        interval=app.config['PROFILER_INTERVAL_MS'] / 1000,
+        slow_seconds=app.config['PROFILER_SLOW_MS'] / 1000,
+        output_dir=app.config['PROFILER_DIR']
+    )
+    if app.config['METRICS_ENABLED']:
+        with app.app_context():
+            for engine in db.engines.values():
+                instrumentation.watch_engine(engine)
+        instrumentation.init_app(app, app.profiler)
+        if app.config['PROFILER_ENABLED']:
+            app.profiler.start()
+    app.register_blueprint(bp)
+    if app.config['SCHEDULER_ENABLED']:
+        # The scheduler works without any request arriving, so start it now
+        with app.app_context():
+            app.services()
+    return app
+
+@bp.route("/")
 def index():
     active_calls = current_app.cad_service.get_active_calls()
     available_units = current_app.cad_service.get_unit_status()
@@ -51,7 +153,17 @@ def index():
                            available_units=available_units,
                            stats=stats)
 
-@app.route("/log_call", methods=["GET", "POST"])
+@bp.route("/events")
+def events():
+    """Server-sent event stream of dashboard changes, shared by all consoles"""
+    last_event_id = request.headers.get("Last-Event-ID", type=int)
+    return Response(
+        current_app.dispatch_service.broadcaster.stream(last_event_id),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@bp.route("/log_call", methods=["GET", "POST"])
 def log_call():
     if request.method == "POST":
         data = request.form
@@ -59,26 +171,90 @@ def log_call():
             caller_name=data["caller_name"],
             phone=data["phone_number"],
             location=data["location"],
-            emergency_type=EmergencyType[data["emergency_type"]]
+            emergency_type=EmergencyType[data["emergency_type"]],
+            latitude=data.get("latitude", type=float),
+            longitude=data.get("longitude", type=float)
         )
-        return redirect(url_for("index"))
+        return redirect(url_for("dispatch.index"))
     return render_template("log_call.html")
 
-@app.route("/select_unit/<int:call_id>")
+@bp.route("/api/calls/batch", methods=["POST"])
+def log_call_batch():
+    try:
+        call_ids = current_app.dispatch_service.log_emergency_calls(request.json["calls"])
+        return jsonify({"success": True, "call_ids": call_ids})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"success": False, "error": str(e)}), 400
+
+@bp.route("/api/classify", methods=["POST"])
+def classify_transcripts():
+    try:
+        transcripts = request.json["transcripts"]
+        return jsonify({"success": True, "results": current_app.dispatch_service.classify_transcripts(transcripts)})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+@bp.route("/select_unit/<int:call_id>")
 def select_unit(call_id):
-    call = EmergencyCall.query.get_or_404(call_id)
-    units = EmergencyUnit.query.filter_by(availability_status=True).all()
+    call = current_app.cad_service.get_call(call_id)
+    if call is None:
+        abort(404)
+    units = current_app.cad_service.units_for_call(call)
     return render_template("select_unit.html", call=call, units=units)
 
-@app.route("/dispatch/<int:call_id>/<int:unit_id>")
+@bp.route("/dispatch/<int:call_id>/<int:unit_id>")
 def dispatch_unit(call_id, unit_id):
     try:
         unit = current_app.dispatch_service.dispatch_unit(call_id, unit_id)
-        return redirect(url_for("index"))
+        return redirect(url_for("dispatch.index"))
     except Exception as e:
         return render_template("error.html", message=str(e)), 400
 
-@app.route("/update_status/<int:call_id>", methods=["POST"])
+@bp.route("/dispatch/<int:call_id>/auto", methods=["POST"])
+def auto_dispatch(call_id):
+    try:
+        job = current_app.dispatch_service.request_dispatch(call_id)
+        return jsonify({"success": True, "job_id": job.id}), 202
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+@bp.route("/jobs/<job_id>")
+def job_status(job_id):
+    status = current_app.job_queue.status(job_id)
+    if status is None:
+        return jsonify({"success": False, "error": "Job not found"}), 404
+    return jsonify(status)
+
+@bp.route("/scheduler/tick", methods=["POST"])
+def scheduler_tick():
+    tick = current_app.scheduler.tick_if_leader()
+    if tick is None:
+        return jsonify({"success": False, "error": "Another worker holds the dispatch scheduler lease"}), 409
+    return jsonify(tick)
+
+@bp.route("/scheduler")
+def scheduler_status():
+    return jsonify({
+        "running": current_app.scheduler.running,
+        "interval": current_app.scheduler.interval,
+        "last_tick": current_app.scheduler.last_tick
+    })
+
+@bp.route("/outbox")
+def outbox_status():
+    return jsonify(current_app.outbox_relay.stats())
+
+@bp.route("/outbox/flush", methods=["POST"])
+def outbox_flush():
+    return jsonify(current_app.outbox_relay.flush())
+
+@bp.route("/cluster")
+def cluster_status():
+    coordinator = current_app.coordinator
+    return jsonify(coordinator.stats() if coordinator is not None else {"mode": "single"})
+
+@bp.route("/update_status/<int:call_id>", methods=["POST"])
 def update_status(call_id):
     try:
         new_status = CallStatus[request.json["status"]]
@@ -87,7 +263,26 @@ def update_status(call_id):
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 400
 
-@app.route("/submit_report/<int:call_id>", methods=["POST"])
+@bp.route("/api/calls/status", methods=["POST"])
+def bulk_update_status():
+    """Move many calls at once: {"call_ids": [...], "status": "COMPLETED"} or {"changes": {"12": "ON_SCENE"}}"""
+    try:
+        data = request.json
+        if "changes" in data:
+            changes = {int(call_id): CallStatus[status] for call_id, status in data["changes"].items()}
+        else:
+            changes = dict.fromkeys((int(call_id) for call_id in data["call_ids"]), CallStatus[data["status"]])
+        applied = current_app.dispatch_service.update_call_statuses(changes)
+        return jsonify({"success": True, "updated": len(applied)})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+@bp.route("/api/calls/<int:call_id>/transitions")
+def call_transitions(call_id):
+    transitions = CallTransition.query.filter_by(call_id=call_id).order_by(CallTransition.id).all()
+    return jsonify([transition.to_dict() for transition in transitions])
+
+@bp.route("/submit_report/<int:call_id>", methods=["POST"])
 def submit_report(call_id):
     try:
         report_data = request.json["details"]
@@ -96,72 +291,313 @@ def submit_report(call_id):
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 400
 
-@app.route("/statistics")
+@bp.route("/statistics")
 def statistics():
     stats = current_app.dispatch_service.get_system_statistics()
     return jsonify(stats)
 
-@app.route("/statistics_page")
+@bp.route("/statistics/snapshot", methods=["POST"])
+def statistics_snapshot():
+    try:
+        return jsonify({"success": True, "statistics": current_app.dispatch_service.snapshot_statistics()})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+@bp.route("/statistics/response_times")
+def response_time_statistics():
+    return jsonify(current_app.dispatch_service.get_response_time_analytics())
+
+def _date_arg(name, default=None):
+    """?name= as an ISO date/datetime; ValueError names the parameter when it does not parse"""
+    value = request.args.get(name)
+    if not value:
+        return default
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"'{name}' must be an ISO date or datetime, got {value!r}") from None
+
+@bp.route("/statistics/history")
+def statistics_history():
+    """Completed-call rollups over ?since=&until= (ISO dates; default the last 30 days) by ?granularity=day|hour"""
+    try:
+        until = _date_arg("until", datetime.datetime.utcnow())
+        since = _date_arg("since", until - datetime.timedelta(days=30))
+        emergency_type = EmergencyType[request.args["type"].upper()] if request.args.get("type") else None
+    except KeyError as e:
+        return jsonify({"success": False, "error": f"Unknown value {e}"}), 400
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    granularity = "hour" if request.args.get("granularity") == "hour" else "day"
+    rollups = current_app.rollups
+    return jsonify({
+        "summary": rollups.summary(since, until, emergency_type),
+        "series": rollups.series(since, until, granularity, emergency_type),
+        "busiest_units": rollups.unit_workload(since, until, emergency_type, limit=20)
+    })
+
+@bp.route("/cache/metrics")
+def cache_metrics():
+    return jsonify(current_app.cad_service.state_cache.metrics())
+
+@bp.route("/statistics_page")
 def statistics_page():
     stats = current_app.dispatch_service.get_system_statistics()
-    return render_template("statistics.html", stats=stats)
+    since = datetime.datetime.utcnow() - datetime.timedelta(days=30)
+    history = current_app.rollups.summary(since)
+    busiest = current_app.rollups.unit_workload(since, limit=5)
+    return render_template("statistics.html", stats=stats, history=history, busiest=busiest)
+
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 1000
 
-@app.route("/api/calls")
+def _listing_response(stmt, to_dict, limit):
+    """Either an NDJSON stream of every match or one keyset page with an X-Next-Cursor header"""
+    if request.args.get("format") == "ndjson":
+        return Response(stream_with_context(current_app.cad_service.stream_rows(stmt, to_dict)),
+                        mimetype="application/x-ndjson")
+    with read_engine().connect() as connection:
+        rows = connection.execute(stmt.limit(limit)).all()
+    response = jsonify([to_dict(row) for row in rows])
+    if len(rows) == limit:
+        args = request.args.to_dict()
+        args["after"] = rows[-1].id
+        response.headers["X-Next-Cursor"] = str(rows[-1].id)
+        response.headers["Link"] = f'<{url_for(request.endpoint, **args)}>; rel="next"'
+    return response
+
+def _page_size():
+    return max(1, min(request.args.get("limit", API_PAGE_SIZE, type=int), API_MAX_PAGE_SIZE))
+
+@bp.route("/api/calls")
 def api_calls():
-    calls = EmergencyCall.query.all()
-    return jsonify([{
-        "id": call.id,
-        "caller_name": call.caller_name,
-        "location": call.location,
-        "emergency_type": call.emergency_type.value,
-        "status": call.status.value,
-        "timestamp": call.timestamp.isoformat(),
-        "unit_id": call.unit.unit_id if call.unit else None
-    } for call in calls])
-
-@app.route("/api/units")
+    try:
+        statuses = [CallStatus[name.strip().upper()] for name in request.args["status"].split(",")] \
+            if request.args.get("status") else None
+        emergency_type = EmergencyType[request.args["type"].upper()] if request.args.get("type") else None
+        since = _date_arg("since")
+        until = _date_arg("until")
+    except KeyError as e:
+        return jsonify({"success": False, "error": f"Unknown value {e}"}), 400
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    stmt = current_app.cad_service.call_listing(
+        statuses=statuses,
+        emergency_type=emergency_type,
+        since=since,
+        until=until,
+        unit=request.args.get("unit"),
+        after_id=request.args.get("after", type=int)
+    )
+    return _listing_response(stmt, current_app.cad_service.call_row_to_dict, _page_size())
+
+@bp.route("/api/units")
 def api_units():
-    units = EmergencyUnit.query.all()
+    try:
+        service_type = EmergencyType[request.args["type"].upper()] if request.args.get("type") else None
+    except KeyError as e:
+        return jsonify({"success": False, "error": f"Unknown value {e}"}), 400
+    available = request.args.get("available")
+    stmt = current_app.cad_service.unit_listing(
+        service_type=service_type,
+        available=None if available is None else available.lower() in ("1", "true", "yes"),
+        after_id=request.args.get("after", type=int)
+    )
+    return _listing_response(stmt, current_app.cad_service.unit_row_to_dict, _page_size())
+
+@bp.route("/api/units/<int:unit_id>/position", methods=["POST"])
+def update_unit_position(unit_id):
+    try:
+        unit = current_app.dispatch_service.update_unit_position(
+            unit_id, float(request.json["latitude"]), float(request.json["longitude"])
+        )
+        return jsonify({"success": True, "unit_id": unit.unit_id})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+@bp.route("/api/telemetry", methods=["POST"])
+def ingest_telemetry():
+    """Batched unit pings: a JSON list (or {"updates": [...]}) of {unit_id, latitude, longitude, available}"""
+    body = request.get_json(silent=True)
+    updates = body.get("updates") if isinstance(body, dict) else body
+    if not isinstance(updates, list):
+        return jsonify({"success": False, "error": "Expected a JSON list of updates"}), 400
+    result = current_app.telemetry.ingest(updates)
+    return jsonify(dict(result, success=True)), 202
+
+@bp.route("/api/telemetry")
+def telemetry_status():
+    return jsonify(current_app.telemetry.stats())
+
+@bp.route("/api/telemetry/flush", methods=["POST"])
+def telemetry_flush():
+    return jsonify(current_app.telemetry.flush())
+
+@bp.route("/api/units/nearest")
+def api_nearest_units():
+    try:
+        emergency_type = EmergencyType[request.args["type"].upper()]
+        latitude = float(request.args["lat"])
+        longitude = float(request.args["lon"])
+        k = request.args.get("k", 5, type=int)
+    except (KeyError, ValueError) as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    ranked = current_app.dispatch_service.find_nearest_units(emergency_type, latitude, longitude, k)
     return jsonify([{
         "id": unit.id,
         "unit_id": unit.unit_id,
         "service_type": unit.service_type.value,
-        "available": unit.availability_status
-    } for unit in units])
+        "distance_km": round(distance, 3)
+    } for distance, unit in ranked])
+
+@bp.route("/api/cad/events")
+def api_cad_events():
+    event_type = request.args.get("type")
+    try:
+        since = _date_arg("since")
+        until = _date_arg("until")
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    if request.args.get("stream"):
+        def generate():
+            for event in CADEvent.stream(event_type, since, until):
+                yield json.dumps(event.to_dict()) + "\n"
+        return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+    limit = min(request.args.get("limit", 100, type=int), 1000)
+    events = CADEvent.page(event_type, request.args.get("after", type=int), limit, since, until)
+    return jsonify({
+        "events": [event.to_dict() for event in events],
+        "next_cursor": events[-1].id if len(events) == limit else None
+    })
 
-@app.route("/call/<int:call_id>")
+@bp.route("/call/<int:call_id>")
 def view_call(call_id):
-    call = EmergencyCall.query.get_or_404(call_id)
+    call = current_app.cad_service.get_call(call_id)
+    if call is None:
+        abort(404)
     return render_template("view_call.html", call=call)
 
-@app.route("/generate_report")
+@bp.route("/generate_report")
 def generate_report():
-    stats = current_app.dispatch_service.get_system_statistics()
-    buffer = io.BytesIO()
-    pdf = canvas.Canvas(buffer, pagesize=letter)
-    pdf.setTitle("System Statistics Report")
-    pdf.setFont("Helvetica-Bold", 16)
-    pdf.drawString(72, 750, "System Statistics Report")
-    pdf.setFont("Helvetica", 12)
-    y = 720
-    for key, value in stats.items():
-        pdf.drawString(72, y, f"{key}: {value}")
-        y -= 20
-        if y < 100:
-            pdf.showPage()
-            y = 750
-    pdf.save()
-    buffer.seek(0)
-    current_app.dispatch_service.submit_intervention_report(
-        call_id=None,
-        report_data="System statistics PDF generated"
-    )
-    return send_file(
-        buffer,
-        mimetype="application/pdf",
-        as_attachment=True,
-        download_name="system_statistics.pdf"
-    )
+    """Statistics PDF for the last ?days= days, streamed from the report cache"""
+    days = max(1, min(request.args.get("days", 7, type=int), 366))
+    engine = current_app.report_engine
+    key, pdf, job_id = engine.get_or_build(days, request.args.get("key"), request.args.get("job"))
+    if job_id is not None:
+        return jsonify({
+            "success": True,
+            "job_id": job_id,
+            "status_url": url_for("dispatch.job_status", job_id=job_id),
+            "report_url": url_for("dispatch.generate_report", days=days, key=key, job=job_id)
+        }), 202
+    etag = engine.etag(key)
+    if etag in request.if_none_match:
+        return Response(status=304, headers={"ETag": f'"{etag}"'})
+    return Response(engine.iter_chunks(pdf), mimetype="application/pdf", headers={
+        "Content-Disposition": f'attachment; filename="system_statistics_{days}d.pdf"',
+        "Content-Length": str(len(pdf)),
+        "ETag": f'"{etag}"'
+    })
+
+@bp.route("/reports/metrics")
+def report_metrics():
+    return jsonify(current_app.report_engine.metrics())
+
+@bp.route("/metrics")
+def metrics():
+    """Latency histograms, SQL and commit counts in Prometheus text exposition format"""
+    if not current_app.config['METRICS_ENABLED']:
+        abort(404)
+    return Response(instrumentation.metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@bp.route("/metrics/profiler", methods=["GET", "POST"])
+def profiler_toggle():
+    """Switch the slow-request sampling profiler on or off at runtime"""
+    profiler = current_app.profiler
+    if request.method == "POST":
+        try:
+            data = request.json or {}
+            if "slow_ms" in data:
+                profiler.slow_seconds = float(data["slow_ms"]) / 1000
+            if data.get("enabled", True):
+                if not current_app.config['METRICS_ENABLED']:
+                    raise ValueError("Profiling needs METRICS_ENABLED")
+                profiler.start()
+            else:
+                profiler.stop()
+        except Exception as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+    return jsonify({
+        "enabled": profiler.enabled,
+        "interval_ms": profiler.interval * 1000,
+        "slow_ms": profiler.slow_seconds * 1000,
+        "output_dir": profiler.output_dir
+    })
+
+@bp.cli.command("migrate")
+def migrate_command():
+    """Apply pending schema migrations"""
+    applied = upgrade()
+    print(f"Applied migrations: {applied or 'none'}; schema version {current_version()}")
+
+@bp.cli.command("init-db")
+def init_db_command():
+    """Create or upgrade the schema and add the default dispatcher"""
+    upgrade()
+    if not Dispatcher.query.filter_by(dispatcher_id="DISP-001").first():
+        db.session.add(Dispatcher(dispatcher_id="DISP-001", name="John Dispatcher"))
+        db.session.commit()
+    print(f"Database ready at schema version {current_version()}")
+
+@bp.cli.command("seed-units")
+@click.option("--per-type", default=5, show_default=True, help="Units to create per service type")
+@click.option("--reset", is_flag=True, help="Delete every existing unit first")
+def seed_units_command(per_type, reset):
+    """Scatter demo units around the dispatch region (skipped if units exist, unless --reset)"""
+    if reset:
+        EmergencyUnit.query.delete()
+        db.session.commit()
+    if EmergencyUnit.query.count():
+        print("Units already exist; use --reset to replace them")
+        return
+    rng = random.Random(42)
+    center_lat = current_app.config['DISPATCH_REFERENCE_LATITUDE']
+    center_lon = current_app.config['DISPATCH_REFERENCE_LONGITUDE']
+    for prefix, service_type in (("POLICE", EmergencyType.POLICE),
+                                 ("FIRE", EmergencyType.FIRE),
+                                 ("EMS", EmergencyType.MEDICAL)):
+        for i in range(1, per_type + 1):
+            db.session.add(EmergencyUnit(
+                unit_id=f"{prefix}-{i:02d}",
+                service_type=service_type,
+                latitude=center_lat + rng.uniform(-0.05, 0.05),
+                longitude=center_lon + rng.uniform(-0.07, 0.07)
+            ))
+    db.session.commit()
+    print(f"Seeded {per_type * 3} units")
+
+@bp.cli.command("archive-calls")
+@click.option("--older-than-days", type=float, help="Archive completed calls logged before this many days ago "
+                                                    "[default: ARCHIVE_AFTER_DAYS]")
+@click.option("--batch-size", type=int, help="Calls moved per transaction [default: ARCHIVE_BATCH_SIZE]")
+def archive_calls_command(older_than_days, batch_size):
+    """Move old completed calls, their reports and transitions to the monthly archive tables"""
+    config = current_app.config
+    days = older_than_days if older_than_days is not None else config['ARCHIVE_AFTER_DAYS']
+    archive = CallArchive(max_age=datetime.timedelta(days=days), batch_size=batch_size or config['ARCHIVE_BATCH_SIZE'])
+    moved = archive.run()
+    print(f"Archived {moved['calls']} calls, {moved['reports']} reports and {moved['transitions']} transitions "
+          f"logged before {archive.cutoff():%Y-%m-%d %H:%M}")
+
+@bp.cli.command("rollup-backfill")
+@click.option("--since", type=click.DateTime(), help="Rebuild calls logged from this date [default: oldest call]")
+@click.option("--until", type=click.DateTime(), help="...up to this date (exclusive) [default: now]")
+def rollup_backfill_command(since, until):
+    """Rebuild the hourly/daily statistics rollups from the live and archived calls (safe to re-run)"""
+    rolled = RollupStore().backfill(since, until)
+    print(f"Rolled up {rolled} completed calls")
 
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=True)
@@ -0,0 +1,69 @@
+"""Live-table query times before and after archiving a year of completed calls.
+
+Loads a call history (see query_plans.populate), times the dashboard-side
+queries, runs CallArchive with the default 90-day cutoff and times them again,
+plus an /api/calls page whose time range reaches into the archive.
+
+Run from the project root:
+
+    python -m benchmarks.archive_bench --rows 500000
+"""
+import argparse
+import datetime
+import time
+
+from benchmarks.harness import create_benchmark_app
+from benchmarks.query_plans import populate
+from database import db
+from models import EmergencyCall
+from services.archive import CallArchive
+from services.cad_service import CADService
+from services.counters import StatisticsCounters
+from services.response_analytics import ResponseTimeAnalytics
+from services.state_cache import HotStateCache
+
+
+def timings():
+    cad = CADService(counters=StatisticsCounters(), state_cache=HotStateCache())
+    last_week = datetime.datetime.utcnow() - datetime.timedelta(days=7)
+    last_year = datetime.datetime.utcnow() - datetime.timedelta(days=365)
+    cases = [
+        ("counter reconcile", lambda: StatisticsCounters().reconcile()),
+        ("call count", lambda: EmergencyCall.query.count()),
+        ("open-call cache load", lambda: HotStateCache().load()),
+        ("response-time warm-up (7 days)", lambda: ResponseTimeAnalytics().warm(since=last_week)),
+        ("/api/calls page, last week", lambda: db.session.execute(cad.call_listing(since=last_week, limit=100)).all()),
+        ("/api/calls page, last year", lambda: db.session.execute(cad.call_listing(since=last_year, limit=100)).all()),
+    ]
+    results = {}
+    for name, func in cases:
+        db.session.expire_all()
+        started = time.perf_counter()
+        func()
+        results[name] = (time.perf_counter() - started) * 1000
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=500000)
+    parser.add_argument("--batch-size", type=int, default=20000)
+    args = parser.parse_args(argv)
+
+    app = create_benchmark_app(units_per_type=300)
+    with app.app_context():
+        populate(args.rows)
+        before = timings()
+        started = time.perf_counter()
+        moved = CallArchive(batch_size=args.batch_size).run()
+        archive_seconds = time.perf_counter() - started
+        after = timings()
+        print(f"Archived {moved['calls']} of {args.rows} calls in {archive_seconds:.1f}s "
+              f"({moved['calls'] / archive_seconds:.0f} calls/s); {EmergencyCall.query.count()} left live\n")
+    print(f"{'query':<34}{'before ms':>11}{'after ms':>11}")
+    for name in before:
+        print(f"{name:<34}{before[name]:>11.1f}{after[name]:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
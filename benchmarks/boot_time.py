@@ -0,0 +1,128 @@
+"""Worker boot time of the app factory versus the old import-time start-up.
+
+Each worker is a fresh interpreter, started N at a time the way gunicorn forks
+them, against one prepared SQLite database with a call history:
+
+* factory: `create_app()` only; services are built on the first request;
+* factory + first request: the above plus GET / (what the first user waits for);
+* eager (old behaviour): migrations, reseeding every unit, building all
+  services and importing reportlab before the worker can serve.
+
+The script also checks that a restart keeps the fleet state: a unit moved and
+taken out of service before the restart is still so afterwards.
+
+Run from the project root:
+
+    python -m benchmarks.boot_time [--workers 4] [--rounds 3]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
+
+from app import create_app
+from benchmarks.query_plans import populate
+
+MODES = {
+    "factory": """
+        from app import create_app
+        app = create_app()
+    """,
+    "factory + first request": """
+        from app import create_app
+        app = create_app()
+        assert app.test_client().get("/").status_code == 200
+    """,
+    "eager (old behaviour)": """
+        from app import create_app
+        app = create_app()
+        runner = app.test_cli_runner()
+        runner.invoke(args=["init-db"])
+        runner.invoke(args=["seed-units", "--reset"])
+        with app.app_context():
+            app.services()
+        import reportlab.pdfgen.canvas
+    """,
+}
+
+
+def _script(body):
+    return "import time\nstarted = time.perf_counter()\n" + textwrap.dedent(body) + \
+        "\nprint(time.perf_counter() - started)\n"
+
+
+def _run(code, env):
+    return subprocess.run([sys.executable, "-c", code], env=env, check=True, capture_output=True, text=True)
+
+
+def boot_workers(body, workers, env):
+    """Start `workers` interpreters at once; returns (wall seconds until all ready, per-worker seconds)"""
+    started = time.perf_counter()
+    processes = [subprocess.Popen([sys.executable, "-c", _script(body)], env=env, stdout=subprocess.PIPE, text=True)
+                 for _ in range(workers)]
+    timings = []
+    for process in processes:
+        output, _ = process.communicate()
+        if process.returncode:
+            raise SystemExit(f"worker failed with exit code {process.returncode}")
+        timings.append(float(output.strip().splitlines()[-1]))
+    return time.perf_counter() - started, timings
+
+
+def check_restart_keeps_fleet(env):
+    _run(textwrap.dedent("""
+        from app import create_app
+        from models import EmergencyUnit
+        from database import db
+        app = create_app()
+        with app.app_context():
+            unit = EmergencyUnit.query.order_by(EmergencyUnit.id).first()
+            unit.latitude, unit.longitude, unit.availability_status = 45.0, 21.0, False
+            db.session.commit()
+    """), env)
+    result = _run(textwrap.dedent("""
+        from app import create_app
+        from models import EmergencyUnit
+        app = create_app()
+        with app.app_context():
+            unit = EmergencyUnit.query.order_by(EmergencyUnit.id).first()
+            print(unit.latitude, unit.longitude, unit.availability_status, EmergencyUnit.query.count())
+    """), env)
+    latitude, longitude, available, count = result.stdout.split()
+    assert (latitude, longitude, available) == ("45.0", "21.0", "False"), result.stdout
+    return int(count)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--history", type=int, default=50000, help="calls already in the database")
+    args = parser.parse_args(argv)
+
+    handle, path = tempfile.mkstemp(prefix="dispatch-boot-", suffix=".db")
+    os.close(handle)
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{path}", "PYTHONPATH": os.getcwd()}
+    _run(_script(MODES["eager (old behaviour)"]), env)
+    app = create_app({"SQLALCHEMY_DATABASE_URI": env["DATABASE_URL"]})
+    with app.app_context():
+        populate(args.history)
+
+    print(f"{args.workers} workers booted together against {args.history} calls, best of {args.rounds} rounds\n")
+    print(f"{'mode':<26}{'all ready (s)':>15}{'per worker median (s)':>24}")
+    for name, body in MODES.items():
+        rounds = [boot_workers(body, args.workers, env) for _ in range(args.rounds)]
+        wall, timings = min(rounds, key=lambda item: item[0])
+        print(f"{name:<26}{wall:>15.3f}{statistics.median(timings):>24.3f}")
+
+    units = check_restart_keeps_fleet(env)
+    print(f"\nRestart kept the fleet state ({units} units, moved/busy unit unchanged)")
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Compare call intake throughput of log_emergency_call with log_emergency_calls.
+
+Run from the project root:  python -m benchmarks.bulk_intake_bench
+"""
+import random
+import time
+
+from benchmarks.harness import create_benchmark_app
+from models import EmergencyCall
+from services.enhanced_dispatch_service import EnhancedDispatchService
+
+CALLS = 2000
+BATCH_SIZES = (50, 500)
+TRANSCRIPTS = ["smoke coming from the roof", "man having a heart attack", "break-in at the store",
+               "car accident with injury", "loud fight in the street"]
+
+
+def make_calls(count, rng):
+    return [{
+        "caller_name": f"Caller {i}",
+        "phone": f"0700{i:06d}",
+        "location": f"Street {rng.randint(1, 500)}",
+        "details": rng.choice(TRANSCRIPTS),
+    } for i in range(count)]
+
+
+def bench_single(service, calls):
+    start = time.perf_counter()
+    for item in calls:
+        service.log_emergency_call(item["caller_name"], item["phone"], item["location"],
+                                   service.determine_emergency_type(item["details"]))
+    return time.perf_counter() - start
+
+
+def bench_batch(service, calls, batch_size):
+    start = time.perf_counter()
+    for offset in range(0, len(calls), batch_size):
+        service.log_emergency_calls(calls[offset:offset + batch_size])
+    return time.perf_counter() - start
+
+
+def run():
+    rng = random.Random(7)
+    calls = make_calls(CALLS, rng)
+    results = [("single call", lambda service: bench_single(service, calls))]
+    for batch_size in BATCH_SIZES:
+        results.append((f"batch of {batch_size}", lambda service, size=batch_size: bench_batch(service, calls, size)))
+
+    baseline = None
+    for label, bench in results:
+        app = create_benchmark_app()
+        with app.app_context():
+            service = EnhancedDispatchService()
+            elapsed = bench(service)
+            assert EmergencyCall.query.count() == CALLS
+        rate = CALLS / elapsed
+        baseline = baseline or rate
+        print(f"{label:>14}: {rate:9.0f} calls/s ({elapsed:6.2f}s for {CALLS}) | {rate / baseline:5.1f}x")
+
+
+if __name__ == "__main__":
+    run()
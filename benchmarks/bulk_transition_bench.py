@@ -0,0 +1,47 @@
+"""Close a scene's worth of dispatched calls one by one vs. with update_call_statuses.
+
+Run from the project root:  python -m benchmarks.bulk_transition_bench [--calls 500]
+"""
+import argparse
+import time
+
+from benchmarks.harness import create_benchmark_app
+from models import CallStatus, CallTransition, EmergencyCall, EmergencyType, EmergencyUnit
+from services.enhanced_dispatch_service import EnhancedDispatchService
+
+
+def dispatched_calls(service, count):
+    ids = [service.log_emergency_call(f"Caller {i}", "0700000000", "Scene", EmergencyType.FIRE).id
+           for i in range(count)]
+    for call_id in ids:
+        service.dispatch_unit(call_id)
+    return ids
+
+
+def run(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=500)
+    args = parser.parse_args(argv)
+
+    baseline = None
+    for label, close in [
+        ("one by one", lambda service, ids: [service.update_unit_status(i, CallStatus.COMPLETED) for i in ids]),
+        ("bulk", lambda service, ids: service.update_call_statuses(dict.fromkeys(ids, CallStatus.COMPLETED))),
+    ]:
+        app = create_benchmark_app(units_per_type={EmergencyType.FIRE: args.calls})
+        with app.app_context():
+            service = EnhancedDispatchService()
+            ids = dispatched_calls(service, args.calls)
+            started = time.perf_counter()
+            close(service, ids)
+            elapsed = time.perf_counter() - started
+            assert EmergencyCall.query.filter(EmergencyCall.status != CallStatus.COMPLETED).count() == 0
+            assert EmergencyUnit.query.filter_by(availability_status=False).count() == 0
+            assert CallTransition.query.filter_by(to_status=CallStatus.COMPLETED).count() == args.calls
+        rate = args.calls / elapsed
+        baseline = baseline or rate
+        print(f"{label:>11}: {rate:9.0f} calls/s ({elapsed * 1000:7.1f} ms for {args.calls}) | {rate / baseline:5.1f}x")
+
+
+if __name__ == "__main__":
+    run()
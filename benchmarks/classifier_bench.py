@@ -0,0 +1,113 @@
+"""Incident classifier throughput as the keyword lexicon grows.
+
+Compares, for lexicons of increasing size (the default lexicon padded with
+synthetic keywords):
+
+* substring scan: the old `any(word in text.lower() ...)` approach;
+* flat regex: one compiled `kw1|kw2|...` alternation;
+* trie regex: IncidentClassifier.classify, prefix-factored pattern;
+* trie regex, batch: IncidentClassifier.classify_many over all transcripts.
+
+Run from the project root:
+
+    python -m benchmarks.classifier_bench [--transcripts 20000]
+"""
+import argparse
+import random
+import re
+import string
+import time
+
+from models import EmergencyType
+from services.classifier import DEFAULT_LEXICON, IncidentClassifier
+
+LEXICON_SIZES = (30, 300, 3000, 30000)
+FILLER = ("the there is a at on in near my our street house car store someone please help quickly "
+          "come now neighbour building corner outside inside they he she it was").split()
+SCAN_LIMIT = 2000  # transcripts timed for the substring scan on big lexicons (it is that slow)
+
+
+def synthetic_lexicon(size, rng):
+    lexicon = {emergency_type: dict(terms) for emergency_type, terms in DEFAULT_LEXICON.items()}
+    types = list(lexicon)
+    count = sum(len(terms) for terms in lexicon.values())
+    while count < size:
+        word = "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(5, 10)))
+        terms = lexicon[rng.choice(types)]
+        if word not in terms:
+            terms[word] = rng.randint(1, 4)
+            count += 1
+    return lexicon
+
+
+def make_transcripts(count, lexicon, rng):
+    keywords = [term for terms in lexicon.values() for term in terms]
+    transcripts = []
+    for _ in range(count):
+        words = [rng.choice(FILLER) for _ in range(rng.randint(8, 25))]
+        for _ in range(rng.randint(0, 3)):
+            words.insert(rng.randrange(len(words) + 1), rng.choice(keywords))
+        transcripts.append(" ".join(words))
+    return transcripts
+
+
+def substring_scan(lexicon):
+    ordered = [(emergency_type, list(terms)) for emergency_type, terms in lexicon.items()]
+
+    def classify(text):
+        for emergency_type, words in ordered:
+            if any(word in text.lower() for word in words):
+                return emergency_type
+        return EmergencyType.POLICE
+    return classify
+
+
+def flat_regex(lexicon):
+    terms = {term: emergency_type for emergency_type, words in lexicon.items() for term in words}
+    pattern = re.compile(r"\b(?:" + "|".join(re.escape(term) for term in sorted(terms, key=len, reverse=True)) + ")",
+                         re.IGNORECASE)
+
+    def classify(text):
+        return {terms[match.lower()] for match in pattern.findall(text)}
+    return classify
+
+
+def rate(func, transcripts):
+    started = time.perf_counter()
+    func(transcripts)
+    return len(transcripts) / (time.perf_counter() - started)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--transcripts", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args(argv)
+    rng = random.Random(args.seed)
+
+    print(f"Transcripts per second ({args.transcripts} transcripts)\n")
+    print(f"{'keywords':>9}{'substring scan':>16}{'flat regex':>12}{'trie regex':>12}{'trie, batch':>13}"
+          f"{'compile ms':>12}")
+    for size in LEXICON_SIZES:
+        lexicon = synthetic_lexicon(size, rng)
+        transcripts = make_transcripts(args.transcripts, lexicon, rng)
+        started = time.perf_counter()
+        classifier = IncidentClassifier(lexicon)
+        compile_ms = (time.perf_counter() - started) * 1000
+        scan = substring_scan(lexicon)
+        flat = flat_regex(lexicon)
+        results = [
+            rate(lambda items: [scan(text) for text in items], transcripts[:SCAN_LIMIT] if size > 300 else transcripts),
+            rate(lambda items: [flat(text) for text in items], transcripts),
+            rate(lambda items: [classifier.classify(text) for text in items], transcripts),
+            rate(classifier.classify_many, transcripts),
+        ]
+        # Batching must not change any result, including keywords split across two transcripts
+        checked = transcripts[:200] + ["he is not", "breathing, shots", "fired", ""]
+        assert classifier.classify_many(checked) == [classifier.classify(text) for text in checked]
+        print(f"{len(classifier):>9}" + "".join(f"{value:>{width}.0f}" for value, width in zip(results, (16, 12, 12, 13)))
+              + f"{compile_ms:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
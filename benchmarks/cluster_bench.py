@@ -0,0 +1,136 @@
+"""Throughput of 1..N worker processes sharing one database in cluster mode.
+
+Each worker is a separate process running the full app (CLUSTER_MODE on, its
+own coordinator) against the same SQLite file, like gunicorn workers would.
+Workers loop over a dispatcher mix: one call logged, dispatched and completed
+for every --reads-per-write dashboard, statistics and unit-list requests. After
+the run every worker syncs and reports its dashboard statistics, which must
+equal a fresh count from the database: the shared counters and event log keep
+them in step whichever worker made the change.
+
+Run from the project root:  python -m benchmarks.cluster_bench [--workers 1,2,4] [--seconds 5]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import time
+
+from benchmarks.harness import create_benchmark_app
+from config import Config
+
+READS = ("/", "/statistics", "/api/units?limit=50")
+
+
+def worker(index, database_uri, cluster, seconds, reads_per_write, ready, start, finished, results):
+    from app import create_app
+    from database import db
+    from models import CallStatus
+
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": database_uri, "CLUSTER_MODE": cluster, "CLUSTER_WORKER_ID": f"worker-{index}",
+        "METRICS_ENABLED": False, "OUTBOX_RELAY_ENABLED": False, "TELEMETRY_ENABLED": False
+    })
+    client = app.test_client()
+    rng = random.Random(index)
+    client.get("/")  # build the services before the clock starts
+    ready.wait()
+    start.wait()
+    deadline = time.perf_counter() + seconds
+    reads = writes = failed = 0
+    while time.perf_counter() < deadline:
+        call_ids = client.post("/api/calls/batch", json={"calls": [{
+            "caller_name": "Caller", "phone": "0700000000", "location": "Street",
+            "emergency_type": rng.choice(("police", "fire", "medical")),
+            "latitude": Config.DISPATCH_REFERENCE_LATITUDE + rng.uniform(-0.05, 0.05),
+            "longitude": Config.DISPATCH_REFERENCE_LONGITUDE + rng.uniform(-0.07, 0.07)
+        }]}).json["call_ids"]
+        with app.app_context():
+            try:
+                app.dispatch_service.dispatch_unit(call_ids[0])
+            except ValueError:
+                db.session.rollback()
+                failed += 1
+            finally:
+                db.session.remove()
+        if client.post(f"/update_status/{call_ids[0]}", json={"status": CallStatus.COMPLETED.name}).status_code != 200:
+            failed += 1
+        writes += 1
+        for _ in range(reads_per_write):
+            client.get(rng.choice(READS))
+            reads += 1
+    if cluster:
+        with app.app_context():
+            app.coordinator.sync()
+    finished.wait()  # everybody's changes are written...
+    with app.app_context():
+        if cluster:
+            app.coordinator.sync()  # ...and read back
+            app.coordinator.stop()
+        statistics = app.dispatch_service.counters.snapshot()
+        app.scheduler.stop()
+        app.job_queue.shutdown()
+    results.put((index, reads, writes, failed, statistics))
+
+
+def run(workers, seconds, reads_per_write, units_per_type, cluster=True):
+    app = create_benchmark_app(units_per_type=units_per_type)
+    database_uri = app.config["SQLALCHEMY_DATABASE_URI"]
+    context = multiprocessing.get_context("spawn")
+    ready, start, finished = (context.Barrier(workers + 1), context.Barrier(workers + 1), context.Barrier(workers))
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(index, database_uri, cluster, seconds, reads_per_write, ready,
+                                                      start, finished, results)) for index in range(workers)]
+    for process in processes:
+        process.start()
+    ready.wait()
+    started = time.perf_counter()
+    start.wait()
+    reports = [results.get() for _ in processes]
+    elapsed = time.perf_counter() - started
+    for process in processes:
+        process.join()
+
+    from database import db
+    from services.counters import StatisticsCounters
+    with app.app_context():
+        expected = StatisticsCounters()
+        expected.reconcile()
+        expected = expected.snapshot()
+        db.engine.dispose()
+    os.remove(database_uri[len("sqlite:///"):])
+    return {
+        "reads_per_second": sum(report[1] for report in reports) / elapsed,
+        "writes_per_second": sum(report[2] for report in reports) / elapsed,
+        "failed": sum(report[3] for report in reports),
+        "consistent": all(report[4] == expected for report in reports)
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--reads-per-write", type=int, default=10)
+    parser.add_argument("--units-per-type", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    counts = [int(count) for count in args.workers.split(",")]
+    print(f"{args.seconds}s per run, {args.reads_per_write} reads per call lifecycle, {os.cpu_count()} CPUs\n")
+    print(f"{'workers':<10}{'calls/s':>10}{'reads/s':>10}{'ops/s':>10}{'speedup':>9}{'failed':>8}  counters")
+    baseline = None
+    results = {}
+    runs = [("1, single", 1, False)] + [(str(workers), workers, True) for workers in counts]
+    for label, workers, cluster in runs:
+        result = results[label] = run(workers, args.seconds, args.reads_per_write, args.units_per_type, cluster)
+        ops = result["reads_per_second"] + result["writes_per_second"] * 3
+        baseline = baseline or ops
+        print(f"{label:<10}{result['writes_per_second']:>10.1f}{result['reads_per_second']:>10.1f}{ops:>10.1f}"
+              f"{ops / baseline:>8.2f}x{result['failed']:>8}  {'consistent' if result['consistent'] else 'DRIFT'}")
+    print("\n'single' is one worker without cluster mode; ops/s counts each call lifecycle as three writes "
+          "(log, dispatch, complete)")
+    return results
+
+
+if __name__ == "__main__":
+    main()
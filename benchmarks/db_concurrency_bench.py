@@ -0,0 +1,134 @@
+"""Concurrent writers and readers against SQLite under each engine profile.
+
+Writer threads log calls and move units (one commit each) while reader threads
+page through /api/calls-style listings. For each profile the script reports
+throughput, p50/p99 latency and how many operations failed with
+"database is locked":
+
+* driver defaults: rollback journal, synchronous=FULL, one shared engine
+  (the settings before engine profiles existed);
+* WAL, shared engine: tuned pragmas, readers and writers share one pool;
+* WAL + reader engine: tuned pragmas, listings on their own read-only engine.
+
+Run from the project root:
+
+    python -m benchmarks.db_concurrency_bench [--writers 8] [--readers 8] [--seconds 5]
+"""
+import argparse
+import collections
+import random
+import threading
+import time
+
+from sqlalchemy.exc import OperationalError
+
+from benchmarks.harness import create_benchmark_app
+from config import Config
+from database import db, read_engine
+from models import CallStatus, EmergencyType, EmergencyUnit
+from services.cad_service import CADService
+from services.counters import StatisticsCounters
+from services.enhanced_dispatch_service import EnhancedDispatchService
+from services.response_analytics import QuantileSketch
+from services.state_cache import HotStateCache
+
+PROFILES = [
+    ("driver defaults", {"SQLITE_TUNING": False, "DB_SEPARATE_READER": False}),
+    ("WAL, shared engine", {"DB_SEPARATE_READER": False}),
+    ("WAL + reader engine", {}),
+]
+UNITS_PER_TYPE = 50
+
+
+def run_profile(overrides, writers, readers, seconds):
+    app = create_benchmark_app(units_per_type=UNITS_PER_TYPE, config=overrides)
+    with app.app_context():
+        service = EnhancedDispatchService()
+        cad = CADService(counters=StatisticsCounters(), state_cache=HotStateCache())
+        unit_ids = [unit_pk for (unit_pk,) in db.session.query(EmergencyUnit.id)]
+    latencies = collections.defaultdict(QuantileSketch)
+    counts = collections.Counter()
+    lock = threading.Lock()
+    stop = threading.Event()
+    barrier = threading.Barrier(writers + readers + 1)
+
+    def record(kind, func):
+        started = time.perf_counter()
+        try:
+            func()
+            outcome = kind
+        except OperationalError as e:
+            db.session.rollback()
+            outcome = "locked" if "locked" in str(e) else "error"
+        elapsed = (time.perf_counter() - started) * 1000
+        with lock:
+            counts[outcome] += 1
+            if outcome == kind:
+                latencies[kind].add(elapsed)
+
+    def writer(index):
+        rng = random.Random(index)
+        with app.app_context():
+            barrier.wait()
+            while not stop.is_set():
+                record("write", lambda: service.log_emergency_call(
+                    "Caller", "0700000000", "Street", rng.choice(list(EmergencyType)),
+                    latitude=Config.DISPATCH_REFERENCE_LATITUDE, longitude=Config.DISPATCH_REFERENCE_LONGITUDE))
+                record("write", lambda: service.update_unit_position(
+                    rng.choice(unit_ids), Config.DISPATCH_REFERENCE_LATITUDE + rng.uniform(-0.1, 0.1),
+                    Config.DISPATCH_REFERENCE_LONGITUDE + rng.uniform(-0.14, 0.14)))
+            db.session.remove()
+
+    def reader(index):
+        with app.app_context():
+            barrier.wait()
+            while not stop.is_set():
+                def page():
+                    with read_engine().connect() as connection:
+                        connection.execute(cad.call_listing(statuses=[CallStatus.LOGGED], limit=100)).all()
+                        connection.execute(cad.call_listing(limit=100)).all()
+                record("read", page)
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    threads += [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return {
+        "writes_per_second": round(counts["write"] / elapsed, 1),
+        "reads_per_second": round(counts["read"] / elapsed, 1),
+        "write_ms": latencies["write"].summary(),
+        "read_ms": latencies["read"].summary(),
+        "locked": counts["locked"],
+        "errors": counts["error"],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args(argv)
+
+    print(f"{args.writers} writers, {args.readers} readers, {args.seconds}s per profile\n")
+    print(f"{'profile':<22}{'writes/s':>10}{'w p50':>9}{'w p99':>9}{'reads/s':>10}{'r p50':>9}{'r p99':>9}"
+          f"{'locked':>8}")
+    results = {}
+    for name, overrides in PROFILES:
+        result = results[name] = run_profile(overrides, args.writers, args.readers, args.seconds)
+        write, read = result["write_ms"], result["read_ms"]
+        print(f"{name:<22}{result['writes_per_second']:>10}{write['median']!s:>9}{write['p99']!s:>9}"
+              f"{result['reads_per_second']:>10}{read['median']!s:>9}{read['p99']!s:>9}{result['locked']:>8}")
+    print("\nLatencies in ms")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Race many dispatcher threads against a small fleet and check no unit is assigned twice.
+
+Run from the project root:  python -m benchmarks.dispatch_stress [threads]
+"""
+import collections
+import sys
+import threading
+import time
+
+from benchmarks.harness import create_benchmark_app
+from database import db
+from models import EmergencyCall, EmergencyType, CallStatus
+from services.enhanced_dispatch_service import EnhancedDispatchService
+
+UNITS_PER_TYPE = 20
+CALLS_PER_TYPE = 60  # three calls competing for every unit
+
+
+def run(threads=8):
+    app = create_benchmark_app(units_per_type=UNITS_PER_TYPE)
+    with app.app_context():
+        service = EnhancedDispatchService()
+        call_ids = service.log_emergency_calls([
+            {"caller_name": f"Caller {i}", "phone": "0700000000", "location": f"Street {i}",
+             "emergency_type": emergency_type}
+            for emergency_type in EmergencyType for i in range(CALLS_PER_TYPE)
+        ])
+
+    outcomes = collections.Counter()
+    outcomes_lock = threading.Lock()
+    start_barrier = threading.Barrier(threads)
+
+    def worker(worker_index):
+        with app.app_context():
+            start_barrier.wait()
+            # Every worker walks the whole backlog so each call is contested
+            for call_id in call_ids[worker_index:] + call_ids[:worker_index]:
+                try:
+                    service.dispatch_unit(call_id)
+                    result = "dispatched"
+                except ValueError:
+                    result = "rejected"
+                with outcomes_lock:
+                    outcomes[result] += 1
+            db.session.remove()
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        dispatched = EmergencyCall.query.filter(EmergencyCall.status == CallStatus.DISPATCHED).all()
+        per_unit = collections.Counter(call.unit_id for call in dispatched)
+        doubled = {unit_pk: count for unit_pk, count in per_unit.items() if count > 1}
+        assert not doubled, f"units assigned more than once: {doubled}"
+        assert all(call.unit_id is not None for call in dispatched)
+        assert len(dispatched) == outcomes["dispatched"] == UNITS_PER_TYPE * len(EmergencyType), outcomes
+        assert service.counters.snapshot()["available_units"] == 0
+
+    attempts = sum(outcomes.values())
+    print(f"{threads} threads: {attempts} dispatch attempts in {elapsed:.2f}s "
+          f"({attempts / elapsed:.0f}/s), {outcomes['dispatched']} dispatched, no unit assigned twice")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 8)
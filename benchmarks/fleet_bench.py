@@ -0,0 +1,95 @@
+"""Whole-fleet unit queries: ORM objects vs. the array-backed FleetSnapshot.
+
+For a fleet of --units units (a third of them busy) times, per approach:
+
+* available units of one type;
+* per-type total/available counts and utilization;
+* ranking the available units of one type by distance (top 10 and all).
+
+Run from the project root:
+
+    python -m benchmarks.fleet_bench --units 100000
+"""
+import argparse
+import math
+import random
+import time
+
+from benchmarks.harness import create_benchmark_app
+from database import db
+from models import EmergencyType, EmergencyUnit, Statistics
+from services.fleet import FleetSnapshot
+from services.spatial_index import KM_PER_DEGREE_LAT, KM_PER_DEGREE_LON
+
+LATITUDE, LONGITUDE = 45.75, 21.23
+
+
+def orm_rank(service_type, k=None):
+    lon_scale = KM_PER_DEGREE_LON * math.cos(math.radians(LATITUDE))
+    units = EmergencyUnit.query.filter_by(service_type=service_type, availability_status=True).all()
+    ranked = sorted((math.hypot((unit.longitude - LONGITUDE) * lon_scale,
+                                (unit.latitude - LATITUDE) * KM_PER_DEGREE_LAT), unit.id) for unit in units)
+    return ranked if k is None else ranked[:k]
+
+
+def orm_counts():
+    return {t.value: {"total": EmergencyUnit.query.filter_by(service_type=t).count(),
+                      "available": EmergencyUnit.query.filter_by(service_type=t, availability_status=True).count()}
+            for t in EmergencyType}
+
+
+def same(expected, got):
+    if isinstance(expected, dict):
+        return expected == got
+    if expected and isinstance(expected[0], tuple):
+        # Rankings: same units in the same order
+        return [unit_pk for _, unit_pk in expected] == [unit_pk for _, unit_pk in got]
+    return sorted(expected) == sorted(got)
+
+
+def timed(func, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - started) / repeat * 1000, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--units", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    app = create_benchmark_app(units_per_type=args.units // 3)
+    with app.app_context():
+        rng = random.Random(1)
+        ids = [unit_pk for (unit_pk,) in db.session.query(EmergencyUnit.id)]
+        busy = rng.sample(ids, len(ids) // 3)
+        db.session.execute(db.update(EmergencyUnit).where(EmergencyUnit.id.in_(busy)).values(availability_status=False))
+        db.session.commit()
+
+        load_ms, _ = timed(lambda: FleetSnapshot().load(), 1)
+        fleet = FleetSnapshot()
+        fleet.load()
+        fire = EmergencyType.FIRE
+        cases = [
+            ("available units of one type",
+             lambda: [u.id for u in EmergencyUnit.query.filter_by(service_type=fire, availability_status=True)],
+             lambda: fleet.available_ids(fire)),
+            ("counts per type", orm_counts, fleet.counts),
+            ("utilization", lambda: Statistics()._unit_utilization(), fleet.utilization),
+            ("nearest 10 of one type", lambda: orm_rank(fire, 10), lambda: fleet.rank(fire, LATITUDE, LONGITUDE, 10)),
+            ("rank all of one type", lambda: orm_rank(fire), lambda: fleet.rank(fire, LATITUDE, LONGITUDE)),
+        ]
+        print(f"{len(fleet)} units, snapshot load {load_ms:.0f} ms\n")
+        print(f"{'query':<30}{'ORM ms':>10}{'snapshot ms':>13}{'speedup':>9}")
+        for name, orm, snapshot in cases:
+            db.session.expire_all()
+            orm_ms, expected = timed(orm, args.repeat)
+            fleet_ms, got = timed(snapshot, args.repeat)
+            assert same(expected, got), name
+            print(f"{name:<30}{orm_ms:>10.1f}{fleet_ms:>13.1f}{orm_ms / fleet_ms:>8.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Shared setup for benchmarks: a throwaway Flask app on its own SQLite file."""
+import os
+import random
+import tempfile
+
+from flask import Flask
+
+from config import Config
+from database import db, init_db
+from models import EmergencyUnit, EmergencyType
+
+UNIT_PREFIXES = {EmergencyType.POLICE: "POLICE", EmergencyType.FIRE: "FIRE", EmergencyType.MEDICAL: "EMS"}
+
+
+def create_benchmark_app(database_uri=None, units_per_type=5, seed=42, config=None):
+    """Build an app bound to a fresh database seeded with units (see seed_units); config overrides Config"""
+    if database_uri is None:
+        handle, path = tempfile.mkstemp(prefix="dispatch-bench-", suffix=".db")
+        os.close(handle)
+        database_uri = f"sqlite:///{path}"
+    app = Flask("benchmark")
+    app.config.from_object(Config)
+    app.config["SQLALCHEMY_DATABASE_URI"] = database_uri
+    app.config.update(config or {})
+    init_db(app)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed_units(units_per_type, seed)
+    return app
+
+
+def seed_units(units_per_type, seed=42):
+    """Insert units around the reference point; units_per_type is a count or {EmergencyType: count}"""
+    if not isinstance(units_per_type, dict):
+        units_per_type = dict.fromkeys(UNIT_PREFIXES, units_per_type)
+    rng = random.Random(seed)
+    rows = []
+    for service_type, count in units_per_type.items():
+        prefix = UNIT_PREFIXES[service_type]
+        for i in range(1, count + 1):
+            rows.append({
+                "unit_id": f"{prefix}-{i:05d}",
+                "service_type": service_type,
+                "availability_status": True,
+                "latitude": Config.DISPATCH_REFERENCE_LATITUDE + rng.uniform(-0.1, 0.1),
+                "longitude": Config.DISPATCH_REFERENCE_LONGITUDE + rng.uniform(-0.14, 0.14),
+            })
+    if rows:
+        db.session.execute(db.insert(EmergencyUnit), rows)
+        db.session.commit()
@@ -0,0 +1,68 @@
+"""Outbox relay throughput by batch size, and what a slow transport would cost if called inside dispatch.
+
+Run from the project root:  python -m benchmarks.outbox_bench [--messages 5000] [--latency-ms 2]
+"""
+import argparse
+import time
+
+from benchmarks.harness import create_benchmark_app
+from models import EmergencyType, OutboxMessage
+from database import db
+from services import outbox
+from services.enhanced_dispatch_service import EnhancedDispatchService
+
+
+class SlowTransport(outbox.StubTransport):
+    """Stub transport with a fixed per-send round trip, like a push gateway"""
+
+    def __init__(self, latency):
+        super().__init__()
+        self.latency = latency
+
+    def send(self, messages):
+        time.sleep(self.latency)
+        return super().send(messages)
+
+
+def fill(count):
+    db.session.execute(db.delete(OutboxMessage))
+    for i in range(count):
+        outbox.enqueue(OutboxMessage.UNIT_NOTIFICATION, f"bench:{i}", "FIRE-01", {"i": i})
+    db.session.commit()
+
+
+def run(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--latency-ms", type=float, default=2.0)
+    parser.add_argument("--dispatches", type=int, default=200)
+    args = parser.parse_args(argv)
+    latency = args.latency_ms / 1000
+
+    app = create_benchmark_app(units_per_type={EmergencyType.FIRE: args.dispatches})
+    with app.app_context():
+        baseline = None
+        for batch_size in (1, 10, 100, 500):
+            fill(args.messages)
+            relay = outbox.OutboxRelay(app, SlowTransport(latency), batch_size=batch_size)
+            started = time.perf_counter()
+            summary = relay.flush()
+            elapsed = time.perf_counter() - started
+            assert summary['delivered'] == args.messages and len(relay.transport.delivered) == args.messages
+            rate = args.messages / elapsed
+            baseline = baseline or rate
+            print(f"batch {batch_size:>4}: {rate:9.0f} msg/s ({elapsed:6.2f} s) | {rate / baseline:6.1f}x")
+
+        service = EnhancedDispatchService()
+        ids = [service.log_emergency_call(f"Caller {i}", "0700000000", "Scene", EmergencyType.FIRE).id
+               for i in range(args.dispatches)]
+        started = time.perf_counter()
+        for call_id in ids:
+            service.dispatch_unit(call_id)
+        per_dispatch = (time.perf_counter() - started) / args.dispatches
+        print(f"dispatch with outbox row: {per_dispatch * 1000:6.2f} ms; an inline send would add "
+              f"{args.latency_ms:.2f} ms per dispatch inside the write transaction")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,182 @@
+"""Check that the hot dashboard/dispatch/statistics queries are served by indexes.
+
+Builds a SQLite database with a long call history (1M calls by default, almost
+all completed), then runs the real service queries with EXPLAIN QUERY PLAN
+captured for every statement. Each check names the indexes its table must be
+searched through; the script exits non-zero if any query falls back to a full
+table scan.
+
+Run from the project root:
+
+    python -m benchmarks.query_plans --rows 1000000
+"""
+import argparse
+import datetime
+import random
+import sys
+import time
+import types
+
+from sqlalchemy import event, text
+
+from benchmarks.harness import create_benchmark_app
+from database import db
+from models import CallStatus, EmergencyCall, EmergencyType, EmergencyUnit, InterventionReport
+from services.cad_service import CADService
+from services.counters import StatisticsCounters
+from services.dispatch_scheduler import DispatchScheduler
+from services.response_analytics import ResponseTimeAnalytics
+from services.spatial_index import SpatialIndex
+from services.state_cache import HotStateCache
+
+OPEN_STATUSES = [CallStatus.LOGGED, CallStatus.DISPATCHED, CallStatus.EN_ROUTE, CallStatus.ON_SCENE]
+OPEN_FRACTION = 0.0005
+REPORT_FRACTION = 0.25
+
+
+class PlanCapture:
+    """Records (sql, plan details) for every statement executed while attached"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.plans = []
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if executemany or not statement.lstrip().upper().startswith("SELECT"):
+            return
+        rows = cursor.connection.execute("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+        self.plans.append((statement, [row[-1] for row in rows]))
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+
+
+def populate(rows, seed=7, chunk=50000):
+    """Insert `rows` calls over the past year plus a report for a share of the completed ones"""
+    rng = random.Random(seed)
+    now = datetime.datetime.utcnow()
+    unit_ids = [unit_pk for (unit_pk,) in db.session.query(EmergencyUnit.id)]
+    # A third of the fleet is out on calls
+    busy = rng.sample(unit_ids, len(unit_ids) // 3)
+    db.session.execute(db.update(EmergencyUnit).where(EmergencyUnit.id.in_(busy)).values(availability_status=False))
+    types_ = list(EmergencyType)
+    call_id = 0
+    for start in range(0, rows, chunk):
+        calls, reports = [], []
+        for _ in range(min(chunk, rows - start)):
+            call_id += 1
+            logged = now - datetime.timedelta(minutes=(rows - call_id) * 525600 / rows)
+            is_open = rng.random() < OPEN_FRACTION
+            calls.append({
+                "id": call_id,
+                "caller_name": "Caller",
+                "phone_number": "0700000000",
+                "location": "Somewhere",
+                "emergency_type": rng.choice(types_),
+                "timestamp": logged,
+                "status": rng.choice(OPEN_STATUSES) if is_open else CallStatus.COMPLETED,
+                "unit_id": rng.choice(unit_ids),
+                "dispatched_at": logged + datetime.timedelta(minutes=2),
+                "completed_at": None if is_open else logged + datetime.timedelta(minutes=40)
+            })
+            if not is_open and rng.random() < REPORT_FRACTION:
+                reports.append({"call_id": call_id, "details": "Handled", "timestamp": logged})
+        db.session.execute(db.insert(EmergencyCall), calls)
+        if reports:
+            db.session.execute(db.insert(InterventionReport), reports)
+        db.session.commit()
+    db.session.execute(text("ANALYZE"))
+    db.session.commit()
+
+
+def checks(rows):
+    cad = CADService(counters=StatisticsCounters(), state_cache=HotStateCache())
+    scheduler = DispatchScheduler(None, types.SimpleNamespace(spatial_index=SpatialIndex()))
+    last_day = datetime.datetime.utcnow() - datetime.timedelta(days=1)
+    sample_call = rows // 2
+    return [
+        ("open calls (cache load)", lambda: HotStateCache().load(),
+         {"emergency_call": {"ix_emergency_call_open"}}),
+        ("dispatch backlog (scheduler)", scheduler._load,
+         {"emergency_call": {"ix_emergency_call_open", "ix_emergency_call_status_type"},
+          "emergency_unit": {"ix_emergency_unit_available"}}),
+        ("counter reconcile", lambda: StatisticsCounters().reconcile(),
+         {"emergency_call": {"ix_emergency_call_status_type", "ix_emergency_call_type_timestamp"},
+          "emergency_unit": {"ix_emergency_unit_type_availability"},
+          "intervention_report": {"ix_intervention_report_call_id"}}),
+        ("open calls by type (/api/calls)",
+         lambda: db.session.execute(cad.call_listing(statuses=OPEN_STATUSES[:2], emergency_type=EmergencyType.FIRE,
+                                                     limit=100)).all(),
+         {"emergency_call": {"ix_emergency_call_status_type"}}),
+        ("calls for one unit (/api/calls)",
+         lambda: db.session.execute(cad.call_listing(unit="1", limit=100)).all(),
+         {"emergency_call": {"ix_emergency_call_unit_id"}}),
+        ("calls in the last day (/api/calls)",
+         lambda: db.session.execute(cad.call_listing(since=last_day, limit=1000)).all(),
+         {"emergency_call": {"ix_emergency_call_timestamp", "ix_emergency_call_type_timestamp"}}),
+        ("available units by type (/api/units, dispatch fallback)",
+         lambda: db.session.execute(cad.unit_listing(service_type=EmergencyType.MEDICAL, available=True)).all(),
+         {"emergency_unit": {"ix_emergency_unit_available", "ix_emergency_unit_type_availability"}}),
+        ("reports for a call",
+         lambda: db.session.get(EmergencyCall, sample_call).reports,
+         {"intervention_report": {"ix_intervention_report_call_id"}}),
+        ("response-time warm-up (last day)", lambda: ResponseTimeAnalytics().warm(since=last_day),
+         {"emergency_call": {"ix_emergency_call_timestamp"}}),
+    ]
+
+
+def _table_lines(details, table):
+    return [line for line in details if line.split(" ")[:2] in (["SCAN", table], ["SEARCH", table])]
+
+
+def run_check(name, func, expected):
+    db.session.expire_all()
+    with PlanCapture(db.engine) as capture:
+        started = time.perf_counter()
+        func()
+        elapsed = (time.perf_counter() - started) * 1000
+    failures = []
+    used = []
+    for table, indexes in expected.items():
+        lines = [line for _, details in capture.plans for line in _table_lines(details, table)]
+        if not lines:
+            failures.append(f"no query touched {table}")
+        for line in lines:
+            used.append(line)
+            if not any(line.endswith(f"INDEX {index}") or f"INDEX {index} (" in line for index in indexes):
+                failures.append(f"{line} (expected one of {sorted(indexes)})")
+    return elapsed, used, failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000, help="number of calls in the history")
+    parser.add_argument("--units", type=int, default=1000, help="units per service type")
+    args = parser.parse_args(argv)
+
+    app = create_benchmark_app(units_per_type=args.units)
+    with app.app_context():
+        started = time.perf_counter()
+        populate(args.rows)
+        print(f"Loaded {args.rows} calls in {time.perf_counter() - started:.1f}s\n")
+        failed = 0
+        for name, func, expected in checks(args.rows):
+            elapsed, used, failures = run_check(name, func, expected)
+            print(f"{'FAIL' if failures else 'ok':<5}{name:<56}{elapsed:>10.1f} ms")
+            for line in used:
+                print(f"       {line}")
+            for failure in failures:
+                print(f"    !! {failure}")
+            failed += bool(failures)
+    if failed:
+        print(f"\n{failed} query plan check(s) failed")
+        sys.exit(1)
+    print("\nAll hot queries use their indexes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Year-range statistics computed from the call history vs. read from the rollup tables.
+
+Loads a year of calls (see query_plans.populate), backfills the rollups, then
+times the same questions both ways: calls per day and type, response-time
+average/median/p90/max, and per-unit workload.
+
+Run from the project root:  python -m benchmarks.rollup_bench [--rows 200000]
+"""
+import argparse
+import datetime
+import time
+
+from benchmarks.harness import create_benchmark_app
+from benchmarks.query_plans import populate
+from database import db
+from models import CallStatus, EmergencyCall, EmergencyUnit
+from services.report_engine import ReportEngine
+from services.counters import StatisticsCounters
+from services.response_analytics import ResponseTimeAnalytics
+from services.rollups import RollupStore
+
+
+def from_history(since):
+    """What the statistics needed before rollups: grouped scans plus every arrival time"""
+    day = db.func.strftime('%Y-%m-%d', EmergencyCall.timestamp)
+    per_day = db.session.execute(
+        db.select(day, EmergencyCall.emergency_type, db.func.count())
+        .where(EmergencyCall.timestamp >= since, EmergencyCall.status == CallStatus.COMPLETED)
+        .group_by(day, EmergencyCall.emergency_type)).all()
+    arrivals = db.session.execute(
+        db.select(EmergencyCall.timestamp, db.func.coalesce(EmergencyCall.on_scene_at, EmergencyCall.completed_at))
+        .where(EmergencyCall.timestamp >= since, EmergencyCall.status == CallStatus.COMPLETED))
+    minutes = sorted((arrived - logged).total_seconds() / 60 for logged, arrived in arrivals)
+    workload = db.session.execute(
+        db.select(EmergencyUnit.unit_id, db.func.count())
+        .select_from(EmergencyCall)
+        .join(EmergencyUnit, EmergencyUnit.id == EmergencyCall.unit_id)
+        .where(EmergencyCall.timestamp >= since, EmergencyCall.status == CallStatus.COMPLETED)
+        .group_by(EmergencyUnit.unit_id)).all()
+    return len(per_day), len(minutes), len(workload)
+
+
+def from_rollups(rollups, since, until):
+    summary = rollups.summary(since, until)
+    series = rollups.series(since, until, 'day')
+    workload = rollups.unit_workload(since, until)
+    return len(series), summary['response_times']['count'], len(workload)
+
+
+def timed(func, repeat=5):
+    best = None
+    for _ in range(repeat):
+        db.session.expire_all()
+        started = time.perf_counter()
+        result = func()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200000)
+    args = parser.parse_args(argv)
+
+    app = create_benchmark_app(units_per_type=300)
+    with app.app_context():
+        populate(args.rows)
+        rollups = RollupStore()
+        started = time.perf_counter()
+        rolled = rollups.backfill()
+        print(f"Backfilled {rolled} completed calls in {time.perf_counter() - started:.1f}s\n")
+
+        until = datetime.datetime.utcnow()
+        since = until - datetime.timedelta(days=365)
+        history_ms, (days, responses, units) = timed(lambda: from_history(since), repeat=2)
+        rollup_ms, (rollup_days, rollup_responses, rollup_units) = timed(lambda: from_rollups(rollups, since, until))
+        assert rollup_responses == responses and rollup_units == units and abs(rollup_days * 3 - days) <= 3
+        print(f"{'year of statistics':<32}{'ms':>10}")
+        print(f"{'from the call history':<32}{history_ms:>10.1f}")
+        print(f"{'from the rollups':<32}{rollup_ms:>10.1f}   ({history_ms / rollup_ms:.0f}x)")
+
+        engine = ReportEngine(StatisticsCounters(), ResponseTimeAnalytics(), rollups=rollups)
+        report_ms, _ = timed(lambda: engine.collect(365), repeat=2)
+        print(f"{'PDF report data, 365 days':<32}{report_ms:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
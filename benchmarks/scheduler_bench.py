@@ -0,0 +1,78 @@
+"""Simulate an overloaded shift and compare the batch scheduler with first-come greedy dispatch.
+
+Run from the project root:  python -m benchmarks.scheduler_bench
+"""
+import math
+import random
+import time
+
+from models import EmergencyType
+from services.dispatch_scheduler import AssignmentPlanner, IdleUnit, PendingCall, greedy_plan
+
+REGION_KM = 25.0
+UNITS_PER_TYPE = 25
+CALLS_PER_MINUTE = 3.2        # across all types; the fleet is saturated at peak
+ON_SCENE_MINUTES = 15.0
+SPEED_KMH = 40.0
+SHIFT_MINUTES = 8 * 60
+TICK_MINUTES = 1.0
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else float("nan")
+
+
+def simulate(policy, seed=1):
+    rng = random.Random(seed)
+    types = list(EmergencyType)
+    units = {}  # unit id -> [service_type, x, y, free_at]
+    for service_type in types:
+        for _ in range(UNITS_PER_TYPE):
+            units[len(units)] = [service_type, rng.uniform(0, REGION_KM), rng.uniform(0, REGION_KM), 0.0]
+    pending = {}  # call id -> (type, x, y, arrived_at)
+    waits, responses = [], []
+    next_call_at = rng.expovariate(CALLS_PER_MINUTE)
+    next_id = 0
+    now = 0.0
+    while now < SHIFT_MINUTES:
+        while next_call_at <= now:
+            pending[next_id] = (rng.choice(types), rng.uniform(0, REGION_KM), rng.uniform(0, REGION_KM), next_call_at)
+            next_id += 1
+            next_call_at += rng.expovariate(CALLS_PER_MINUTE)
+        calls = [PendingCall(call_id, t, x, y, now - arrived) for call_id, (t, x, y, arrived) in pending.items()]
+        idle = [IdleUnit(unit_id, t, x, y) for unit_id, (t, x, y, free_at) in units.items() if free_at <= now]
+        for unit, call in policy(calls, idle):
+            travel = math.hypot(unit.x - call.x, unit.y - call.y) / SPEED_KMH * 60
+            waits.append(call.waited_minutes)
+            responses.append(call.waited_minutes + travel)
+            units[unit.id] = [unit.service_type, call.x, call.y,
+                              now + travel + rng.expovariate(1 / ON_SCENE_MINUTES)]
+            del pending[call.id]
+        now += TICK_MINUTES
+    return waits, responses, len(pending)
+
+
+def tick_latency(planner, pending_calls=3000, idle_units=300, seed=3):
+    rng = random.Random(seed)
+    types = list(EmergencyType)
+    calls = [PendingCall(i, rng.choice(types), rng.uniform(0, REGION_KM), rng.uniform(0, REGION_KM),
+                         rng.uniform(0, 30)) for i in range(pending_calls)]
+    units = [IdleUnit(i, rng.choice(types), rng.uniform(0, REGION_KM), rng.uniform(0, REGION_KM))
+             for i in range(idle_units)]
+    start = time.perf_counter()
+    pairs = planner.plan(calls, units)
+    return time.perf_counter() - start, len(pairs)
+
+
+if __name__ == "__main__":
+    planner = AssignmentPlanner(speed_kmh=SPEED_KMH)
+    for label, policy in (("greedy (first come)", greedy_plan), ("batch assignment", planner.plan)):
+        waits, responses, backlog = simulate(policy)
+        print(f"{label:>20}: {len(responses):5d} served | wait mean {sum(waits) / len(waits):6.1f} "
+              f"p99 {percentile(waits, 0.99):6.1f} min | response mean {sum(responses) / len(responses):6.1f} "
+              f"p99 {percentile(responses, 0.99):6.1f} min | backlog at end {backlog}")
+    for pending_calls, idle_units in ((1000, 100), (3000, 300), (5000, 1000)):
+        elapsed, assigned = tick_latency(planner, pending_calls, idle_units)
+        print(f"tick with {pending_calls} pending calls / {idle_units} idle units: "
+              f"{assigned} assigned in {elapsed * 1000:.0f} ms (budget {planner.time_budget * 1000:.0f} ms)")
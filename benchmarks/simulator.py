@@ -0,0 +1,242 @@
+"""Discrete-event simulation of a dispatch centre driven through EnhancedDispatchService.
+
+Calls arrive as independent Poisson streams per emergency type and go through
+the real service end to end: log -> dispatch -> EN_ROUTE -> ON_SCENE ->
+COMPLETED -> intervention report. Simulated time decides *when* each step
+happens; the service calls themselves run against a real database, so the
+report covers both sides:
+
+* capacity planning: simulated waiting, travel and on-scene times per type,
+  and how many calls were still queued at the end of the run;
+* regression benchmark: wall-clock latency and SQL statements per service
+  operation, and overall operations per second.
+
+Run from the project root, e.g.:
+
+    python -m benchmarks.simulator --hours 4 --rate police=12 --rate fire=3 \
+        --rate medical=9 --fleet police=8 --fleet fire=4 --fleet medical=6
+"""
+import argparse
+import collections
+import heapq
+import itertools
+import json
+import math
+import random
+import time
+
+from sqlalchemy import event
+
+from benchmarks.harness import create_benchmark_app
+from config import Config
+from database import db
+from models import CallStatus, EmergencyType
+from services.enhanced_dispatch_service import EnhancedDispatchService
+from services.response_analytics import QuantileSketch
+
+DEFAULT_RATES = {EmergencyType.POLICE: 12.0, EmergencyType.FIRE: 3.0, EmergencyType.MEDICAL: 9.0}  # calls/hour
+DEFAULT_FLEET = {EmergencyType.POLICE: 8, EmergencyType.FIRE: 4, EmergencyType.MEDICAL: 6}
+DEFAULT_ON_SCENE = {EmergencyType.POLICE: 25.0, EmergencyType.FIRE: 45.0, EmergencyType.MEDICAL: 35.0}  # minutes
+
+
+class QueryCounter:
+    """Counts SQL statements issued on an engine while attached"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+
+
+class DispatchSimulator:
+    def __init__(self, service, rates=None, on_scene_minutes=None, speed_kmh=40.0,
+                 turnout_minutes=1.5, region_degrees=0.1, seed=1):
+        self.service = service
+        self.rates = rates or DEFAULT_RATES
+        self.on_scene_minutes = on_scene_minutes or DEFAULT_ON_SCENE
+        self.speed_kmh = speed_kmh
+        self.turnout_minutes = turnout_minutes
+        self.region_degrees = region_degrees
+        self.rng = random.Random(seed)
+        self._events = []
+        self._sequence = itertools.count()
+        self._waiting = collections.defaultdict(collections.deque)  # type -> call ids
+        self._calls = {}  # call id -> dict of simulated timestamps and position
+        self.wall = collections.defaultdict(QuantileSketch)      # operation -> milliseconds
+        self.queries = collections.Counter()                      # operation -> SQL statements
+        self.operations = collections.Counter()
+        self.stages = collections.defaultdict(QuantileSketch)     # (stage, type) -> simulated minutes
+        self.completed = collections.Counter()
+
+    def _schedule(self, at, kind, payload):
+        heapq.heappush(self._events, (at, next(self._sequence), kind, payload))
+
+    def _timed(self, operation, func, *args, **kwargs):
+        with QueryCounter(db.engine) as counter:
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.wall[operation].add((time.perf_counter() - started) * 1000)
+                self.queries[operation] += counter.count
+                self.operations[operation] += 1
+
+    def _random_position(self):
+        return (Config.DISPATCH_REFERENCE_LATITUDE + self.rng.uniform(-self.region_degrees, self.region_degrees),
+                Config.DISPATCH_REFERENCE_LONGITUDE + self.rng.uniform(-self.region_degrees * 1.4,
+                                                                        self.region_degrees * 1.4))
+
+    def run(self, hours):
+        horizon = hours * 60
+        for emergency_type, per_hour in self.rates.items():
+            if per_hour > 0:
+                self._schedule(self.rng.expovariate(per_hour / 60), "arrival", emergency_type)
+        started = time.perf_counter()
+        now = 0.0
+        while self._events and self._events[0][0] <= horizon:
+            now, _, kind, payload = heapq.heappop(self._events)
+            getattr(self, f"_on_{kind}")(now, payload)
+        wall_seconds = time.perf_counter() - started
+        return self.report(hours, wall_seconds)
+
+    def _on_arrival(self, now, emergency_type):
+        self._schedule(now + self.rng.expovariate(self.rates[emergency_type] / 60), "arrival", emergency_type)
+        latitude, longitude = self._random_position()
+        call = self._timed("log_call", self.service.log_emergency_call,
+                           "Simulated caller", "0700000000", "Simulated location", emergency_type,
+                           latitude=latitude, longitude=longitude)
+        self._calls[call.id] = {"type": emergency_type, "arrived": now, "position": (latitude, longitude)}
+        self._waiting[emergency_type].append(call.id)
+        self._dispatch_waiting(now, emergency_type)
+
+    def _dispatch_waiting(self, now, emergency_type):
+        queue = self._waiting[emergency_type]
+        while queue:
+            call_id = queue[0]
+            try:
+                unit = self._timed("dispatch", self.service.dispatch_unit, call_id)
+            except ValueError:
+                db.session.rollback()
+                return
+            queue.popleft()
+            sim = self._calls[call_id]
+            sim["dispatched"] = now
+            sim["unit"] = unit.id
+            distance = math.hypot(*(a - b for a, b in zip(
+                self.service.spatial_index.project(unit.latitude, unit.longitude),
+                self.service.spatial_index.project(*sim["position"])
+            )))
+            travel = distance / self.speed_kmh * 60
+            self._schedule(now + self.turnout_minutes, "en_route", call_id)
+            self._schedule(now + self.turnout_minutes + travel, "on_scene", call_id)
+
+    def _on_en_route(self, now, call_id):
+        self._timed("transition", self.service.update_unit_status, call_id, CallStatus.EN_ROUTE)
+
+    def _on_on_scene(self, now, call_id):
+        self._timed("transition", self.service.update_unit_status, call_id, CallStatus.ON_SCENE)
+        sim = self._calls[call_id]
+        sim["on_scene"] = now
+        mean = self.on_scene_minutes[sim["type"]]
+        self._schedule(now + self.rng.expovariate(1 / mean), "completed", call_id)
+
+    def _on_completed(self, now, call_id):
+        sim = self._calls.pop(call_id)
+        self._timed("transition", self.service.update_unit_status, call_id, CallStatus.COMPLETED)
+        self._timed("report", self.service.submit_intervention_report, call_id, "Simulated intervention")
+        # The unit is now free at the incident location
+        self._timed("position", self.service.update_unit_position, sim["unit"], *sim["position"])
+        emergency_type = sim["type"]
+        self.completed[emergency_type] += 1
+        self.stages[("wait", emergency_type)].add(sim["dispatched"] - sim["arrived"])
+        self.stages[("travel", emergency_type)].add(sim["on_scene"] - sim["dispatched"])
+        self.stages[("on_scene", emergency_type)].add(now - sim["on_scene"])
+        self.stages[("response", emergency_type)].add(sim["on_scene"] - sim["arrived"])
+        self._dispatch_waiting(now, emergency_type)
+
+    def report(self, hours, wall_seconds):
+        total_operations = sum(self.operations.values())
+        return {
+            "simulated_hours": hours,
+            "wall_seconds": round(wall_seconds, 3),
+            "completed_calls": {t.value: self.completed[t] for t in self.rates},
+            "completed_per_hour": round(sum(self.completed.values()) / hours, 2),
+            "still_waiting": {t.value: len(self._waiting[t]) for t in self.rates},
+            "operations_per_second": round(total_operations / wall_seconds, 1) if wall_seconds else None,
+            "stages_minutes": {
+                f"{stage}/{emergency_type.value}": sketch.summary()
+                for (stage, emergency_type), sketch in sorted(self.stages.items(), key=lambda i: (i[0][0], i[0][1].value))
+            },
+            "operations": {
+                operation: {
+                    "count": self.operations[operation],
+                    "latency_ms": {key: value for key, value in sketch.summary().items() if key != "count"},
+                    "queries_per_op": round(self.queries[operation] / self.operations[operation], 2)
+                }
+                for operation, sketch in self.wall.items()
+            }
+        }
+
+
+def _type_map(values, cast):
+    result = {}
+    for value in values or []:
+        name, _, amount = value.partition("=")
+        result[EmergencyType[name.upper()]] = cast(amount)
+    return result
+
+
+def print_report(report):
+    print(f"Simulated {report['simulated_hours']}h in {report['wall_seconds']}s wall clock, "
+          f"{report['operations_per_second']} service operations/s")
+    print(f"Completed {report['completed_per_hour']} calls/hour: {report['completed_calls']}; "
+          f"still waiting: {report['still_waiting']}")
+    print("\nSimulated stage times (minutes)")
+    for name, summary in report["stages_minutes"].items():
+        print(f"  {name:<18} n={summary['count']:<6} mean={summary['average']!s:<8} p50={summary['median']!s:<8} "
+              f"p90={summary['p90']!s:<8} p99={summary['p99']!s:<8}")
+    print("\nService operations (wall clock)")
+    for name, data in report["operations"].items():
+        latency = data["latency_ms"]
+        print(f"  {name:<12} n={data['count']:<6} p50={latency['median']}ms p99={latency['p99']}ms "
+              f"max={latency['max']}ms queries/op={data['queries_per_op']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hours", type=float, default=4)
+    parser.add_argument("--rate", action="append", metavar="TYPE=CALLS_PER_HOUR")
+    parser.add_argument("--fleet", action="append", metavar="TYPE=UNITS")
+    parser.add_argument("--on-scene", action="append", metavar="TYPE=MINUTES")
+    parser.add_argument("--speed", type=float, default=40.0, help="average unit speed in km/h")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--database", help="SQLAlchemy URI (default: throwaway SQLite file)")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    rates = {**DEFAULT_RATES, **_type_map(args.rate, float)}
+    fleet = {**DEFAULT_FLEET, **_type_map(args.fleet, int)}
+    on_scene = {**DEFAULT_ON_SCENE, **_type_map(args.on_scene, float)}
+
+    app = create_benchmark_app(args.database, units_per_type=fleet, seed=args.seed)
+    with app.app_context():
+        simulator = DispatchSimulator(EnhancedDispatchService(), rates, on_scene, speed_kmh=args.speed, seed=args.seed)
+        report = simulator.run(args.hours)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Compare SpatialIndex k-nearest queries with a brute-force scan over the fleet.
+
+Run from the project root:  python -m benchmarks.spatial_index_bench
+"""
+import heapq
+import math
+import random
+import time
+
+from models import EmergencyType
+from services.spatial_index import SpatialIndex
+
+CENTER_LAT, CENTER_LON = 45.75, 21.23
+QUERIES = 2000
+K = 3
+
+
+def build_fleet(size, rng):
+    types = list(EmergencyType)
+    return [
+        (unit_pk, types[unit_pk % len(types)],
+         CENTER_LAT + rng.uniform(-0.5, 0.5), CENTER_LON + rng.uniform(-0.7, 0.7))
+        for unit_pk in range(size)
+    ]
+
+
+def brute_force(index, fleet, service_type, latitude, longitude, k):
+    qx, qy = index.project(latitude, longitude)
+    candidates = []
+    for unit_pk, unit_type, lat, lon in fleet:
+        if unit_type is service_type:
+            x, y = index.project(lat, lon)
+            candidates.append((math.hypot(x - qx, y - qy), unit_pk))
+    return heapq.nsmallest(k, candidates)
+
+
+def run(size):
+    rng = random.Random(size)
+    fleet = build_fleet(size, rng)
+    index = SpatialIndex()
+    for unit_pk, service_type, lat, lon in fleet:
+        index.insert(unit_pk, service_type, lat, lon)
+    queries = [
+        (rng.choice(list(EmergencyType)), CENTER_LAT + rng.uniform(-0.5, 0.5), CENTER_LON + rng.uniform(-0.7, 0.7))
+        for _ in range(QUERIES)
+    ]
+
+    start = time.perf_counter()
+    indexed = [index.nearest(t, lat, lon, K) for t, lat, lon in queries]
+    index_us = (time.perf_counter() - start) / QUERIES * 1e6
+
+    brute_queries = queries[:max(20, QUERIES * 1000 // size)]
+    start = time.perf_counter()
+    brute = [brute_force(index, fleet, t, lat, lon, K) for t, lat, lon in brute_queries]
+    brute_us = (time.perf_counter() - start) / len(brute_queries) * 1e6
+
+    for got, expected in zip(indexed, brute):
+        assert [pk for _, pk in got] == [pk for _, pk in expected], "index disagrees with brute force"
+
+    print(f"{size:>8} units | grid {index_us:9.1f} us/query | brute force {brute_us:11.1f} us/query "
+          f"| speedup {brute_us / index_us:7.1f}x")
+
+
+if __name__ == "__main__":
+    for fleet_size in (10_000, 100_000):
+        run(fleet_size)
@@ -0,0 +1,66 @@
+"""GPS pings written one commit each (update_unit_position) vs. coalesced by the telemetry pipeline.
+
+Run from the project root:  python -m benchmarks.telemetry_bench [--units 1000] [--pings 5]
+"""
+import argparse
+import random
+import time
+
+from benchmarks.harness import create_benchmark_app
+from models import EmergencyUnit
+from database import db
+from services.enhanced_dispatch_service import EnhancedDispatchService
+from services.telemetry import TelemetryPipeline
+
+
+def pings(unit_ids, rounds, seed=7):
+    """rounds pings per unit, interleaved the way a fleet would send them"""
+    rng = random.Random(seed)
+    return [{"unit_id": unit_id, "latitude": 45.75 + rng.uniform(-0.1, 0.1),
+             "longitude": 21.23 + rng.uniform(-0.14, 0.14)}
+            for _ in range(rounds) for unit_id in unit_ids]
+
+
+def run(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--units", type=int, default=1000)
+    parser.add_argument("--pings", type=int, default=5, help="pings per unit")
+    parser.add_argument("--batch", type=int, default=500, help="pings per POST")
+    args = parser.parse_args(argv)
+
+    app = create_benchmark_app(units_per_type=args.units // 3)
+    with app.app_context():
+        service = EnhancedDispatchService()
+        unit_ids = list(db.session.execute(db.select(EmergencyUnit.id)).scalars())
+        updates = pings(unit_ids, args.pings)
+
+        started = time.perf_counter()
+        for update in updates:
+            service.update_unit_position(update["unit_id"], update["latitude"], update["longitude"])
+        direct = time.perf_counter() - started
+
+        pipeline = TelemetryPipeline(app, service)
+        service.telemetry = pipeline
+        updates = pings(unit_ids, args.pings, seed=8)
+        last = {update["unit_id"]: update for update in updates}
+        started = time.perf_counter()
+        for offset in range(0, len(updates), args.batch):
+            pipeline.ingest(updates[offset:offset + args.batch])
+        ingested = time.perf_counter() - started
+        summary = pipeline.flush()
+        coalesced = time.perf_counter() - started
+
+        db.session.expire_all()
+        for unit in EmergencyUnit.query.all():
+            assert unit.latitude == last[unit.id]["latitude"]
+            assert service.fleet.view(unit.id).latitude == last[unit.id]["latitude"]
+        assert summary["positions"] == len(unit_ids)
+
+    count = len(updates)
+    print(f"one commit per ping: {count / direct:9.0f} pings/s ({direct:6.2f} s for {count})")
+    print(f"ingest + one flush:  {count / coalesced:9.0f} pings/s ({coalesced:6.2f} s; ingest alone "
+          f"{count / ingested:.0f} pings/s) | {direct / coalesced:5.1f}x")
+
+
+if __name__ == "__main__":
+    run()
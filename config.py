@@ -1,6 +1,83 @@
 import os
 
 class Config:
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///emergency_dispatch.db'
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///emergency_dispatch.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Read-only listings and streams use their own engine (and pool) so they never
+    # hold a writer connection; DATABASE_READ_URL can point it at a replica.
+    DB_SEPARATE_READER = os.environ.get('DB_SEPARATE_READER', '1') == '1'
+    DATABASE_READ_URL = os.environ.get('DATABASE_READ_URL')
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '5'))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', '10'))
+    DB_READ_POOL_SIZE = int(os.environ.get('DB_READ_POOL_SIZE', '10'))
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '30'))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', '1800'))
+
+    # SQLite pragmas set on every new connection (ignored on other databases)
+    SQLITE_TUNING = os.environ.get('SQLITE_TUNING', '1') == '1'
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+    SQLITE_CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB', '65536'))
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
     SECRET_KEY = os.environ.get('SECRET_KEY', 'dev_key')
+
+    # Nearest-unit selection: grid cell size of the spatial index and the latitude
+    # the local distance projection is centred on (Timisoara by default).
+    SPATIAL_INDEX_CELL_KM = float(os.environ.get('SPATIAL_INDEX_CELL_KM', '2.0'))
+    DISPATCH_REFERENCE_LATITUDE = float(os.environ.get('DISPATCH_REFERENCE_LATITUDE', '45.75'))
+    DISPATCH_REFERENCE_LONGITUDE = float(os.environ.get('DISPATCH_REFERENCE_LONGITUDE', '21.23'))
+
+    # Optional JSON keyword lexicon for the incident classifier (see services/classifier.py)
+    CLASSIFIER_LEXICON = os.environ.get('CLASSIFIER_LEXICON')
+
+    # Completed calls older than this move to monthly archive tables (flask archive-calls)
+    ARCHIVE_AFTER_DAYS = float(os.environ.get('ARCHIVE_AFTER_DAYS', '90'))
+    ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', '5000'))
+
+    # Worker threads serving queued jobs (automatic dispatch, background reports)
+    JOB_QUEUE_WORKERS = int(os.environ.get('JOB_QUEUE_WORKERS', '4'))
+
+    # Unit notifications: written to the outbox with each dispatch and delivered in
+    # batches by a relay thread (transport "stub" keeps them in memory, "file"
+    # appends NDJSON to OUTBOX_FILE). Failures retry with exponential backoff.
+    OUTBOX_RELAY_ENABLED = os.environ.get('OUTBOX_RELAY_ENABLED', '1') == '1'
+    OUTBOX_TRANSPORT = os.environ.get('OUTBOX_TRANSPORT', 'stub')
+    OUTBOX_FILE = os.environ.get('OUTBOX_FILE', 'outbox/unit_notifications.ndjson')
+    OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', '200'))
+    OUTBOX_FLUSH_INTERVAL = float(os.environ.get('OUTBOX_FLUSH_INTERVAL', '1.0'))
+    OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', '10'))
+    OUTBOX_BACKOFF_SECONDS = float(os.environ.get('OUTBOX_BACKOFF_SECONDS', '1'))
+    OUTBOX_MAX_BACKOFF_SECONDS = float(os.environ.get('OUTBOX_MAX_BACKOFF_SECONDS', '300'))
+
+    # Unit telemetry (POST /api/telemetry): pings are coalesced to the newest per unit
+    # in memory and written every TELEMETRY_FLUSH_INTERVAL seconds in bulk.
+    TELEMETRY_ENABLED = os.environ.get('TELEMETRY_ENABLED', '1') == '1'
+    TELEMETRY_FLUSH_INTERVAL = float(os.environ.get('TELEMETRY_FLUSH_INTERVAL', '1.0'))
+    TELEMETRY_MAX_BATCH = int(os.environ.get('TELEMETRY_MAX_BATCH', '10000'))
+
+    # Batch scheduler that assigns the whole LOGGED backlog every interval
+    SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', '0') == '1'
+    SCHEDULER_INTERVAL = float(os.environ.get('SCHEDULER_INTERVAL', '5'))
+    SCHEDULER_TIME_BUDGET = float(os.environ.get('SCHEDULER_TIME_BUDGET', '0.5'))
+
+    # Several worker processes or hosts behind one database: events, dashboard counters
+    # and the scheduler lease are shared through it (see services/coordination.py).
+    # Each worker syncs every CLUSTER_SYNC_INTERVAL seconds; CLUSTER_WORKER_ID defaults
+    # to host:pid. One worker recounts the shared counters every CLUSTER_RECOUNT_INTERVAL.
+    CLUSTER_MODE = os.environ.get('CLUSTER_MODE', '0') == '1'
+    CLUSTER_WORKER_ID = os.environ.get('CLUSTER_WORKER_ID')
+    CLUSTER_SYNC_INTERVAL = float(os.environ.get('CLUSTER_SYNC_INTERVAL', '0.2'))
+    CLUSTER_EVENT_RETENTION = float(os.environ.get('CLUSTER_EVENT_RETENTION', '300'))
+    CLUSTER_LEASE_SECONDS = float(os.environ.get('CLUSTER_LEASE_SECONDS', '15'))
+    CLUSTER_RECOUNT_INTERVAL = float(os.environ.get('CLUSTER_RECOUNT_INTERVAL', '60'))
+
+    # Request/service/SQL metrics served at /metrics, and the sampling profiler that
+    # writes folded stacks (flamegraph.pl / speedscope input) for slow requests.
+    # The profiler can also be switched at runtime with POST /metrics/profiler.
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+    PROFILER_ENABLED = os.environ.get('PROFILER_ENABLED', '0') == '1'
+    PROFILER_INTERVAL_MS = float(os.environ.get('PROFILER_INTERVAL_MS', '5'))
+    PROFILER_SLOW_MS = float(os.environ.get('PROFILER_SLOW_MS', '500'))
+    PROFILER_DIR = os.environ.get('PROFILER_DIR', 'profiles')
@@ -1,3 +1,67 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 
 db = SQLAlchemy()
+
+READER_BIND = 'reader'
+
+
+def _is_memory_sqlite(uri):
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def _engine_options(config, uri, pool_size, read_only=False):
+    options = {'pool_pre_ping': not uri.startswith('sqlite')}
+    if not _is_memory_sqlite(uri):
+        options.update(pool_size=pool_size, max_overflow=config['DB_MAX_OVERFLOW'],
+                       pool_timeout=config['DB_POOL_TIMEOUT'], pool_recycle=config['DB_POOL_RECYCLE'])
+    if read_only and make_url(uri).get_backend_name() == 'postgresql':
+        options['execution_options'] = {'postgresql_readonly': True}
+    return options
+
+
+def _sqlite_pragmas(config, read_only):
+    pragmas = [
+        f"PRAGMA journal_mode={config['SQLITE_JOURNAL_MODE']}",
+        f"PRAGMA synchronous={config['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA busy_timeout={config['SQLITE_BUSY_TIMEOUT_MS']}",
+        f"PRAGMA cache_size=-{config['SQLITE_CACHE_SIZE_KB']}",
+        f"PRAGMA mmap_size={config['SQLITE_MMAP_SIZE']}",
+    ]
+    if read_only:
+        pragmas.append("PRAGMA query_only=ON")
+
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+    return on_connect
+
+
+def init_db(app):
+    """Bind db to app with pool sizing from the config, a separate reader engine and SQLite pragmas"""
+    config = app.config
+    uri = config['SQLALCHEMY_DATABASE_URI']
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = {**_engine_options(config, uri, config['DB_POOL_SIZE']),
+                                           **config.get('SQLALCHEMY_ENGINE_OPTIONS', {})}
+    # An in-memory SQLite database only exists inside its own engine
+    if config['DB_SEPARATE_READER'] and not _is_memory_sqlite(uri):
+        read_uri = config.get('DATABASE_READ_URL') or uri
+        config['SQLALCHEMY_BINDS'] = {
+            **config.get('SQLALCHEMY_BINDS', {}),
+            READER_BIND: {'url': read_uri, **_engine_options(config, read_uri, config['DB_READ_POOL_SIZE'], True)}
+        }
+    db.init_app(app)
+    with app.app_context():
+        for bind_key, engine in db.engines.items():
+            if engine.dialect.name == 'sqlite' and config['SQLITE_TUNING']:
+                event.listen(engine, 'connect', _sqlite_pragmas(config, bind_key == READER_BIND))
+
+
+def read_engine():
+    """Engine for read-only queries: the reader bind when configured, otherwise the writer"""
+    return db.engines.get(READER_BIND, db.engine)
+
@@ -0,0 +1,242 @@
+"""Versioned schema migrations.
+
+Each migration is a function registered with @migration(version, description)
+and runs once, in version order, inside its own transaction. Applied versions
+are recorded in the `schema_migration` table, so `upgrade()` is safe to call on
+every start: a fresh database and an older one are both brought forward step
+by step from the baseline, and end up with the same schema. Schema changes
+therefore go into a new step, never into an existing one.
+"""
+import datetime
+
+from sqlalchemy import (JSON, Boolean, Column, DateTime, Enum, Float, ForeignKey, Index, Integer, MetaData, String,
+                        Table, Text, inspect, text)
+
+from database import db
+
+MIGRATIONS = []
+
+schema_migration = Table(
+    'schema_migration', MetaData(),
+    Column('version', Integer, primary_key=True),
+    Column('description', String(200), nullable=False),
+    Column('applied_at', DateTime, nullable=False)
+)
+
+
+def migration(version, description):
+    """Register a migration step: func(connection)"""
+    def register(func):
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda item: item[0])
+        return func
+    return register
+
+
+def _create_indexes(connection, table_name, index_names):
+    existing = {index['name'] for index in inspect(connection).get_indexes(table_name)}
+    for index in db.metadata.tables[table_name].indexes:
+        if index.name in index_names and index.name not in existing:
+            index.create(connection)
+
+
+# The schema as it was when versioned migrations were introduced, frozen here so the
+# baseline does not follow later model changes
+baseline = MetaData()
+_emergency_type = Enum('POLICE', 'FIRE', 'MEDICAL', name='emergencytype')
+_call_status = Enum('LOGGED', 'DISPATCHED', 'EN_ROUTE', 'ON_SCENE', 'COMPLETED', name='callstatus')
+
+Table(
+    'emergency_unit', baseline,
+    Column('id', Integer, primary_key=True),
+    Column('unit_id', String(50), unique=True, nullable=False),
+    Column('service_type', _emergency_type, nullable=False),
+    Column('availability_status', Boolean),
+    Column('intervention_report', String(500)),
+    Column('last_update', DateTime),
+    Column('latitude', Float),
+    Column('longitude', Float)
+)
+Table(
+    'emergency_call', baseline,
+    Column('id', Integer, primary_key=True),
+    Column('caller_name', String(100), nullable=False),
+    Column('phone_number', String(20), nullable=False),
+    Column('location', String(200), nullable=False),
+    Column('emergency_type', _emergency_type, nullable=False),
+    Column('timestamp', DateTime),
+    Column('status', _call_status),
+    Column('latitude', Float),
+    Column('longitude', Float),
+    Column('dispatched_at', DateTime),
+    Column('en_route_at', DateTime),
+    Column('on_scene_at', DateTime),
+    Column('completed_at', DateTime),
+    Column('unit_id', Integer, ForeignKey('emergency_unit.id'))
+)
+Table(
+    'intervention_report', baseline,
+    Column('id', Integer, primary_key=True),
+    Column('call_id', Integer, ForeignKey('emergency_call.id')),
+    Column('details', Text, nullable=False),
+    Column('timestamp', DateTime)
+)
+Table(
+    'dispatcher', baseline,
+    Column('id', Integer, primary_key=True),
+    Column('dispatcher_id', String(50), unique=True, nullable=False),
+    Column('name', String(100), nullable=False),
+    Column('shift_start', DateTime),
+    Column('shift_end', DateTime)
+)
+Table(
+    'dispatch_command', baseline,
+    Column('id', Integer, primary_key=True),
+    Column('command_id', String(50), unique=True, nullable=False),
+    Column('report_id', String(50)),
+    Column('details', Text),
+    Column('response_times', JSON),
+    Column('timestamp', DateTime),
+    Column('workload_distribution', JSON)
+)
+Table(
+    'cad_event', baseline,
+    Column('id', Integer, primary_key=True),
+    Column('event_type', String(30), nullable=False),
+    Column('reference', String(50)),
+    Column('payload', JSON, nullable=False),
+    Column('timestamp', DateTime, index=True),
+    Index('ix_cad_event_type_id', 'event_type', 'id')
+)
+Table(
+    'cad_system', baseline,
+    Column('id', Integer, primary_key=True),
+    Column('call_log', JSON),
+    Column('dispatch_commands', JSON),
+    Column('unit_reports', JSON),
+    Column('statistics', JSON),
+    Column('last_updated', DateTime)
+)
+Table(
+    'ems_unit', baseline,
+    Column('id', Integer, ForeignKey('emergency_unit.id'), primary_key=True),
+    Column('medical_equipment', JSON),
+    Column('paramedic_count', Integer)
+)
+Table(
+    'fire_unit', baseline,
+    Column('id', Integer, ForeignKey('emergency_unit.id'), primary_key=True),
+    Column('firefighter_count', Integer),
+    Column('equipment_list', JSON)
+)
+Table(
+    'police_unit', baseline,
+    Column('id', Integer, ForeignKey('emergency_unit.id'), primary_key=True),
+    Column('officer_count', Integer),
+    Column('patrol_area', String(100))
+)
+Table(
+    'statistics', baseline,
+    Column('id', Integer, primary_key=True),
+    Column('metric_data', JSON),
+    Column('generated_at', DateTime)
+)
+
+
+def _add_columns(connection, table):
+    """Add the columns of `table` missing from the database table of the same name"""
+    existing = {column['name'] for column in inspect(connection).get_columns(table.name)}
+    for column in table.columns:
+        if column.name in existing:
+            continue
+        if not column.nullable and column.server_default is None:
+            raise ValueError(f"Cannot add NOT NULL column {table.name}.{column.name} without a server default")
+        column_type = column.type.compile(dialect=connection.dialect)
+        connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+
+
+@migration(1, 'Baseline schema')
+def _baseline(connection):
+    baseline.create_all(connection)
+    # Databases created before versioning may predate some of the baseline's columns
+    for table in baseline.sorted_tables:
+        _add_columns(connection, table)
+
+
+@migration(2, 'Indexes for dashboard, dispatch and statistics queries')
+def _hot_path_indexes(connection):
+    _create_indexes(connection, 'emergency_call', {
+        'ix_emergency_call_status_type', 'ix_emergency_call_type_timestamp',
+        'ix_emergency_call_timestamp', 'ix_emergency_call_unit_id', 'ix_emergency_call_open'
+    })
+    _create_indexes(connection, 'emergency_unit', {
+        'ix_emergency_unit_type_availability', 'ix_emergency_unit_available'
+    })
+    _create_indexes(connection, 'intervention_report', {'ix_intervention_report_call_id'})
+    if connection.dialect.name in ('sqlite', 'postgresql'):
+        # Give the planner fresh statistics for the new indexes
+        connection.execute(text('ANALYZE'))
+
+
+@migration(3, 'Call transition audit table')
+def _call_transition_audit(connection):
+    db.metadata.tables['call_transition'].create(connection, checkfirst=True)
+
+
+@migration(4, 'Archive partition catalog')
+def _archive_catalog(connection):
+    # The monthly archive tables themselves are created by services/archive.py as needed
+    db.metadata.tables['archive_partition'].create(connection, checkfirst=True)
+
+
+@migration(5, 'Notification outbox')
+def _notification_outbox(connection):
+    db.metadata.tables['outbox_message'].create(connection, checkfirst=True)
+
+
+@migration(6, 'Statistics rollup tables')
+def _statistics_rollups(connection):
+    # Filled as calls complete; `flask --app app rollup-backfill` adds the history
+    for name in ('call_rollup_hourly', 'call_rollup_daily', 'response_histogram_daily', 'unit_workload_daily',
+                 'unit_workload_monthly'):
+        db.metadata.tables[name].create(connection, checkfirst=True)
+
+
+@migration(7, 'Cluster coordination tables')
+def _cluster_coordination(connection):
+    for name in ('cluster_event', 'shared_counter', 'cluster_lease'):
+        db.metadata.tables[name].create(connection, checkfirst=True)
+
+
+@migration(8, 'Shared report cache')
+def _shared_reports(connection):
+    db.metadata.tables['shared_report'].create(connection, checkfirst=True)
+
+
+def current_version(connection=None):
+    """Highest applied migration version (0 for an unmanaged database)"""
+    if connection is None:
+        with db.engine.connect() as connection:
+            return current_version(connection)
+    if not inspect(connection).has_table(schema_migration.name):
+        return 0
+    return connection.execute(db.select(db.func.max(schema_migration.c.version))).scalar() or 0
+
+
+def upgrade(target=None):
+    """Apply pending migrations up to target (default: latest); returns the versions applied"""
+    applied = []
+    with db.engine.begin() as connection:
+        schema_migration.create(connection, checkfirst=True)
+    for version, description, func in MIGRATIONS:
+        if target is not None and version > target:
+            break
+        with db.engine.begin() as connection:
+            if version <= current_version(connection):
+                continue
+            func(connection)
+            connection.execute(schema_migration.insert().values(
+                version=version, description=description, applied_at=datetime.datetime.utcnow()
+            ))
+        applied.append(version)
+    return applied
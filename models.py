@@ -27,16 +27,32 @@ class EmergencyUnit(db.Model):
     availability_status = db.Column(db.Boolean, default=True)  # availabilityStatus from UML
     intervention_report = db.Column(db.String(500))  # interventionReport from UML
     last_update = db.Column(db.DateTime, default=datetime.datetime.utcnow)  # lastUpdate from UML
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
 
     # Relationships
     calls = db.relationship("EmergencyCall", back_populates="unit")
 
+    __table_args__ = (
+        db.Index('ix_emergency_unit_type_availability', 'service_type', 'availability_status'),
+        # Available units by type: what every dispatch decision looks up
+        db.Index('ix_emergency_unit_available', 'service_type',
+                 sqlite_where=availability_status.is_(True), postgresql_where=availability_status.is_(True)),
+    )
+
     def update_status(self, new_status):
         """Update the availability status of the unit"""
         self.availability_status = new_status
         self.last_update = datetime.datetime.utcnow()
         db.session.commit()
 
+    def update_position(self, latitude, longitude):
+        """Update the last known position of the unit"""
+        self.latitude = latitude
+        self.longitude = longitude
+        self.last_update = datetime.datetime.utcnow()
+        db.session.commit()
+
     def submit_report(self, report_details):
         """Submit an intervention report"""
         self.intervention_report = report_details
@@ -53,6 +69,14 @@ class EmergencyCall(db.Model):
     emergency_type = db.Column(db.Enum(EmergencyType), nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.datetime.utcnow)
     status = db.Column(db.Enum(CallStatus), default=CallStatus.LOGGED)
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+
+    # Time each lifecycle state was entered, set by CallStateMachine.transition
+    dispatched_at = db.Column(db.DateTime)
+    en_route_at = db.Column(db.DateTime)
+    on_scene_at = db.Column(db.DateTime)
+    completed_at = db.Column(db.DateTime)
 
     # Foreign key and relationship
     unit_id = db.Column(db.Integer, db.ForeignKey('emergency_unit.id'))
@@ -61,6 +85,16 @@ class EmergencyCall(db.Model):
     # Relationship to reports
     reports = db.relationship("InterventionReport", back_populates="call")
 
+    __table_args__ = (
+        db.Index('ix_emergency_call_status_type', 'status', 'emergency_type'),
+        db.Index('ix_emergency_call_type_timestamp', 'emergency_type', 'timestamp'),
+        db.Index('ix_emergency_call_timestamp', 'timestamp'),
+        db.Index('ix_emergency_call_unit_id', 'unit_id'),
+        # Open calls only: stays the size of the working set however long the history grows
+        db.Index('ix_emergency_call_open', 'timestamp',
+                 sqlite_where=status != CallStatus.COMPLETED, postgresql_where=status != CallStatus.COMPLETED),
+    )
+
     def create_call(self):
         """Create a new emergency call"""
         db.session.add(self)
@@ -78,6 +112,112 @@ class InterventionReport(db.Model):
         # Relationship
         call = db.relationship("EmergencyCall", back_populates="reports")
 
+        __table_args__ = (
+            db.Index('ix_intervention_report_call_id', 'call_id'),
+        )
+
+
+class CallTransition(db.Model):
+    """Audit row written with every call status change, in the same transaction"""
+    __tablename__ = 'call_transition'
+
+    id = db.Column(db.Integer, primary_key=True)
+    call_id = db.Column(db.Integer, db.ForeignKey('emergency_call.id'), nullable=False)
+    unit_id = db.Column(db.Integer, db.ForeignKey('emergency_unit.id'))
+    from_status = db.Column(db.Enum(CallStatus), nullable=False)
+    to_status = db.Column(db.Enum(CallStatus), nullable=False)
+    timestamp = db.Column(db.DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_call_transition_call_id', 'call_id', 'id'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'call_id': self.call_id,
+            'unit_id': self.unit_id,
+            'from_status': self.from_status.value,
+            'to_status': self.to_status.value,
+            'timestamp': self.timestamp.isoformat()
+        }
+
+
+class ArchivePartition(db.Model):
+    """Catalog of one month of archived calls (see services/archive.py) with its running totals"""
+    __tablename__ = 'archive_partition'
+
+    month = db.Column(db.String(6), primary_key=True)  # YYYYMM of the calls' timestamp
+    period_start = db.Column(db.DateTime, nullable=False)
+    period_end = db.Column(db.DateTime, nullable=False)
+    calls = db.Column(db.Integer, nullable=False, default=0)
+    reports = db.Column(db.Integer, nullable=False, default=0)
+    transitions = db.Column(db.Integer, nullable=False, default=0)
+    calls_by_type = db.Column(db.JSON, nullable=False, default=dict)  # emergency type value -> calls
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+
+    @classmethod
+    def totals(cls):
+        """(calls by EmergencyType, calls, reports) over every archived month, without touching the archives"""
+        by_type = dict.fromkeys(EmergencyType, 0)
+        calls = reports = 0
+        for partition in cls.query:
+            calls += partition.calls
+            reports += partition.reports
+            for value, count in partition.calls_by_type.items():
+                by_type[EmergencyType(value)] += count
+        return by_type, calls, reports
+
+
+class CallRollupColumns:
+    """Aggregates of completed calls per period and type (see services/rollups.py); times in minutes"""
+    period_start = db.Column(db.DateTime, primary_key=True)  # hour or day the calls were logged in
+    emergency_type = db.Column(db.Enum(EmergencyType), primary_key=True)
+    calls = db.Column(db.Integer, nullable=False, default=0)
+    dispatched = db.Column(db.Integer, nullable=False, default=0)
+    dispatch_delay_total = db.Column(db.Float, nullable=False, default=0)
+    responded = db.Column(db.Integer, nullable=False, default=0)
+    response_total = db.Column(db.Float, nullable=False, default=0)
+    response_max = db.Column(db.Float, nullable=False, default=0)
+    total_time_total = db.Column(db.Float, nullable=False, default=0)
+
+
+class CallRollupHourly(CallRollupColumns, db.Model):
+    __tablename__ = 'call_rollup_hourly'
+
+
+class CallRollupDaily(CallRollupColumns, db.Model):
+    __tablename__ = 'call_rollup_daily'
+
+
+class ResponseHistogramDaily(db.Model):
+    """Response times of a day's completed calls, counted into fixed buckets (rollups.RESPONSE_BUCKETS)"""
+    __tablename__ = 'response_histogram_daily'
+
+    period_start = db.Column(db.DateTime, primary_key=True)
+    emergency_type = db.Column(db.Enum(EmergencyType), primary_key=True)
+    bucket = db.Column(db.Integer, primary_key=True)
+    calls = db.Column(db.Integer, nullable=False, default=0)
+
+
+class UnitWorkloadColumns:
+    """Completed calls handled per unit and period, with the minutes from dispatch to completion"""
+    period_start = db.Column(db.DateTime, primary_key=True)
+    # No foreign key: workload history outlives units removed from the roster
+    unit_id = db.Column(db.Integer, primary_key=True)
+    calls = db.Column(db.Integer, nullable=False, default=0)
+    busy_minutes = db.Column(db.Float, nullable=False, default=0)
+
+
+class UnitWorkloadDaily(UnitWorkloadColumns, db.Model):
+    __tablename__ = 'unit_workload_daily'
+
+
+class UnitWorkloadMonthly(UnitWorkloadColumns, db.Model):
+    """Month totals of unit_workload_daily, so year-long workload queries read one row per unit and month"""
+    __tablename__ = 'unit_workload_monthly'
+
+
 class Dispatcher(db.Model):
     __tablename__ = 'dispatcher'
 
@@ -99,13 +239,8 @@ class Dispatcher(db.Model):
 
     def determine_emergency_type(self, call_details):
         """Determine the type of emergency based on call details"""
-        # Simple logic - in real system this would be more sophisticated
-        if any(word in call_details.lower() for word in ['fire', 'smoke', 'burning']):
-            return EmergencyType.FIRE
-        elif any(word in call_details.lower() for word in ['medical', 'heart', 'accident', 'injury']):
-            return EmergencyType.MEDICAL
-        else:
-            return EmergencyType.POLICE
+        from services.classifier import default_classifier
+        return default_classifier().determine_emergency_type(call_details)
 
     def assign_unit(self, call_id, unit_id):
         """Assign a unit to an emergency call"""
@@ -154,21 +289,154 @@ class DispatchCommand(db.Model):
         return self
 
 
+class CADEvent(db.Model):
+    """Append-only CAD history entry (one row per logged call or dispatch command)"""
+    __tablename__ = 'cad_event'
+
+    CALL_LOGGED = 'call_logged'
+    DISPATCH_ISSUED = 'dispatch_issued'
+
+    id = db.Column(db.Integer, primary_key=True)
+    event_type = db.Column(db.String(30), nullable=False)
+    reference = db.Column(db.String(50))  # call id or dispatch command id
+    payload = db.Column(db.JSON, nullable=False)
+    timestamp = db.Column(db.DateTime, default=datetime.datetime.utcnow, index=True)
+
+    __table_args__ = (
+        db.Index('ix_cad_event_type_id', 'event_type', 'id'),
+    )
+
+    @classmethod
+    def _filtered(cls, event_type=None, since=None, until=None):
+        query = cls.query
+        if event_type:
+            query = query.filter(cls.event_type == event_type)
+        if since:
+            query = query.filter(cls.timestamp >= since)
+        if until:
+            query = query.filter(cls.timestamp < until)
+        return query
+
+    @classmethod
+    def page(cls, event_type=None, after_id=None, limit=100, since=None, until=None):
+        """Return up to `limit` events with id greater than `after_id`, oldest first"""
+        query = cls._filtered(event_type, since, until)
+        if after_id is not None:
+            query = query.filter(cls.id > after_id)
+        return query.order_by(cls.id).limit(limit).all()
+
+    @classmethod
+    def stream(cls, event_type=None, since=None, until=None, batch_size=500):
+        """Yield matching events oldest first without loading the whole history"""
+        after_id = None
+        while True:
+            batch = cls.page(event_type, after_id, batch_size, since, until)
+            yield from batch
+            if len(batch) < batch_size:
+                return
+            after_id = batch[-1].id
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'event_type': self.event_type,
+            'reference': self.reference,
+            'timestamp': self.timestamp.isoformat(),
+            'data': self.payload
+        }
+
+
+class OutboxMessage(db.Model):
+    """Notification waiting to leave the system, written in the same transaction as the change it announces"""
+    __tablename__ = 'outbox_message'
+
+    PENDING = 'pending'
+    DELIVERED = 'delivered'
+    DEAD = 'dead'  # gave up after max_attempts
+
+    UNIT_NOTIFICATION = 'unit_notification'
+
+    id = db.Column(db.Integer, primary_key=True)
+    idempotency_key = db.Column(db.String(80), unique=True, nullable=False)
+    topic = db.Column(db.String(30), nullable=False)
+    destination = db.Column(db.String(50))  # unit code for unit notifications
+    payload = db.Column(db.JSON, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default=PENDING)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+    delivered_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_outbox_message_due', 'status', 'next_attempt_at', 'id'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'idempotency_key': self.idempotency_key,
+            'topic': self.topic,
+            'destination': self.destination,
+            'payload': self.payload,
+            'status': self.status,
+            'attempts': self.attempts,
+            'next_attempt_at': self.next_attempt_at.isoformat(),
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat(),
+            'delivered_at': self.delivered_at.isoformat() if self.delivered_at else None
+        }
+
+
+class ClusterEvent(db.Model):
+    """Dashboard event published by one worker process, replayed by the others (services/coordination.py)"""
+    __tablename__ = 'cluster_event'
+
+    id = db.Column(db.Integer, primary_key=True)
+    origin = db.Column(db.String(80), nullable=False)  # worker id of the publisher
+    event_type = db.Column(db.String(30), nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow, index=True)
+
+
+class SharedCounter(db.Model):
+    """Named counter shared by every worker process, changed only by atomic increments"""
+    __tablename__ = 'shared_counter'
+
+    name = db.Column(db.String(80), primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+class ClusterLease(db.Model):
+    """Exclusive, expiring claim of a job that must run in one worker process only (e.g. the scheduler)"""
+    __tablename__ = 'cluster_lease'
+
+    name = db.Column(db.String(80), primary_key=True)
+    owner = db.Column(db.String(80), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+
+class SharedReport(db.Model):
+    """Statistics PDF built by one worker process, served by any of them (services/coordination.py)"""
+    __tablename__ = 'shared_report'
+
+    key = db.Column(db.String(120), primary_key=True)  # ReportEngine.cache_key
+    content = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow, index=True)
+
+
 class CADSystem(db.Model):
     __tablename__ = 'cad_system'
 
     id = db.Column(db.Integer, primary_key=True)
-    call_log = db.Column(db.JSON)  # List of emergency calls
-    dispatch_commands = db.Column(db.JSON)  # List of dispatch commands
+    call_log = db.Column(db.JSON)  # Legacy list of emergency calls, migrated into cad_event
+    dispatch_commands = db.Column(db.JSON)  # Legacy list of dispatch commands, migrated into cad_event
     unit_reports = db.Column(db.JSON)  # List of unit reports
     statistics = db.Column(db.JSON)  # System statistics
     last_updated = db.Column(db.DateTime, default=datetime.datetime.utcnow)
 
     def log_call(self, emergency_call):
         """Log an emergency call in the CAD system"""
-        if not self.call_log:
-            self.call_log = []
-
         call_data = {
             'id': emergency_call.id,
             'caller_name': emergency_call.caller_name,
@@ -177,23 +445,79 @@ class CADSystem(db.Model):
             'timestamp': emergency_call.timestamp.isoformat()
         }
 
-        self.call_log.append(call_data)
-        self.last_updated = datetime.datetime.utcnow()
+        db.session.add(CADEvent(
+            event_type=CADEvent.CALL_LOGGED,
+            reference=str(emergency_call.id),
+            payload=call_data
+        ))
         db.session.commit()
 
     def dispatch_emergency(self, dispatch_command):
         """Process emergency dispatch"""
-        if not self.dispatch_commands:
-            self.dispatch_commands = []
-
         command_data = {
             'command_id': dispatch_command.command_id,
             'details': dispatch_command.details,
             'timestamp': dispatch_command.timestamp.isoformat()
         }
 
-        self.dispatch_commands.append(command_data)
+        db.session.add(CADEvent(
+            event_type=CADEvent.DISPATCH_ISSUED,
+            reference=dispatch_command.command_id,
+            payload=command_data
+        ))
+        db.session.commit()
+
+    def log_calls(self, call_rows):
+        """Append call_logged events for many calls at once (inside the caller's transaction)"""
+        if not call_rows:
+            return
+        now = datetime.datetime.utcnow()
+        db.session.execute(db.insert(CADEvent), [{
+            'event_type': CADEvent.CALL_LOGGED,
+            'reference': str(row['id']),
+            'payload': {
+                'id': row['id'],
+                'caller_name': row['caller_name'],
+                'location': row['location'],
+                'type': row['emergency_type'].value,
+                'timestamp': row['timestamp'].isoformat()
+            },
+            'timestamp': now
+        } for row in call_rows])
+
+    def get_call_log(self, after_id=None, limit=100):
+        """Page through logged calls; returns (entries, next_cursor)"""
+        return self._history_page(CADEvent.CALL_LOGGED, after_id, limit)
+
+    def get_dispatch_commands(self, after_id=None, limit=100):
+        """Page through issued dispatch commands; returns (entries, next_cursor)"""
+        return self._history_page(CADEvent.DISPATCH_ISSUED, after_id, limit)
+
+    @staticmethod
+    def _history_page(event_type, after_id, limit):
+        events = CADEvent.page(event_type, after_id, limit)
+        next_cursor = events[-1].id if len(events) == limit else None
+        return [event.payload for event in events], next_cursor
+
+    def migrate_legacy_log(self):
+        """Move entries from the old JSON columns into the event table (one-off)"""
+        if not self.call_log and not self.dispatch_commands:
+            return 0
+        migrated = 0
+        for event_type, entries, key in ((CADEvent.CALL_LOGGED, self.call_log or [], 'id'),
+                                         (CADEvent.DISPATCH_ISSUED, self.dispatch_commands or [], 'command_id')):
+            for entry in entries:
+                db.session.add(CADEvent(
+                    event_type=event_type,
+                    reference=str(entry.get(key)),
+                    payload=entry,
+                    timestamp=datetime.datetime.fromisoformat(entry['timestamp'])
+                ))
+                migrated += 1
+        self.call_log = None
+        self.dispatch_commands = None
         db.session.commit()
+        return migrated
 
     def generate_statistics(self):
         """Generate system statistics"""
@@ -258,12 +582,12 @@ class Statistics(db.Model):
     metric_data = db.Column(db.JSON)  # Map of various metrics
     generated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
 
-    def calculate_metrics(self):
-        """Calculate various system metrics"""
+    def calculate_metrics(self, analytics, fleet=None):
+        """Calculate system metrics; response times come from a ResponseTimeAnalytics, utilization from a fleet"""
         metrics = {
-            'response_times': self._calculate_response_times(),
+            'response_times': self._calculate_response_times(analytics),
             'call_volume_by_type': self._call_volume_by_type(),
-            'unit_utilization': self._unit_utilization(),
+            'unit_utilization': fleet.utilization() if fleet is not None else self._unit_utilization(),
             'completion_rate': self._completion_rate()
         }
 
@@ -272,27 +596,30 @@ class Statistics(db.Model):
         db.session.commit()
         return metrics
 
-    def _calculate_response_times(self):
-        """Calculate average response times"""
-        # Implementation for response time calculation
-        return {"average": 8.5, "median": 7.2, "max": 15.3}
+    def _calculate_response_times(self, analytics):
+        """Response times (minutes from logging to arrival on scene) from the analytics' live sketches"""
+        summary = analytics.summary()
+        return {key: summary[key] for key in ('count', 'average', 'median', 'p90', 'p99', 'max')}
 
     def _call_volume_by_type(self):
         """Calculate call volume by emergency type"""
         police_calls = EmergencyCall.query.filter_by(emergency_type=EmergencyType.POLICE).count()
         fire_calls = EmergencyCall.query.filter_by(emergency_type=EmergencyType.FIRE).count()
         medical_calls = EmergencyCall.query.filter_by(emergency_type=EmergencyType.MEDICAL).count()
+        archived, _, _ = ArchivePartition.totals()
 
         return {
-            "police": police_calls,
-            "fire": fire_calls,
-            "medical": medical_calls
+            "police": police_calls + archived[EmergencyType.POLICE],
+            "fire": fire_calls + archived[EmergencyType.FIRE],
+            "medical": medical_calls + archived[EmergencyType.MEDICAL]
         }
 
     def _unit_utilization(self):
         """Calculate unit utilization rates"""
-        total_units = EmergencyUnit.query.count()
-        busy_units = EmergencyUnit.query.filter_by(availability_status=False).count()
+        units = dict(db.session.query(EmergencyUnit.availability_status, db.func.count())
+                     .group_by(EmergencyUnit.availability_status).all())
+        total_units = sum(units.values())
+        busy_units = units.get(False, 0)
 
         return {
             "total": total_units,
@@ -302,8 +629,10 @@ class Statistics(db.Model):
 
     def _completion_rate(self):
         """Calculate call completion rate"""
-        total_calls = EmergencyCall.query.count()
-        completed_calls = EmergencyCall.query.filter_by(status=CallStatus.COMPLETED).count()
+        # Archived calls are all completed
+        _, archived_calls, _ = ArchivePartition.totals()
+        total_calls = EmergencyCall.query.count() + archived_calls
+        completed_calls = EmergencyCall.query.filter_by(status=CallStatus.COMPLETED).count() + archived_calls
 
         return {
             "total": total_calls,
@@ -0,0 +1,165 @@
+"""Monthly archive of completed calls, their intervention reports and transitions.
+
+`CallArchive.run` moves COMPLETED calls older than max_age out of the live
+tables into per-month tables (emergency_call_archive_YYYYMM and its
+intervention_report / call_transition siblings), so the live tables hold only
+the working set. Months are keyed by the call's timestamp, and each one has an
+ArchivePartition catalog row with its time range and running totals: counters
+read the totals instead of the archives, and readers given a time range use
+`archived_tables(since, until)` to find the few months they also have to scan.
+"""
+from models import ArchivePartition, CallStatus, CallTransition, EmergencyCall, InterventionReport
+from database import db
+from sqlalchemy import Column, Index, MetaData, Table
+import collections
+import datetime
+import threading
+
+archive_metadata = MetaData()
+_metadata_lock = threading.Lock()
+
+PartitionTables = collections.namedtuple('PartitionTables', 'month calls reports transitions')
+
+
+def month_key(timestamp):
+    return f"{timestamp:%Y%m}"
+
+
+def month_range(month):
+    start = datetime.datetime(int(month[:4]), int(month[4:]), 1)
+    end = datetime.datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start, end
+
+
+def _archive_table(live, month, indexed_column, keep_primary_key):
+    name = f"{live.name}_archive_{month}"
+    table = archive_metadata.tables.get(name)
+    if table is None:
+        # No foreign keys: archived rows outlive the live rows they pointed at
+        table = Table(name, archive_metadata,
+                      *[Column(column.name, column.type, primary_key=keep_primary_key and column.primary_key)
+                        for column in live.columns],
+                      Index(f"ix_{name}_{indexed_column}", indexed_column))
+    return table
+
+
+def partition_tables(month):
+    """Table objects for one month's archive (they may not exist in the database yet)"""
+    with _metadata_lock:
+        return PartitionTables(
+            month,
+            _archive_table(EmergencyCall.__table__, month, 'timestamp', True),
+            # Report and transition ids are not kept unique: SQLite may hand an archived id out again
+            _archive_table(InterventionReport.__table__, month, 'call_id', False),
+            _archive_table(CallTransition.__table__, month, 'call_id', False)
+        )
+
+
+def archived_tables(since=None, until=None, connection=None):
+    """PartitionTables of every archived month overlapping [since, until), oldest first"""
+    stmt = db.select(ArchivePartition.month).order_by(ArchivePartition.month)
+    if since is not None:
+        stmt = stmt.where(ArchivePartition.period_end > since)
+    if until is not None:
+        stmt = stmt.where(ArchivePartition.period_start < until)
+    executor = connection if connection is not None else db.session
+    return [partition_tables(month) for month in executor.execute(stmt).scalars()]
+
+
+class CallArchive:
+    """Moves completed calls past max_age, with their reports and transitions, into monthly archive tables.
+
+    Works in batches of batch_size calls, one transaction each, so live traffic
+    only ever waits on a short write. The newest call is never archived, which
+    keeps SQLite from reusing its id for the next call.
+    """
+
+    def __init__(self, max_age=datetime.timedelta(days=90), batch_size=5000):
+        self.max_age = max_age
+        self.batch_size = batch_size
+
+    def cutoff(self, now=None):
+        return (now or datetime.datetime.utcnow()) - self.max_age
+
+    def run(self, now=None, max_batches=None):
+        """Archive everything older than the cutoff; returns counts of calls, reports and transitions moved"""
+        cutoff = self.cutoff(now)
+        totals = collections.Counter(calls=0, reports=0, transitions=0)
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            moved = self.archive_batch(cutoff)
+            if not moved['calls']:
+                break
+            totals.update(moved)
+            batches += 1
+        if totals['calls'] and db.engine.dialect.name in ('sqlite', 'postgresql'):
+            # Most of the table may just have moved: refresh the planner's statistics
+            db.session.execute(db.text('ANALYZE'))
+            db.session.commit()
+        return dict(totals)
+
+    def archive_batch(self, cutoff):
+        """Move up to batch_size of the oldest archivable calls in one transaction"""
+        newest = db.select(db.func.max(EmergencyCall.id)).scalar_subquery()
+        rows = db.session.execute(
+            db.select(EmergencyCall.id, EmergencyCall.timestamp, EmergencyCall.emergency_type)
+            .where(EmergencyCall.status == CallStatus.COMPLETED, EmergencyCall.timestamp < cutoff,
+                   EmergencyCall.id < newest)
+            .order_by(EmergencyCall.timestamp)
+            .limit(self.batch_size)
+        ).all()
+        moved = collections.Counter()
+        if not rows:
+            return moved
+        by_month = collections.defaultdict(list)
+        for row in rows:
+            by_month[month_key(row.timestamp)].append(row)
+        try:
+            for month, month_rows in sorted(by_month.items()):
+                moved.update(self._move(month, month_rows))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return moved
+
+    def _move(self, month, rows):
+        tables = self._ensure_partition(month)
+        call_ids = [row.id for row in rows]
+        moved = {'calls': len(call_ids)}
+        for name, live, archive, key in (
+                ('transitions', CallTransition.__table__, tables.transitions, CallTransition.call_id),
+                ('reports', InterventionReport.__table__, tables.reports, InterventionReport.call_id),
+                ('calls', EmergencyCall.__table__, tables.calls, EmergencyCall.id)):
+            columns = [column.name for column in live.columns]
+            copied = db.session.execute(archive.insert().from_select(
+                columns, db.select(*live.columns).where(key.in_(call_ids))
+            ))
+            if name != 'calls':
+                moved[name] = copied.rowcount
+            db.session.execute(db.delete(live).where(key.in_(call_ids)))
+
+        partition = db.session.get(ArchivePartition, month)
+        by_type = dict(partition.calls_by_type)
+        for row in rows:
+            by_type[row.emergency_type.value] = by_type.get(row.emergency_type.value, 0) + 1
+        partition.calls += moved['calls']
+        partition.reports += moved['reports']
+        partition.transitions += moved['transitions']
+        partition.calls_by_type = by_type
+        partition.updated_at = datetime.datetime.utcnow()
+        return moved
+
+    @staticmethod
+    def _ensure_partition(month):
+        tables = partition_tables(month)
+        partition = db.session.get(ArchivePartition, month)
+        if partition is None:
+            connection = db.session.connection()
+            for table in tables[1:]:
+                table.create(connection, checkfirst=True)
+            period_start, period_end = month_range(month)
+            db.session.add(ArchivePartition(month=month, period_start=period_start, period_end=period_end,
+                                            calls=0, reports=0, transitions=0, calls_by_type={}))
+            db.session.flush()
+        return tables
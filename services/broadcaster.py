@@ -0,0 +1,93 @@
+import collections
+import itertools
+import json
+import queue
+import threading
+
+
+class Subscription:
+    """One connected console: a bounded queue of pending events"""
+
+    def __init__(self, broadcaster, max_pending):
+        self._broadcaster = broadcaster
+        self._queue = queue.Queue(maxsize=max_pending)
+        self.overflowed = False
+
+    def _offer(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            # A console that cannot keep up is told to reload instead of
+            # making every publisher wait on it.
+            self.overflowed = True
+
+    def get(self, timeout=None):
+        """Next (id, event_type, data) tuple, or None if nothing arrived within timeout"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self._broadcaster.unsubscribe(self)
+
+
+class EventBroadcaster:
+    """Fans dispatch state changes out to every connected dashboard.
+
+    Publishers (the dispatch service) call `publish` once per change; each
+    subscriber gets its own bounded queue so a slow client never blocks the
+    request that produced the change. The last `history` events are kept so a
+    reconnecting EventSource can resume from its Last-Event-ID.
+    """
+
+    def __init__(self, history=500, max_pending=1000):
+        self.max_pending = max_pending
+        self._subscribers = set()
+        self._history = collections.deque(maxlen=history)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def subscribe(self, last_event_id=None):
+        subscription = Subscription(self, self.max_pending)
+        with self._lock:
+            if last_event_id is not None:
+                for event in self._history:
+                    if event[0] > last_event_id:
+                        subscription._offer(event)
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, event_type, data):
+        with self._lock:
+            event = (next(self._ids), event_type, data)
+            self._history.append(event)
+            for subscription in self._subscribers:
+                subscription._offer(event)
+        return event[0]
+
+    def stream(self, last_event_id=None, heartbeat=15.0):
+        """Yield text/event-stream frames until the client disconnects"""
+        subscription = self.subscribe(last_event_id)
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                event = subscription.get(timeout=heartbeat)
+                if subscription.overflowed:
+                    yield "event: resync\ndata: {}\n\n"
+                    return
+                if event is None:
+                    yield ": heartbeat\n\n"
+                    continue
+                event_id, event_type, data = event
+                yield f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data)}\n\n"
+        finally:
+            subscription.close()
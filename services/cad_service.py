@@ -1,36 +1,179 @@
 from models import *
 from state_machine import CallStateMachine
-from database import db
+from database import db, read_engine
+from services.counters import StatisticsCounters
+from services.state_cache import HotStateCache
+from services.fleet import FleetSnapshot
+from services.instrumentation import instrumented
+from services.archive import archived_tables
 import datetime
+import json
 
 class CADService:
-    def __init__(self):
-        self.cad_system = self._get_cad_system()
+    def __init__(self, counters=None, state_cache=None, fleet=None):
+        self._cad_system_id = self._get_cad_system().id
+        if counters is None:
+            counters = StatisticsCounters()
+            counters.reconcile()
+        if state_cache is None:
+            state_cache = HotStateCache()
+            state_cache.load()
+        if fleet is None:
+            fleet = FleetSnapshot()
+            fleet.load()
+        self.counters = counters
+        self.state_cache = state_cache
+        self.fleet = fleet
 
     def _get_cad_system(self):
         """Get or create CAD system instance"""
-        cad = CADSystem.query.first()
+        cad = CADSystem.query.order_by(CADSystem.id).first()
         if not cad:
             cad = CADSystem()
             db.session.add(cad)
             db.session.commit()
         return cad
 
+    @property
+    def cad_system(self):
+        """The CADSystem row in the current session; an instance kept across requests would go stale"""
+        return db.session.get(CADSystem, self._cad_system_id)
+
+    @instrumented('cad')
     def get_active_calls(self):
-        """Get all active emergency calls"""
-        return EmergencyCall.query.filter(
-            EmergencyCall.status.in_([
-                CallStatus.LOGGED,
-                CallStatus.DISPATCHED,
-                CallStatus.EN_ROUTE,
-                CallStatus.ON_SCENE
-            ])
-        ).all()
+        """Get all active emergency calls (cached snapshots)"""
+        return self.state_cache.active_calls()
 
+    @instrumented('cad')
     def get_unit_status(self):
-        """Get status of all emergency units"""
-        return EmergencyUnit.query.all()
+        """Get status of all emergency units (cached snapshots)"""
+        return self.state_cache.all_units()
+
+    @instrumented('cad')
+    def get_available_units(self, service_type=None):
+        return self.state_cache.available_units(service_type)
+
+    @instrumented('cad')
+    def units_for_call(self, call):
+        """(distance_km or None, UnitView) of available units of the call's type, nearest first"""
+        if call.latitude is None or call.longitude is None:
+            return [(None, unit) for unit in self.fleet.available_units(call.emergency_type)]
+        ranked = [(distance, self.fleet.view(unit_pk))
+                  for distance, unit_pk in self.fleet.rank(call.emergency_type, call.latitude, call.longitude)]
+        ranked_ids = {unit.id for _, unit in ranked}
+        return ranked + [(None, unit) for unit in self.fleet.available_units(call.emergency_type)
+                         if unit.id not in ranked_ids]
 
+    @instrumented('cad')
+    def get_call(self, call_id):
+        return self.state_cache.get_call(call_id)
+
+    @instrumented('cad')
     def generate_real_time_statistics(self):
-        """Generate real-time system statistics"""
-        return self.cad_system.generate_statistics()
\ No newline at end of file
+        """Generate real-time system statistics from the shared counters (read-only)"""
+        return self.counters.snapshot()
+
+    def call_listing(self, statuses=None, emergency_type=None, since=None, until=None, unit=None,
+                     after_id=None, limit=None):
+        """Column-only SELECT over calls (unit code joined in), keyset ordered by id.
+
+        When since/until reach into archived months (and completed calls are
+        wanted), those archive partitions are read too, in one UNION ALL.
+        """
+        filters = dict(statuses=statuses, emergency_type=emergency_type, since=since, until=until, unit=unit,
+                       after_id=after_id)
+        archived = []
+        if (since is not None or until is not None) and (not statuses or CallStatus.COMPLETED in statuses):
+            archived = archived_tables(since, until)
+        if not archived:
+            stmt, sparse = self._call_select(EmergencyCall.__table__, **filters)
+            # id + 0 keeps the keyset order but stops the planner from choosing a
+            # primary-key walk (which LIMIT makes look cheap) over the filter's index
+            stmt = stmt.order_by(EmergencyCall.id + 0 if sparse else EmergencyCall.id)
+        else:
+            union = db.union_all(*[self._call_select(calls, **filters)[0] for calls in
+                                   [EmergencyCall.__table__] + [tables.calls for tables in archived]]).subquery()
+            stmt = db.select(union).order_by(union.c.id)
+        if limit is not None:
+            stmt = stmt.limit(limit)
+        return stmt
+
+    @staticmethod
+    def _call_select(calls, statuses=None, emergency_type=None, since=None, until=None, unit=None, after_id=None):
+        """(unordered SELECT over one calls table, whether its filters are sparse)"""
+        stmt = db.select(
+            calls.c.id, calls.c.caller_name, calls.c.location, calls.c.emergency_type, calls.c.status,
+            calls.c.timestamp, EmergencyUnit.unit_id
+        ).outerjoin(EmergencyUnit, calls.c.unit_id == EmergencyUnit.id)
+        # Filters that usually match a small slice of the history; for those the
+        # planner should search their index and sort, not walk the id order.
+        sparse = since is not None or until is not None or unit is not None
+        if statuses:
+            stmt = stmt.where(calls.c.status.in_(statuses))
+            if CallStatus.COMPLETED not in statuses:
+                # Lets SQLite/PostgreSQL use the partial open-calls index
+                stmt = stmt.where(calls.c.status != CallStatus.COMPLETED)
+                sparse = True
+        if emergency_type is not None:
+            stmt = stmt.where(calls.c.emergency_type == emergency_type)
+        if since is not None:
+            stmt = stmt.where(calls.c.timestamp >= since)
+        if until is not None:
+            stmt = stmt.where(calls.c.timestamp < until)
+        if unit is not None:
+            if str(unit).isdigit():
+                stmt = stmt.where(calls.c.unit_id == int(unit))
+            else:
+                stmt = stmt.where(EmergencyUnit.unit_id == unit)
+        if after_id is not None:
+            stmt = stmt.where(calls.c.id > after_id)
+        return stmt, sparse
+
+    def unit_listing(self, service_type=None, available=None, after_id=None, limit=None):
+        """Column-only SELECT over units, keyset ordered by id"""
+        stmt = db.select(
+            EmergencyUnit.id, EmergencyUnit.unit_id, EmergencyUnit.service_type,
+            EmergencyUnit.availability_status
+        )
+        if service_type is not None:
+            stmt = stmt.where(EmergencyUnit.service_type == service_type)
+        if available is not None:
+            stmt = stmt.where(EmergencyUnit.availability_status.is_(available))
+        if after_id is not None:
+            stmt = stmt.where(EmergencyUnit.id > after_id)
+        stmt = stmt.order_by(EmergencyUnit.id)
+        if limit is not None:
+            stmt = stmt.limit(limit)
+        return stmt
+
+    @staticmethod
+    def call_row_to_dict(row):
+        return {
+            "id": row.id,
+            "caller_name": row.caller_name,
+            "location": row.location,
+            "emergency_type": row.emergency_type.value,
+            "status": row.status.value,
+            "timestamp": row.timestamp.isoformat(),
+            "unit_id": row.unit_id
+        }
+
+    @staticmethod
+    def unit_row_to_dict(row):
+        return {
+            "id": row.id,
+            "unit_id": row.unit_id,
+            "service_type": row.service_type.value,
+            "available": row.availability_status
+        }
+
+    @staticmethod
+    def stream_rows(stmt, to_dict, batch_size=1000):
+        """Yield NDJSON lines from a server-side cursor on the reader engine, batch_size rows at a time"""
+        with read_engine().connect() as connection:
+            result = connection.execution_options(yield_per=batch_size).execute(stmt)
+            try:
+                for row in result:
+                    yield json.dumps(to_dict(row)) + "\n"
+            finally:
+                result.close()
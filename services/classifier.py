@@ -0,0 +1,141 @@
+from models import EmergencyType
+import bisect
+import collections
+import json
+import re
+
+# keyword -> weight per emergency type. Weights decide the type (highest total
+# wins) and add up to the priority score. Ties go to the earlier type, which
+# keeps the original fire > medical > police precedence.
+DEFAULT_LEXICON = {
+    EmergencyType.FIRE: {
+        'fire': 3, 'smoke': 2, 'burning': 3, 'flames': 3, 'explosion': 4, 'gas leak': 3, 'trapped': 3,
+    },
+    EmergencyType.MEDICAL: {
+        'medical': 2, 'heart': 3, 'accident': 2, 'injury': 2, 'injured': 2, 'unconscious': 4,
+        'not breathing': 5, 'bleeding': 3, 'stroke': 4, 'overdose': 4, 'seizure': 3,
+    },
+    EmergencyType.POLICE: {
+        'break-in': 2, 'burglary': 2, 'robbery': 3, 'theft': 1, 'stolen': 1, 'fight': 2, 'assault': 3,
+        'weapon': 4, 'gun': 4, 'shots fired': 5, 'hostage': 5,
+    },
+}
+DEFAULT_TYPE = EmergencyType.POLICE
+PRIORITY_SATURATION = 10.0  # total matched weight that maps to priority 1.0
+
+Classification = collections.namedtuple('Classification', 'emergency_type priority scores matches')
+
+
+def load_lexicon(path):
+    """Read a lexicon from JSON: {"fire": {"smoke": 2, ...}, "medical": {...}, "police": {...}}"""
+    with open(path) as handle:
+        raw = json.load(handle)
+    return {EmergencyType[name.upper()]: {term: float(weight) for term, weight in terms.items()}
+            for name, terms in raw.items()}
+
+
+def _normalize(term):
+    return ' '.join(term.lower().split())
+
+
+def trie_pattern(terms):
+    """Regex source matching any of terms, with shared prefixes factored out.
+
+    A flat `a|b|c` alternation retries every keyword at each position; the
+    factored form walks each character once, like a trie, so matching cost
+    grows with the length of the text rather than the size of the lexicon.
+    """
+    trie = {}
+    for term in terms:
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def build(node):
+        terminal = '' in node
+        branches = []
+        for char in sorted(key for key in node if key):
+            piece = r'\s+' if char == ' ' else re.escape(char)
+            branches.append(piece + build(node[char]))
+        if not branches:
+            return ''
+        if len(branches) == 1 and not terminal:
+            return branches[0]
+        body = '(?:' + '|'.join(branches) + ')'
+        return body + '?' if terminal else body
+    return build(trie)
+
+
+class IncidentClassifier:
+    """Weighted keyword classifier over one compiled regex.
+
+    Keywords match at the start of a word and extend to inflections
+    ("fire" also matches "fires"), like the substring test it replaces, and
+    each keyword counts once per transcript.
+    """
+
+    def __init__(self, lexicon=None, default_type=DEFAULT_TYPE, saturation=PRIORITY_SATURATION):
+        lexicon = lexicon if lexicon is not None else DEFAULT_LEXICON
+        self.default_type = default_type
+        self.saturation = saturation
+        self._order = {emergency_type: position for position, emergency_type in enumerate(lexicon)}
+        self._terms = {}
+        for emergency_type, terms in lexicon.items():
+            for term, weight in terms.items():
+                self._terms[_normalize(term)] = (emergency_type, weight)
+        # Text is lowercased once per call, which is cheaper than re.IGNORECASE
+        self.pattern = re.compile(r'\b' + trie_pattern(sorted(self._terms))) if self._terms else None
+
+    def __len__(self):
+        return len(self._terms)
+
+    def _term(self, match):
+        return match if match in self._terms else _normalize(match)
+
+    def _result(self, terms):
+        scores = {}
+        for term in terms:
+            emergency_type, weight = self._terms[term]
+            scores[emergency_type] = scores.get(emergency_type, 0) + weight
+        if not scores:
+            return Classification(self.default_type, 0.0, scores, ())
+        emergency_type = max(scores, key=lambda t: (scores[t], -self._order[t]))
+        priority = round(min(1.0, sum(scores.values()) / self.saturation), 3)
+        return Classification(emergency_type, priority, scores, tuple(sorted(terms)))
+
+    def classify(self, text):
+        if self.pattern is None or not text:
+            return self._result(())
+        return self._result({self._term(match) for match in self.pattern.findall(text.lower())})
+
+    def classify_many(self, texts):
+        """Classify a batch with one regex pass over the joined transcripts"""
+        # Lowercase per transcript so offsets match even where lower() changes a length
+        texts = [(text or '').lower() for text in texts]
+        if self.pattern is None:
+            return [self._result(()) for _ in texts]
+        starts = []
+        offset = 0
+        for text in texts:
+            starts.append(offset)
+            offset += len(text) + 1
+        found = [set() for _ in texts]
+        # NUL is neither a word character nor \s, so no keyword can match across two transcripts
+        for match in self.pattern.finditer('\x00'.join(texts)):
+            found[bisect.bisect_right(starts, match.start()) - 1].add(self._term(match.group()))
+        return [self._result(terms) for terms in found]
+
+    def determine_emergency_type(self, text):
+        return self.classify(text).emergency_type
+
+
+_default = None
+
+
+def default_classifier():
+    """Shared classifier over DEFAULT_LEXICON"""
+    global _default
+    if _default is None:
+        _default = IncidentClassifier()
+    return _default
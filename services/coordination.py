@@ -0,0 +1,620 @@
+"""Coordination between worker processes (several gunicorn workers, or app servers on several hosts).
+
+Each process keeps its own in-memory views (hot state cache, fleet snapshot,
+spatial index, statistics counters) and its own connected dashboards. With more
+than one process, every view has to hear about the changes made by the others.
+`DatabaseCoordinator` provides this through three tables in the shared database:
+
+* an event log (cluster_event): `ClusterBroadcaster` appends the dashboard
+  events this process publishes and the coordinator polls for everybody
+  else's, which refresh the local views and reach the local subscribers;
+* shared counters (shared_counter): `ClusterCounters` keeps the dashboard
+  statistics there, changed by atomic increments and periodically overwritten
+  with fresh COUNTs by whichever worker holds the recount lease;
+* leases (cluster_lease): expiring exclusive claims, so that jobs such as the
+  batch scheduler run in one process at a time;
+* built reports (shared_report): `SharedReportStore` lets the worker that gets
+  a report's follow-up request serve the PDF another worker's job built.
+  Job progress itself travels as `job` events on the event log.
+
+Outgoing events and counter changes are buffered and written together, in one
+transaction per `interval`, by the same thread that polls, so a request pays
+no extra round trip for them. Unit reservations need nothing from here: the
+conditional UPDATE in EnhancedDispatchService._reserve_unit_id is already
+atomic across processes.
+"""
+from models import CallStatus, ClusterEvent, ClusterLease, EmergencyType, SharedCounter, SharedReport
+from database import db
+from services.broadcaster import EventBroadcaster
+from services.counters import StatisticsCounters
+from services.instrumentation import metrics
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+import collections
+import datetime
+import os
+import socket
+import threading
+import time
+import uuid
+
+metrics.describe('cluster_events_total', 'Cluster events written to and read from the event log by this worker')
+metrics.describe('cluster_sync_seconds', 'Time spent in one coordinator sync (write, counters, poll)')
+
+UNITS_TOTAL = 'units.total'
+UNITS_AVAILABLE = 'units.available'
+REPORTS_FILED = 'reports.filed'
+# When the counters were last recounted, in microseconds since EPOCH: increments
+# committed before it are already part of the recounted values
+RECOUNTED_AT = 'counters.recounted_at'
+RECOUNT_LEASE = 'counter-recount'
+# Goes up with every write that changes the other counters: a data version all workers agree on
+DATA_VERSION = 'counters.version'
+EPOCH = datetime.datetime(1970, 1, 1)
+
+# Largest id jump recorded as individual gaps (ids that may still commit late)
+MAX_GAP = 1000
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+def status_counter(status):
+    return f"calls.status.{status.name}"
+
+
+def type_counter(emergency_type):
+    return f"calls.type.{emergency_type.name}"
+
+
+def _dialect_insert(dialect):
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+def _add_counters(deltas):
+    """Add {name: delta} to the shared counters in the current transaction"""
+    rows = [{'name': name, 'value': delta} for name, delta in sorted(deltas.items()) if delta]
+    if not rows:
+        return
+    table = SharedCounter.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        stmt = _dialect_insert(dialect)(table)
+        db.session.execute(stmt.on_conflict_do_update(index_elements=['name'],
+                                                      set_={'value': table.c.value + stmt.excluded.value}), rows)
+        return
+    for row in rows:
+        if db.session.execute(db.update(table).where(table.c.name == row['name'])
+                              .values(value=table.c.value + row['value'])).rowcount == 0:
+            db.session.execute(db.insert(table).values(row))
+
+
+def _set_counters(values):
+    """Overwrite {name: value} in the shared counters in the current transaction"""
+    rows = [{'name': name, 'value': value} for name, value in sorted(values.items())]
+    table = SharedCounter.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        stmt = _dialect_insert(dialect)(table)
+        db.session.execute(stmt.on_conflict_do_update(index_elements=['name'], set_={'value': stmt.excluded.value}),
+                           rows)
+        return
+    for row in rows:
+        if db.session.execute(db.update(table).where(table.c.name == row['name'])
+                              .values(value=row['value'])).rowcount == 0:
+            db.session.execute(db.insert(table).values(row))
+
+
+def _touch_counter(name):
+    """Rewrite counter `name` unchanged (creating it at 0) in the current transaction.
+
+    The write takes SQLite's database write lock, or the counter's row lock
+    elsewhere, until the transaction ends.
+    """
+    table = SharedCounter.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        stmt = _dialect_insert(dialect)(table).values(name=name, value=0)
+        db.session.execute(stmt.on_conflict_do_update(index_elements=['name'], set_={'value': table.c.value}))
+        return
+    if db.session.execute(db.update(table).where(table.c.name == name).values(value=table.c.value)).rowcount == 0:
+        db.session.execute(db.insert(table).values(name=name, value=0))
+
+
+def _microseconds(moment):
+    return (moment - EPOCH) // datetime.timedelta(microseconds=1)
+
+
+# Time of the last database commit made by each thread. Counter changes are queued
+# right after the commit that made them, in the same thread, and are stamped with it.
+_last_commit = threading.local()
+
+
+def _on_commit(conn):
+    _last_commit.at = _microseconds(datetime.datetime.utcnow())
+
+
+def _commit_time():
+    return getattr(_last_commit, 'at', None) or _microseconds(datetime.datetime.utcnow())
+
+
+def _seed_counters(values):
+    """Insert the counters that do not exist yet with the given values (existing ones are left alone)"""
+    table = SharedCounter.__table__
+    existing = set(db.session.execute(db.select(table.c.name)).scalars())
+    rows = [{'name': name, 'value': value} for name, value in sorted(values.items()) if name not in existing]
+    if not rows:
+        return
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        db.session.execute(_dialect_insert(dialect)(table).on_conflict_do_nothing(index_elements=['name']), rows)
+    else:
+        db.session.execute(db.insert(table), rows)
+
+
+class DatabaseCoordinator:
+    """Event log, shared counters and leases for one worker process, synced every `interval` seconds.
+
+    `sync` writes the buffered events and counter increments in one
+    transaction, re-reads the shared counters and reads the other workers'
+    events past the cursor, handing them to each listener as a list of
+    (event_type, data). Event ids can become visible out of order when
+    transactions commit concurrently (PostgreSQL sequences), so ids skipped by
+    the cursor are re-checked for `settle` seconds before being given up.
+    Events older than `retention` seconds are pruned.
+
+    Increments can be lost (a worker stopping before its next sync) or miss
+    changes made behind the services' back, so every `recount_interval`
+    seconds the holder of the recount lease overwrites the shared counters
+    with `counter_source()`, counted in the database. Each queued increment
+    carries the time of the commit behind it, and the ones committed before the
+    recount are dropped instead of being added on top of it. The recount holds
+    the write lock while it counts, so on SQLite no commit can fall in between;
+    on PostgreSQL a change committing during the counts can be off until the
+    next recount.
+    """
+
+    def __init__(self, app, worker_id=None, interval=0.2, batch_size=1000, retention=300.0, settle=10.0,
+                 lease_seconds=15.0, recount_interval=60.0):
+        self.app = app
+        self.worker_id = worker_id or default_worker_id()
+        self.interval = interval
+        self.batch_size = batch_size
+        self.retention = retention
+        self.settle = settle
+        self.lease_seconds = lease_seconds
+        self.recount_interval = recount_interval
+        self.counter_source = None  # callable returning {name: value} counted in the database (ClusterCounters)
+        self.revision = 0  # goes up whenever the counters seen by this worker change
+        self.last_sync = None
+        self._listeners = []
+        self._outgoing = []
+        self._pending = collections.Counter()   # counter changes not written yet
+        self._pending_log = []                  # ...as (committed at, {name: delta})
+        self._inflight = collections.Counter()  # ...being written by the current sync
+        self._shared = {}
+        self._recounted_at = 0
+        self._next_recount = 0.0
+        self._cursor = None
+        self._gaps = {}  # event id skipped by the cursor -> when it was first missed
+        self._leases = set()
+        self._pruned_at = 0.0
+        self._stats = collections.Counter()
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def subscribe(self, listener):
+        """Call listener(events) with every batch of events published by other workers, in registration order"""
+        self._listeners.append(listener)
+
+    # Event log
+
+    def publish(self, event_type, data):
+        """Queue an event for the other workers (written with the next sync)"""
+        with self._lock:
+            self._outgoing.append({'origin': self.worker_id, 'event_type': event_type, 'payload': data})
+
+    # Shared counters
+
+    def add(self, deltas):
+        """Queue {name: delta} increments of the shared counters (written with the next sync)"""
+        with self._lock:
+            self._pending_log.append((_commit_time(), deltas))
+            self._pending.update(deltas)
+            self.revision += 1
+
+    def data_version(self):
+        """Version of the shared counters as of the last sync, the same on every worker.
+
+        While this worker has changes not written yet it uses a version of its
+        own (without ':', as it goes into report cache keys), so what it builds
+        from them is never taken for the shared state.
+        """
+        with self._lock:
+            version = self._shared.get(DATA_VERSION, 0)
+            if any(self._pending.values()) or any(self._inflight.values()):
+                return f"{version}+{self.worker_id.replace(':', '-')}.{self.revision}"
+            return version
+
+    def counter_values(self):
+        """{name: value}: the shared counters as of the last sync plus this worker's changes not written yet"""
+        with self._lock:
+            values = collections.Counter(self._shared)
+            values.update(self._inflight)
+            values.update(self._pending)
+            return dict(values)
+
+    def seed_counters(self, values):
+        """Create the shared counters that do not exist yet (the first worker to start seeds them)"""
+        with self._sync_lock:
+            try:
+                _seed_counters(values)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            self._read_counters()
+
+    def _read_counters(self):
+        shared = dict(db.session.execute(db.select(SharedCounter.name, SharedCounter.value)).all())
+        with self._lock:
+            self._inflight = collections.Counter()
+            self._drop_recounted(shared.get(RECOUNTED_AT, 0))
+            if shared != self._shared:
+                self._shared = shared
+                self.revision += 1
+
+    def _drop_recounted(self, recounted_at):
+        """Forget the queued increments a recount at `recounted_at` already includes (call holding _lock)"""
+        if recounted_at <= self._recounted_at:
+            return
+        self._recounted_at = recounted_at
+        # Threads may queue out of commit order, so every entry is checked
+        kept = []
+        for committed_at, deltas in self._pending_log:
+            if committed_at <= recounted_at:
+                self._pending.subtract(deltas)
+            else:
+                kept.append((committed_at, deltas))
+        self._pending_log = kept
+
+    def recount(self):
+        """Overwrite the shared counters with counter_source(); queued increments older than this are dropped"""
+        with self._sync_lock:
+            self._recount()
+            self._read_counters()
+
+    def _recount(self):
+        try:
+            # Writing the marker first takes the write lock (or row lock) that _write also needs,
+            # so no increments are added between the counts and the overwrite
+            _set_counters({RECOUNTED_AT: _microseconds(datetime.datetime.utcnow())})
+            values = dict(self.counter_source())
+            current = dict(db.session.execute(db.select(SharedCounter.name, SharedCounter.value)).all())
+            if any(current.get(name, 0) != value for name, value in values.items()):
+                values[DATA_VERSION] = current.get(DATA_VERSION, 0) + 1
+            values[RECOUNTED_AT] = _microseconds(datetime.datetime.utcnow())
+            _set_counters(values)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        self._stats['recounts'] += 1
+
+    def _maybe_recount(self):
+        if self.counter_source is None or time.monotonic() < self._next_recount:
+            return
+        self._next_recount = time.monotonic() + self.recount_interval
+        if self.acquire(RECOUNT_LEASE, ttl=self.recount_interval * 2):
+            self._recount()
+
+    # Leases
+
+    def acquire(self, name, ttl=None):
+        """Take or renew lease `name` for ttl seconds (default lease_seconds); True if this worker holds it"""
+        now = datetime.datetime.utcnow()
+        values = {'owner': self.worker_id, 'expires_at': now + datetime.timedelta(seconds=ttl or self.lease_seconds)}
+        try:
+            held = db.session.execute(
+                db.update(ClusterLease)
+                .where(ClusterLease.name == name,
+                       db.or_(ClusterLease.owner == self.worker_id, ClusterLease.expires_at < now))
+                .values(values)
+                .execution_options(synchronize_session=False)
+            ).rowcount == 1
+            if not held and db.session.execute(
+                    db.select(ClusterLease.name).where(ClusterLease.name == name)).first() is None:
+                try:
+                    with db.session.begin_nested():
+                        db.session.execute(db.insert(ClusterLease).values(name=name, **values))
+                    held = True
+                except IntegrityError:
+                    held = False  # another worker created it first
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        if held:
+            self._leases.add(name)
+        else:
+            self._leases.discard(name)
+        return held
+
+    def release(self, name):
+        try:
+            db.session.execute(db.delete(ClusterLease).where(ClusterLease.name == name,
+                                                              ClusterLease.owner == self.worker_id))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        self._leases.discard(name)
+
+    def holds(self, name):
+        """Whether this worker held lease `name` at its last acquire (it may have expired since)"""
+        return name in self._leases
+
+    # Sync
+
+    def sync(self):
+        """Write the buffered events and counter changes, refresh the counters and deliver new remote events"""
+        started = time.perf_counter()
+        with self._sync_lock:
+            self._write()
+            self._maybe_recount()
+            self._read_counters()
+            events = self._read_events()
+            db.session.commit()
+            if time.monotonic() - self._pruned_at > max(self.retention / 10, self.interval):
+                self._prune()
+        for listener in self._listeners:
+            listener(events)
+        metrics.observe('cluster_sync_seconds', time.perf_counter() - started)
+        self.last_sync = {'received': len(events), 'seconds': round(time.perf_counter() - started, 4),
+                          'at': datetime.datetime.utcnow().isoformat()}
+        return self.last_sync
+
+    def _write(self):
+        with self._lock:
+            outgoing, self._outgoing = self._outgoing, []
+            queued, self._pending_log = self._pending_log, []
+            pending, self._pending = self._pending, collections.Counter()
+            self._inflight = pending
+        try:
+            if outgoing:
+                now = datetime.datetime.utcnow()
+                db.session.execute(db.insert(ClusterEvent), [dict(event, created_at=now) for event in outgoing])
+            if queued:
+                # Writing the marker before reading it takes the same lock _recount() takes first,
+                # so no recount can commit between this read and the increments
+                _touch_counter(RECOUNTED_AT)
+                recounted_at = db.session.execute(
+                    db.select(SharedCounter.value).where(SharedCounter.name == RECOUNTED_AT)
+                ).scalar()
+                deltas = collections.Counter()
+                for committed_at, change in queued:
+                    if committed_at > recounted_at:
+                        deltas.update(change)
+                if any(deltas.values()):
+                    deltas[DATA_VERSION] += 1
+                _add_counters(deltas)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            with self._lock:
+                # Keep them for the next attempt
+                self._outgoing[:0] = outgoing
+                self._pending_log[:0] = queued
+                self._pending.update(pending)
+                self._inflight = collections.Counter()
+            raise
+        self._stats['published'] += len(outgoing)
+        metrics.inc('cluster_events_total', len(outgoing), direction='published')
+
+    def _read_events(self):
+        columns = (ClusterEvent.id, ClusterEvent.origin, ClusterEvent.event_type, ClusterEvent.payload)
+        if self._cursor is None:
+            self._start_cursor()
+        rows = db.session.execute(db.select(*columns).where(ClusterEvent.id > self._cursor)
+                                  .order_by(ClusterEvent.id).limit(self.batch_size)).all()
+        now = time.monotonic()
+        if self._gaps:
+            rows += db.session.execute(db.select(*columns).where(ClusterEvent.id.in_(list(self._gaps)))).all()
+        for row in rows:
+            if row.id > self._cursor:
+                if row.id - self._cursor <= MAX_GAP:
+                    for missing in range(self._cursor + 1, row.id):
+                        self._gaps[missing] = now
+                self._cursor = row.id
+            else:
+                del self._gaps[row.id]
+        for event_id, missed_at in list(self._gaps.items()):
+            if now - missed_at > self.settle:
+                del self._gaps[event_id]
+        events = [(row.event_type, row.payload) for row in rows if row.origin != self.worker_id]
+        self._stats['received'] += len(events)
+        metrics.inc('cluster_events_total', len(events), direction='received')
+        return events
+
+    def _start_cursor(self):
+        """Only events published from now on are of interest: the views were just loaded from the database"""
+        self._cursor = db.session.execute(db.select(db.func.max(ClusterEvent.id))).scalar() or 0
+
+    def _prune(self):
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=self.retention)
+        try:
+            db.session.execute(db.delete(ClusterEvent).where(ClusterEvent.created_at < cutoff))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        self._pruned_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            pending_events = len(self._outgoing)
+        return {
+            'mode': 'cluster',
+            'worker_id': self.worker_id,
+            'interval': self.interval,
+            'running': self.running,
+            'cursor': self._cursor,
+            'gaps': len(self._gaps),
+            'pending_events': pending_events,
+            'published': self._stats['published'],
+            'received': self._stats['received'],
+            'recounts': self._stats['recounts'],
+            'leases': sorted(self._leases),
+            'counters': self.counter_values(),
+            'last_sync': self.last_sync
+        }
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        """Start syncing in a background thread (call inside an application context)"""
+        if self._thread is not None:
+            return
+        if not event.contains(db.engine, 'commit', _on_commit):
+            event.listen(db.engine, 'commit', _on_commit)
+        if self._cursor is None:
+            self._start_cursor()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='cluster-coordinator', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop polling, write what is still buffered and give up the leases held"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self.app.app_context():
+            try:
+                self._write()
+                for name in list(self._leases):
+                    self.release(name)
+            finally:
+                db.session.remove()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with self.app.app_context():
+                try:
+                    self.sync()
+                except Exception:
+                    db.session.rollback()
+                    self.app.logger.exception("Cluster coordinator sync failed")
+                finally:
+                    db.session.remove()
+
+
+class ClusterBroadcaster(EventBroadcaster):
+    """EventBroadcaster whose events also reach the dashboards connected to the other workers"""
+
+    # Each worker publishes its own statistics from the shared counters
+    LOCAL_ONLY = ('stats',)
+
+    def __init__(self, coordinator, history=500, max_pending=1000):
+        super().__init__(history, max_pending)
+        self.coordinator = coordinator
+
+    def publish(self, event_type, data):
+        if event_type not in self.LOCAL_ONLY:
+            self.coordinator.publish(event_type, data)
+        return super().publish(event_type, data)
+
+    def deliver(self, events):
+        """Hand events from other workers to the local subscribers only"""
+        for event_type, data in events:
+            super().publish(event_type, data)
+
+
+class ClusterCounters(StatisticsCounters):
+    """StatisticsCounters kept in the shared_counter table, so every worker reports the same numbers.
+
+    Changes are queued on the coordinator and written as increments with its
+    next sync; reads see the shared values of the last sync plus this worker's
+    changes not written yet. A worker that stops between a commit and its next
+    sync loses those changes until the next recount puts them back. Each change
+    must be recorded right after the commit that made it, before any other
+    commit in the same thread: that commit's time decides whether a recount
+    already includes it.
+    """
+
+    def __init__(self, coordinator):
+        super().__init__()
+        self.coordinator = coordinator
+        coordinator.counter_source = self.counted_values
+
+    @property
+    def version(self):
+        """Same on every worker once synced, so report cache keys and ETags match whichever worker answers"""
+        return self.coordinator.data_version()
+
+    def counted_values(self):
+        """{shared counter name: value} counted in the database"""
+        calls_by_status, calls_by_type, total_units, available_units, reports_filed = self.count()
+        values = {UNITS_TOTAL: total_units, UNITS_AVAILABLE: available_units, REPORTS_FILED: reports_filed}
+        values.update({status_counter(status): count for status, count in calls_by_status.items()})
+        values.update({type_counter(emergency_type): count for emergency_type, count in calls_by_type.items()})
+        return values
+
+    def reconcile(self):
+        """Seed the shared counters from the database unless another worker already did"""
+        self.coordinator.seed_counters(self.counted_values())
+        self.reconciled_at = datetime.datetime.utcnow()
+
+    def _state(self):
+        values = self.coordinator.counter_values()
+        return ({status: values.get(status_counter(status), 0) for status in CallStatus},
+                {emergency_type: values.get(type_counter(emergency_type), 0) for emergency_type in EmergencyType},
+                values.get(UNITS_TOTAL, 0), values.get(UNITS_AVAILABLE, 0), values.get(REPORTS_FILED, 0))
+
+    def call_logged(self, emergency_type, count=1):
+        self.coordinator.add({type_counter(emergency_type): count, status_counter(CallStatus.LOGGED): count})
+
+    def call_status_changed(self, old_status, new_status, count=1):
+        if old_status == new_status:
+            return
+        self.coordinator.add({status_counter(old_status): -count, status_counter(new_status): count})
+
+    def unit_availability_changed(self, delta):
+        self.coordinator.add({UNITS_AVAILABLE: delta})
+
+    def units_added(self, count=1, available=True):
+        self.coordinator.add({UNITS_TOTAL: count, UNITS_AVAILABLE: count if available else 0})
+
+    def report_filed(self, count=1):
+        self.coordinator.add({REPORTS_FILED: count})
+
+
+class SharedReportStore:
+    """ReportEngine store keeping the `max_entries` newest report PDFs in the shared_report table"""
+
+    def __init__(self, max_entries=8):
+        self.max_entries = max_entries
+
+    def get(self, key):
+        return db.session.execute(db.select(SharedReport.content).where(SharedReport.key == key)).scalar()
+
+    def put(self, key, pdf):
+        try:
+            db.session.merge(SharedReport(key=key, content=pdf, created_at=datetime.datetime.utcnow()))
+            db.session.flush()
+            older = (db.select(SharedReport.key).order_by(SharedReport.created_at.desc())
+                     .offset(self.max_entries).scalar_subquery())
+            db.session.execute(db.delete(SharedReport).where(SharedReport.key.in_(older)))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
@@ -0,0 +1,136 @@
+from models import EmergencyCall, EmergencyUnit, InterventionReport, ArchivePartition, CallStatus, EmergencyType
+from database import db
+import datetime
+import threading
+
+ACTIVE_STATUSES = (CallStatus.DISPATCHED, CallStatus.EN_ROUTE, CallStatus.ON_SCENE)
+
+
+class StatisticsCounters:
+    """In-process counters behind the dashboard and /statistics.
+
+    The dispatch service bumps them at each state change, so reading statistics is a
+    dictionary copy instead of a round of COUNT queries. `reconcile` reloads them
+    from the database (on startup, or whenever drift is suspected). `version`
+    goes up on every change, so it doubles as a cheap data-version key.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls_by_status = {}
+        self._calls_by_type = {}
+        self._total_units = 0
+        self._available_units = 0
+        self._reports_filed = 0
+        self.reconciled_at = None
+        self._version = 0
+
+    @property
+    def version(self):
+        return self._version
+
+    def reconcile(self):
+        """Reload every counter from the database with grouped queries (archived calls from the catalog)"""
+        self._replace(*self.count())
+
+    @staticmethod
+    def count():
+        """(calls by status, calls by type, total units, available units, reports filed) counted in the database"""
+        by_status = dict(db.session.query(EmergencyCall.status, db.func.count())
+                         .group_by(EmergencyCall.status).all())
+        by_type = dict(db.session.query(EmergencyCall.emergency_type, db.func.count())
+                       .group_by(EmergencyCall.emergency_type).all())
+        units = dict(db.session.query(EmergencyUnit.availability_status, db.func.count())
+                     .group_by(EmergencyUnit.availability_status).all())
+        reports = InterventionReport.query.count()
+        archived_by_type, archived_calls, archived_reports = ArchivePartition.totals()
+        by_status[CallStatus.COMPLETED] = by_status.get(CallStatus.COMPLETED, 0) + archived_calls
+        by_type = {emergency_type: by_type.get(emergency_type, 0) + archived_by_type[emergency_type]
+                   for emergency_type in EmergencyType}
+        reports += archived_reports
+        return ({status: by_status.get(status, 0) for status in CallStatus},
+                {emergency_type: by_type.get(emergency_type, 0) for emergency_type in EmergencyType},
+                sum(units.values()), units.get(True, 0), reports)
+
+    def _replace(self, calls_by_status, calls_by_type, total_units, available_units, reports_filed):
+        with self._lock:
+            self._calls_by_status = calls_by_status
+            self._calls_by_type = calls_by_type
+            self._total_units = total_units
+            self._available_units = available_units
+            self._reports_filed = reports_filed
+            self.reconciled_at = datetime.datetime.utcnow()
+            self._version += 1
+
+    def _state(self):
+        """Consistent copy of the counters, in the order of `count`"""
+        with self._lock:
+            return (dict(self._calls_by_status), dict(self._calls_by_type), self._total_units,
+                    self._available_units, self._reports_filed)
+
+    def call_logged(self, emergency_type, count=1):
+        with self._lock:
+            self._calls_by_type[emergency_type] = self._calls_by_type.get(emergency_type, 0) + count
+            self._calls_by_status[CallStatus.LOGGED] = self._calls_by_status.get(CallStatus.LOGGED, 0) + count
+            self._version += 1
+
+    def call_status_changed(self, old_status, new_status, count=1):
+        if old_status == new_status:
+            return
+        with self._lock:
+            self._calls_by_status[old_status] = self._calls_by_status.get(old_status, 0) - count
+            self._calls_by_status[new_status] = self._calls_by_status.get(new_status, 0) + count
+            self._version += 1
+
+    def unit_availability_changed(self, delta):
+        """delta is +n when units become available, -n when they are taken"""
+        with self._lock:
+            self._available_units += delta
+            self._version += 1
+
+    def units_added(self, count=1, available=True):
+        with self._lock:
+            self._total_units += count
+            if available:
+                self._available_units += count
+            self._version += 1
+
+    def report_filed(self, count=1):
+        with self._lock:
+            self._reports_filed += count
+            self._version += 1
+
+    def snapshot(self):
+        """Dashboard statistics, same keys as CADSystem.generate_statistics"""
+        calls_by_status, calls_by_type, total_units, available_units, reports_filed = self._state()
+        return {
+            'total_calls': sum(calls_by_type.values()),
+            'active_calls': sum(calls_by_status.get(status, 0) for status in ACTIVE_STATUSES),
+            'completed_calls': calls_by_status.get(CallStatus.COMPLETED, 0),
+            'available_units': available_units,
+            'total_units': total_units,
+            'reports_filed': reports_filed
+        }
+
+    def metrics(self):
+        """Count-based metrics, same keys as Statistics.calculate_metrics"""
+        calls_by_status, calls_by_type, total_units, available_units, _ = self._state()
+        total_calls = sum(calls_by_type.values())
+        completed_calls = calls_by_status.get(CallStatus.COMPLETED, 0)
+        busy_units = total_units - available_units
+        return {
+            'call_volume_by_type': {
+                emergency_type.value: calls_by_type.get(emergency_type, 0)
+                for emergency_type in EmergencyType
+            },
+            'unit_utilization': {
+                "total": total_units,
+                "busy": busy_units,
+                "utilization_rate": (busy_units / total_units * 100) if total_units > 0 else 0
+            },
+            'completion_rate': {
+                "total": total_calls,
+                "completed": completed_calls,
+                "completion_rate": (completed_calls / total_calls * 100) if total_calls > 0 else 0
+            }
+        }
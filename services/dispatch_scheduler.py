@@ -0,0 +1,329 @@
+from models import EmergencyCall, EmergencyUnit, CallStatus
+from database import db
+from services.spatial_index import SpatialIndex
+from services.enhanced_dispatch_service import DISPATCH_PRIORITY
+import collections
+import datetime
+import heapq
+import itertools
+import math
+import threading
+import time
+
+# priority is the DISPATCH_PRIORITY rank of the call's type: lower is more urgent
+PendingCall = collections.namedtuple('PendingCall', 'id emergency_type x y waited_minutes priority', defaults=(0,))
+IdleUnit = collections.namedtuple('IdleUnit', 'id service_type x y')
+
+
+def hungarian(cost):
+    """Minimum-cost assignment of every row to a distinct column (rows <= columns).
+
+    Classic O(n^2 m) shortest augmenting path formulation with row/column
+    potentials. Returns a list with the chosen column for each row.
+    """
+    n = len(cost)
+    m = len(cost[0]) if n else 0
+    if n == 0:
+        return []
+    if n > m:
+        raise ValueError("hungarian() needs at least as many columns as rows")
+    infinity = float('inf')
+    u = [0.0] * (n + 1)
+    v = [0.0] * (m + 1)
+    p = [0] * (m + 1)      # p[j] = row matched to column j (1-based, 0 = free)
+    way = [0] * (m + 1)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = [infinity] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            row = cost[i0 - 1]
+            ui0 = u[i0]
+            delta = infinity
+            j1 = 0
+            for j in range(1, m + 1):
+                if not used[j]:
+                    current = row[j - 1] - ui0 - v[j]
+                    if current < minv[j]:
+                        minv[j] = current
+                        way[j] = j0
+                    if minv[j] < delta:
+                        delta = minv[j]
+                        j1 = j
+            for j in range(m + 1):
+                if used[j]:
+                    u[p[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    assignment = [None] * n
+    for j in range(1, m + 1):
+        if p[j]:
+            assignment[p[j] - 1] = j - 1
+    return assignment
+
+
+class AssignmentPlanner:
+    """Pure assignment logic shared by the live scheduler and the benchmarks.
+
+    The cost of sending a unit to a call is its travel time in minutes minus
+    `wait_weight` times how long the call has already waited, plus
+    `priority_weight` minutes per DISPATCH_PRIORITY rank, so when units are
+    scarce the batch solver shortens trips and serves urgent and old calls first.
+    """
+
+    def __init__(self, speed_kmh=40.0, unknown_travel_minutes=10.0, wait_weight=1.0, priority_weight=5.0,
+                 candidates_per_unit=6, oldest_candidates=16, max_batch=80, time_budget=0.5):
+        self.speed_kmh = speed_kmh
+        self.unknown_travel_minutes = unknown_travel_minutes
+        self.wait_weight = wait_weight
+        self.priority_weight = priority_weight
+        self.candidates_per_unit = candidates_per_unit
+        self.oldest_candidates = oldest_candidates
+        self.max_batch = max_batch
+        self.time_budget = time_budget
+
+    def travel_minutes(self, unit, call):
+        if unit.x is None or call.x is None:
+            return self.unknown_travel_minutes
+        return math.hypot(unit.x - call.x, unit.y - call.y) / self.speed_kmh * 60
+
+    def urgency(self, call):
+        """Minutes of effective waiting: higher is served first"""
+        return self.wait_weight * call.waited_minutes - self.priority_weight * call.priority
+
+    def cost(self, unit, call):
+        return self.travel_minutes(unit, call) - self.urgency(call)
+
+    def plan(self, calls, units):
+        """Return [(unit, call)] pairs for one tick, solved per emergency type"""
+        deadline = time.perf_counter() + self.time_budget
+        calls_by_type = collections.defaultdict(list)
+        units_by_type = collections.defaultdict(list)
+        for call in calls:
+            calls_by_type[call.emergency_type].append(call)
+        for unit in units:
+            units_by_type[unit.service_type].append(unit)
+        pairs = []
+        for emergency_type, type_calls in calls_by_type.items():
+            type_units = units_by_type.get(emergency_type)
+            if type_units:
+                pairs.extend(self._plan_type(type_calls, type_units, deadline))
+        # Most urgent first, so a dispatch phase cut short still serves them
+        pairs.sort(key=lambda pair: -self.urgency(pair[1]))
+        return pairs
+
+    def _plan_type(self, calls, units, deadline):
+        if len(units) >= len(calls):
+            # Every call gets a unit: solve with calls as rows
+            return self._solve(units, calls, deadline, rows_are_units=False)
+        return self._solve(units, calls, deadline, rows_are_units=True)
+
+    def _solve(self, units, calls, deadline, rows_are_units):
+        pairs = []
+        rows = list(units if rows_are_units else calls)
+        columns = {column.id: column for column in (calls if rows_are_units else units)}
+        column_index = SpatialIndex()
+        for column in columns.values():
+            if column.x is not None:
+                column_index.insert_point(column.id, None, column.x, column.y)
+        # Spatially coherent chunks keep each Hungarian solve small
+        rows.sort(key=lambda item: (item.y is None, item.y or 0, item.x or 0))
+        for start in range(0, len(rows), self.max_batch):
+            chunk = rows[start:start + self.max_batch]
+            candidates = None
+            if time.perf_counter() < deadline:
+                candidates = self._candidates(chunk, columns, column_index, rows_are_units)
+            if candidates is None or len(candidates) < len(chunk):
+                chosen = self._greedy_rows(chunk, columns, column_index)
+            else:
+                matrix = [[self._pair_cost(row, column, rows_are_units) for column in candidates] for row in chunk]
+                chosen = [(row, candidates[choice]) for row, choice in zip(chunk, hungarian(matrix))]
+            for row, column in chosen:
+                del columns[column.id]
+                column_index.remove(column.id)
+                pairs.append((row, column) if rows_are_units else (column, row))
+            if not columns:
+                break
+        return pairs
+
+    def _pair_cost(self, row, column, rows_are_units):
+        return self.cost(row, column) if rows_are_units else self.cost(column, row)
+
+    @staticmethod
+    def _nearest(index, row, k):
+        if row.x is None:
+            return []
+        return [item_id for _, item_id in index.nearest_point(None, row.x, row.y, k)]
+
+    def _candidates(self, chunk, columns, column_index, rows_are_units):
+        chosen = {}
+        for row in chunk:
+            for column_id in self._nearest(column_index, row, self.candidates_per_unit):
+                chosen[column_id] = columns[column_id]
+        # The most urgent calls are always in play, wherever they are
+        extra = len(chunk) + (self.oldest_candidates if rows_are_units else self.candidates_per_unit)
+        if rows_are_units:
+            fill = heapq.nlargest(extra, columns.values(), key=self.urgency)
+        else:
+            fill = itertools.islice(columns.values(), extra)
+        for column in fill:
+            chosen.setdefault(column.id, column)
+        return list(chosen.values())
+
+    def _greedy_rows(self, chunk, columns, column_index):
+        pairs = []
+        picked = set()
+        for row in chunk:
+            nearest = self._nearest(column_index, row, 1)
+            if nearest:
+                best = columns[nearest[0]]
+            else:
+                best = next((column for column in columns.values() if column.id not in picked), None)
+            if best is None:
+                break
+            picked.add(best.id)
+            column_index.remove(best.id)
+            pairs.append((row, best))
+        return pairs
+
+
+def greedy_plan(calls, units):
+    """First-come baseline: each call in arrival order takes its nearest idle unit"""
+    index = SpatialIndex()
+    unit_by_id = {}
+    unplaced = collections.defaultdict(list)
+    for unit in units:
+        unit_by_id[unit.id] = unit
+        if unit.x is None:
+            unplaced[unit.service_type].append(unit)
+        else:
+            index.insert_point(unit.id, unit.service_type, unit.x, unit.y)
+    pairs = []
+    for call in sorted(calls, key=lambda c: -c.waited_minutes):
+        nearest = index.nearest_point(call.emergency_type, call.x, call.y, 1) if call.x is not None else []
+        if nearest:
+            unit = unit_by_id[nearest[0][1]]
+            index.remove(unit.id)
+        elif unplaced[call.emergency_type]:
+            unit = unplaced[call.emergency_type].pop()
+        else:
+            continue
+        pairs.append((unit, call))
+    return pairs
+
+
+class DispatchScheduler:
+    """Periodically assigns the whole LOGGED backlog to available units in one batch.
+
+    With a cluster coordinator, only the worker holding the scheduler lease
+    ticks, so the backlog is planned once rather than by every process.
+    Dispatching stops after `dispatch_budget` seconds (default: one interval);
+    pairs left over are planned again next tick, so a tick never outlives the
+    lease it runs under.
+    """
+
+    LEASE = 'dispatch-scheduler'
+
+    def __init__(self, app, service, planner=None, interval=5.0, coordinator=None, dispatch_budget=None):
+        self.app = app
+        self.service = service
+        self.planner = planner if planner is not None else AssignmentPlanner()
+        self.interval = interval
+        self.coordinator = coordinator
+        self.dispatch_budget = dispatch_budget if dispatch_budget is not None else interval
+        self.last_tick = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _load(self):
+        project = self.service.spatial_index.project
+        now = datetime.datetime.utcnow()
+        calls = []
+        for call_id, emergency_type, latitude, longitude, logged_at in db.session.query(
+                EmergencyCall.id, EmergencyCall.emergency_type, EmergencyCall.latitude,
+                EmergencyCall.longitude, EmergencyCall.timestamp
+        ).filter(EmergencyCall.status == CallStatus.LOGGED):
+            x, y = project(latitude, longitude) if latitude is not None and longitude is not None else (None, None)
+            calls.append(PendingCall(call_id, emergency_type, x, y, (now - logged_at).total_seconds() / 60,
+                                     DISPATCH_PRIORITY[emergency_type]))
+        units = []
+        for unit_pk, service_type, latitude, longitude in db.session.query(
+                EmergencyUnit.id, EmergencyUnit.service_type, EmergencyUnit.latitude, EmergencyUnit.longitude
+        ).filter(EmergencyUnit.availability_status.is_(True)):
+            x, y = project(latitude, longitude) if latitude is not None and longitude is not None else (None, None)
+            units.append(IdleUnit(unit_pk, service_type, x, y))
+        return calls, units
+
+    def tick(self):
+        """Plan and dispatch one batch; returns a summary of the tick"""
+        started = time.perf_counter()
+        calls, units = self._load()
+        pairs = self.planner.plan(calls, units)
+        planned = time.perf_counter()
+        deadline = planned + self.dispatch_budget
+        dispatched = deferred = 0
+        for unit, call in pairs:
+            if time.perf_counter() >= deadline:
+                deferred += 1
+                continue
+            try:
+                self.service.dispatch_unit(call.id, unit.id)
+                dispatched += 1
+            except ValueError:
+                # Unit or call changed since the snapshot; picked up next tick
+                db.session.rollback()
+        self.last_tick = {
+            'pending_calls': len(calls),
+            'available_units': len(units),
+            'dispatched': dispatched,
+            'deferred': deferred,
+            'plan_seconds': round(planned - started, 4),
+            'total_seconds': round(time.perf_counter() - started, 4),
+            'at': datetime.datetime.utcnow().isoformat()
+        }
+        return self.last_tick
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='dispatch-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def tick_if_leader(self):
+        """tick() if this worker holds (or takes) the scheduler lease; None when another worker holds it"""
+        if self.coordinator is not None and not self.coordinator.acquire(self.LEASE, ttl=self.interval * 3):
+            return None
+        return self.tick()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with self.app.app_context():
+                try:
+                    self.tick_if_leader()
+                except Exception:
+                    db.session.rollback()
+                    self.app.logger.exception("Dispatch scheduler tick failed")
+                finally:
+                    db.session.remove()
@@ -1,43 +1,165 @@
 from models import *
 from state_machine import CallStateMachine
 from database import db
+from services.spatial_index import SpatialIndex
+from services.counters import StatisticsCounters
+from services.response_analytics import ResponseTimeAnalytics
+from services.broadcaster import EventBroadcaster
+from services.state_cache import HotStateCache, CallView, unit_view
+from services.classifier import default_classifier
+from services.fleet import FleetSnapshot
+from services.rollups import RollupStore
+from services.telemetry import Reading
+from services.instrumentation import instrumented
+from services import outbox
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.attributes import set_committed_value
+import collections
 import datetime
+import threading
+
+# Queue order for automatic dispatch jobs (lower runs first)
+DISPATCH_PRIORITY = {
+    EmergencyType.MEDICAL: 0,
+    EmergencyType.FIRE: 1,
+    EmergencyType.POLICE: 2,
+}
 
 class EnhancedDispatchService:
-    def __init__(self):
-        self.cad_system = None
+    def __init__(self, spatial_index=None, counters=None, analytics=None, broadcaster=None, job_queue=None,
+                 state_cache=None, classifier=None, fleet=None, rollups=None):
+        self._cad_system_id = None
+        self.job_queue = job_queue
+        self.telemetry = None  # TelemetryPipeline buffering unit positions not yet written
+        self.spatial_index = spatial_index if spatial_index is not None else SpatialIndex()
+        self.counters = counters if counters is not None else StatisticsCounters()
+        self.analytics = analytics if analytics is not None else ResponseTimeAnalytics()
+        self.broadcaster = broadcaster if broadcaster is not None else EventBroadcaster()
+        self.state_cache = state_cache if state_cache is not None else HotStateCache()
+        self.classifier = classifier if classifier is not None else default_classifier()
+        self.fleet = fleet if fleet is not None else FleetSnapshot()
+        self.rollups = rollups if rollups is not None else RollupStore()
+        # One lock per service type: dispatches of different types never wait on each other
+        self._reservation_locks = {emergency_type: threading.Lock() for emergency_type in EmergencyType}
         self._initialize_cad_system()
+        self.fleet.load()
+        self.spatial_index.rebuild(self.fleet.available_units())
+        self.counters.reconcile()
+        self.state_cache.load()
+        self.analytics.warm(rollups=self.rollups)
 
     def _initialize_cad_system(self):
-        self.cad_system = CADSystem.query.first()
-        if not self.cad_system:
-            self.cad_system = CADSystem()
-            db.session.add(self.cad_system)
+        cad_system = CADSystem.query.order_by(CADSystem.id).first()
+        if not cad_system:
+            cad_system = CADSystem()
+            db.session.add(cad_system)
             db.session.commit()
+        cad_system.migrate_legacy_log()
+        self._cad_system_id = cad_system.id
+
+    @property
+    def cad_system(self):
+        """The CADSystem row in the current session; an instance kept across requests would go stale"""
+        return db.session.get(CADSystem, self._cad_system_id)
 
-    def log_emergency_call(self, caller_name, phone, location, emergency_type, dispatcher_id=None):
+    @instrumented('dispatch')
+    def log_emergency_call(self, caller_name, phone, location, emergency_type, dispatcher_id=None,
+                           latitude=None, longitude=None):
         call = EmergencyCall(
             caller_name=caller_name,
             phone_number=phone,
             location=location,
-            emergency_type=emergency_type
+            emergency_type=emergency_type,
+            latitude=latitude,
+            longitude=longitude
         )
         db.session.add(call)
         db.session.commit()
+        self.counters.call_logged(emergency_type)
         self.cad_system.log_call(call)
+        self.state_cache.put_call(call)
+        self.broadcaster.publish('call_created', self._call_payload(call))
+        self._publish_stats()
         return call
 
+    @instrumented('dispatch')
+    def log_emergency_calls(self, calls):
+        """Log a batch of calls in one transaction with a single multi-row INSERT.
+
+        Each item is a dict with caller_name, phone, location and optional
+        emergency_type (EmergencyType or its name), details, latitude, longitude.
+        Calls without an emergency_type are classified from their details.
+        Returns the new call ids in input order.
+        """
+        if not calls:
+            return []
+        unclassified = [item.get('details', '') for item in calls if item.get('emergency_type') is None]
+        inferred = iter(self.classifier.classify_many(unclassified))
+        now = datetime.datetime.utcnow()
+        rows = []
+        for position, item in enumerate(calls):
+            try:
+                emergency_type = item.get('emergency_type')
+                if emergency_type is None:
+                    emergency_type = next(inferred).emergency_type
+                elif not isinstance(emergency_type, EmergencyType):
+                    emergency_type = EmergencyType[str(emergency_type).upper()]
+                rows.append({
+                    'caller_name': item['caller_name'],
+                    'phone_number': item['phone'],
+                    'location': item['location'],
+                    'emergency_type': emergency_type,
+                    'latitude': item.get('latitude'),
+                    'longitude': item.get('longitude'),
+                    'timestamp': now,
+                    'status': CallStatus.LOGGED
+                })
+            except KeyError as e:
+                raise ValueError(f"Call {position}: missing or invalid field {e}")
+
+        result = db.session.execute(
+            db.insert(EmergencyCall).returning(EmergencyCall.id, sort_by_parameter_order=True),
+            rows
+        )
+        for row, call_id in zip(rows, result.scalars()):
+            row['id'] = call_id
+        self.cad_system.log_calls(rows)
+        db.session.commit()
+
+        self.state_cache.put_calls([
+            CallView(row['id'], row['caller_name'], row['phone_number'], row['location'], row['emergency_type'],
+                     CallStatus.LOGGED, now, row['latitude'], row['longitude'], None, None)
+            for row in rows
+        ])
+        for row in rows:
+            self.counters.call_logged(row['emergency_type'])
+            self.broadcaster.publish('call_created', {
+                "id": row['id'],
+                "caller_name": row['caller_name'],
+                "phone_number": row['phone_number'],
+                "location": row['location'],
+                "emergency_type": row['emergency_type'].value,
+                "status": CallStatus.LOGGED.value,
+                "timestamp": now.isoformat(),
+                "unit_id": None
+            })
+        self._publish_stats()
+        return [row['id'] for row in rows]
+
     def determine_emergency_type(self, call_details):
-        dispatcher = Dispatcher.query.first()
-        if dispatcher:
-            return dispatcher.determine_emergency_type(call_details)
-        if any(word in call_details.lower() for word in ['fire', 'smoke', 'burning']):
-            return EmergencyType.FIRE
-        elif any(word in call_details.lower() for word in ['medical', 'heart', 'accident', 'injury']):
-            return EmergencyType.MEDICAL
-        else:
-            return EmergencyType.POLICE
+        return self.classifier.determine_emergency_type(call_details)
+
+    @instrumented('dispatch')
+    def classify_transcripts(self, transcripts):
+        """Type, priority score and matched keywords for each transcript"""
+        return [{
+            "emergency_type": result.emergency_type.value,
+            "priority": result.priority,
+            "scores": {emergency_type.value: score for emergency_type, score in result.scores.items()},
+            "matches": list(result.matches)
+        } for result in self.classifier.classify_many(transcripts)]
 
+    @instrumented('dispatch')
     def dispatch_unit(self, call_id, unit_id=None):
         call = EmergencyCall.query.get(call_id)
         if not call:
@@ -45,46 +167,358 @@ class EnhancedDispatchService:
         if call.status != CallStatus.LOGGED:
             raise ValueError(f"Cannot dispatch: call is already in state {call.status.value}")
 
-        if unit_id is not None:
-            unit = EmergencyUnit.query.get(unit_id)
-            if not unit or not unit.availability_status or unit.service_type != call.emergency_type:
-                raise ValueError("Selected unit is not available or not suitable")
-        else:
-            unit = self._find_best_unit(call.emergency_type)
-            if not unit:
-                raise ValueError("No units available")
+        # Read-only rollup lookups stay outside the per-type lock and before the first write
+        response_times, workload = self.rollups.dispatch_context(call.emergency_type)
+        with self._reservation_locks[call.emergency_type]:
+            if unit_id is not None:
+                unit = EmergencyUnit.query.get(unit_id)
+                if not unit or unit.service_type != call.emergency_type or not self._reserve_unit(unit):
+                    db.session.rollback()
+                    raise ValueError("Selected unit is not available or not suitable")
+            else:
+                unit = self._reserve_best_unit(call.emergency_type, call)
+                if not unit:
+                    db.session.rollback()
+                    raise ValueError("No units available")
+            call.unit = unit
+            try:
+                # Guarded on LOGGED: only one dispatcher can claim the call
+                CallStateMachine(call).transition(CallStatus.DISPATCHED)
+            except ValueError:
+                db.session.rollback()
+                raise ValueError("Cannot dispatch: call was dispatched by another dispatcher")
 
-        call.unit = unit
-        unit.availability_status = False
+            dispatch_cmd = DispatchCommand(
+                command_id=f"DISPATCH-{call.id}-{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}",
+                details=f"Dispatching {unit.unit_id} to {call.location} for {call.emergency_type.value} emergency",
+                response_times=response_times,
+                workload_distribution=workload
+            )
+            db.session.add(dispatch_cmd)
+            # The unit is told by the outbox relay once this commits, never inside the transaction
+            outbox.enqueue(OutboxMessage.UNIT_NOTIFICATION, outbox.unit_notification_key(dispatch_cmd.command_id),
+                           unit.unit_id, self._notification_payload(dispatch_cmd, call, unit))
+            db.session.commit()
+        self.counters.call_status_changed(CallStatus.LOGGED, CallStatus.DISPATCHED)
+        self.counters.unit_availability_changed(-1)
+        self.spatial_index.remove(unit.id)
+        self.cad_system.dispatch_emergency(dispatch_cmd)
+        self._write_through_unit(unit)
+        self.state_cache.put_call(call)
+        self.analytics.record_transition(call, CallStatus.DISPATCHED)
+        self.broadcaster.publish('call_status', self._call_payload(call))
+        self.broadcaster.publish('unit_availability', self._unit_payload(unit))
+        self._publish_stats()
+        return unit
 
-        fsm = CallStateMachine(call)
-        fsm.transition(CallStatus.DISPATCHED)
+    @instrumented('dispatch')
+    def request_dispatch(self, call_id):
+        """Queue automatic dispatch of a call and return the Job without waiting for it"""
+        if self.job_queue is None:
+            raise RuntimeError("No job queue configured for asynchronous dispatch")
+        call = EmergencyCall.query.get(call_id)
+        if not call:
+            raise ValueError("Call not found")
+        if call.status != CallStatus.LOGGED:
+            raise ValueError(f"Cannot dispatch: call is already in state {call.status.value}")
+        return self.job_queue.submit('dispatch', self._dispatch_job, call_id,
+                                     priority=DISPATCH_PRIORITY[call.emergency_type])
+
+    def _dispatch_job(self, call_id):
+        unit = self.dispatch_unit(call_id)
+        return {'call_id': call_id, 'unit_id': unit.unit_id, 'unit_pk': unit.id}
 
-        dispatch_cmd = DispatchCommand(
-            command_id=f"DISPATCH-{call.id}-{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}",
-            details=f"Dispatching {unit.unit_id} to {call.location} for {call.emergency_type.value} emergency"
+    def _reserve_unit(self, unit):
+        """Atomically flip a unit from available to busy; False if someone else got it first.
+
+        The conditional UPDATE is what makes double-dispatch impossible across
+        threads and worker processes: only one transaction can match the
+        availability_status = true predicate. The change is part of the current
+        transaction and is undone by a rollback.
+        """
+        if self._reserve_unit_id(unit.id):
+            set_committed_value(unit, 'availability_status', False)
+            return True
+        db.session.expire(unit)
+        return False
+
+    def _reserve_unit_id(self, unit_pk):
+        result = db.session.execute(
+            db.update(EmergencyUnit)
+            .where(EmergencyUnit.id == unit_pk, EmergencyUnit.availability_status.is_(True))
+            .values(availability_status=False, last_update=datetime.datetime.utcnow())
+            .execution_options(synchronize_session=False)
         )
-        db.session.add(dispatch_cmd)
-        db.session.commit()
-        self.cad_system.dispatch_emergency(dispatch_cmd)
+        if result.rowcount == 1:
+            return True
+        # Taken elsewhere (or the snapshot drifted from the database): stop offering it
+        self.spatial_index.remove(unit_pk)
+        self.fleet.set_available([unit_pk], False)
+        return False
+
+    def _release_unit(self, unit):
+        """Atomically flip a busy unit back to available; False if it was already freed"""
+        result = db.session.execute(
+            db.update(EmergencyUnit)
+            .where(EmergencyUnit.id == unit.id, EmergencyUnit.availability_status.is_(False))
+            .values(availability_status=True, last_update=datetime.datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            set_committed_value(unit, 'availability_status', True)
+            return True
+        db.session.expire(unit)
+        return False
+
+    def _candidate_units(self, emergency_type, call=None):
+        """Primary keys of available units in order of preference: nearest first, then any of the right type.
+
+        Candidates come from the in-process spatial index and fleet snapshot; the
+        reservation UPDATE is what confirms a unit is really free.
+        """
+        tried = set()
+        if call is not None and call.latitude is not None and call.longitude is not None:
+            for _, unit_pk in self.spatial_index.nearest(emergency_type, call.latitude, call.longitude, k=5):
+                tried.add(unit_pk)
+                yield unit_pk
+        for unit_pk in self.fleet.available_ids(emergency_type):
+            if unit_pk not in tried:
+                tried.add(unit_pk)
+                yield unit_pk
+        # Units freed by another worker process are only known to the database
+        while True:
+            unit_pk = db.session.execute(
+                db.select(EmergencyUnit.id).where(
+                    EmergencyUnit.service_type == emergency_type,
+                    EmergencyUnit.availability_status.is_(True),
+                    EmergencyUnit.id.notin_(tried)
+                ).limit(1)
+            ).scalar()
+            if unit_pk is None:
+                return
+            tried.add(unit_pk)
+            yield unit_pk
+
+    def _find_best_unit(self, emergency_type, call=None):
+        unit_pk = next(self._candidate_units(emergency_type, call), None)
+        return None if unit_pk is None else db.session.get(EmergencyUnit, unit_pk)
+
+    def _reserve_best_unit(self, emergency_type, call=None):
+        for unit_pk in self._candidate_units(emergency_type, call):
+            if self._reserve_unit_id(unit_pk):
+                unit = db.session.get(EmergencyUnit, unit_pk)
+                set_committed_value(unit, 'availability_status', False)
+                return unit
+        return None
+
+    @instrumented('dispatch')
+    def find_nearest_units(self, emergency_type, latitude, longitude, k=5):
+        """Return up to k (distance_km, UnitView) pairs of available units closest to a point"""
+        ranked = self.spatial_index.nearest(emergency_type, latitude, longitude, k=k)
+        views = [(distance, self.fleet.view(unit_pk)) for distance, unit_pk in ranked]
+        return [(distance, view) for distance, view in views if view is not None]
+
+    @instrumented('dispatch')
+    def update_unit_position(self, unit_id, latitude, longitude):
+        unit = EmergencyUnit.query.get(unit_id)
+        if not unit:
+            raise ValueError("Unit not found")
+        unit.update_position(latitude, longitude)
+        self.state_cache.put_unit(unit)
+        self.fleet.put(unit)
+        if unit.availability_status:
+            self.spatial_index.insert(unit.id, unit.service_type, latitude, longitude)
         return unit
 
-    def _find_best_unit(self, emergency_type):
-        return EmergencyUnit.query.filter_by(
-            service_type=emergency_type,
-            availability_status=True
-        ).first()
+    def track_unit_positions(self, readings):
+        """Move units in the in-memory views ahead of the database ({unit pk: telemetry Reading})"""
+        for unit_pk, reading in readings.items():
+            view = self.fleet.move(unit_pk, reading.latitude, reading.longitude, reading.position_at)
+            if view is None:
+                continue
+            self.state_cache.move_unit(unit_pk, reading.latitude, reading.longitude, reading.position_at)
+            if view.availability_status:
+                self.spatial_index.insert(unit_pk, view.service_type, reading.latitude, reading.longitude)
+
+    @instrumented('dispatch')
+    def apply_unit_telemetry(self, readings):
+        """Write coalesced telemetry ({unit pk: Reading}) in one transaction.
+
+        Positions go out as one executemany UPDATE. Availability reported by a
+        unit is applied with guarded UPDATEs: a unit only goes out of service if
+        it is currently free, and only comes back if no open call is assigned
+        to it, so telemetry can never undo a reservation.
+        """
+        units = EmergencyUnit.__table__
+        positions = [{'unit_pk': unit_pk, 'latitude': reading.latitude, 'longitude': reading.longitude,
+                      'last_update': reading.position_at}
+                     for unit_pk, reading in readings.items() if reading.position_at is not None]
+        going_off = [unit_pk for unit_pk, reading in readings.items() if reading.available is False]
+        going_on = [unit_pk for unit_pk, reading in readings.items() if reading.available is True]
+        now = datetime.datetime.utcnow()
+        went_off, went_on = [], []
+        try:
+            if positions:
+                db.session.execute(
+                    db.update(units).where(units.c.id == db.bindparam('unit_pk'))
+                    .values(latitude=db.bindparam('latitude'), longitude=db.bindparam('longitude'),
+                            last_update=db.bindparam('last_update')),
+                    positions
+                )
+            if going_off:
+                went_off = list(db.session.execute(
+                    db.update(EmergencyUnit)
+                    .where(EmergencyUnit.id.in_(going_off), EmergencyUnit.availability_status.is_(True))
+                    .values(availability_status=False, last_update=now)
+                    .returning(EmergencyUnit.id)
+                    .execution_options(synchronize_session=False)
+                ).scalars())
+            if going_on:
+                assigned = db.select(EmergencyCall.id).where(
+                    EmergencyCall.unit_id == EmergencyUnit.id, EmergencyCall.status != CallStatus.COMPLETED)
+                went_on = list(db.session.execute(
+                    db.update(EmergencyUnit)
+                    .where(EmergencyUnit.id.in_(going_on), EmergencyUnit.availability_status.is_(False),
+                           ~assigned.exists())
+                    .values(availability_status=True, last_update=now)
+                    .returning(EmergencyUnit.id)
+                    .execution_options(synchronize_session=False)
+                ).scalars())
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        if went_off or went_on:
+            self.counters.unit_availability_changed(len(went_on) - len(went_off))
+            self.fleet.set_available(went_off, False, at=now)
+            self.fleet.set_available(went_on, True, at=now)
+            for unit_pk in went_off:
+                self.spatial_index.remove(unit_pk)
+            for unit_pk in went_off + went_on:
+                view = self.fleet.view(unit_pk)
+                self.state_cache.put_unit(view)
+                if view.availability_status and view.latitude is not None:
+                    self.spatial_index.insert(unit_pk, view.service_type, view.latitude, view.longitude)
+                self.broadcaster.publish('unit_availability', self._unit_payload(view))
+            self._publish_stats()
+        if positions:
+            self.broadcaster.publish('unit_positions', [
+                {'id': row['unit_pk'], 'latitude': row['latitude'], 'longitude': row['longitude'],
+                 'at': row['last_update'].isoformat()} for row in positions
+            ])
+        return {'positions': len(positions), 'went_available': len(went_on), 'went_unavailable': len(went_off)}
+
+    def _write_through_unit(self, unit):
+        """Refresh the in-memory views of a just-committed unit, keeping any newer buffered telemetry position"""
+        view = unit_view(unit)
+        reading = self.telemetry.latest(unit.id) if self.telemetry is not None else None
+        if reading is not None and reading.position_at is not None:
+            view = view._replace(latitude=reading.latitude, longitude=reading.longitude)
+        self.state_cache.put_unit(view)
+        self.fleet.put(view)
+        return view
 
+    def apply_remote_events(self, events):
+        """Bring the in-memory views up to date with [(event_type, data)] published by other worker processes"""
+        transitions, unit_pks, positions = [], set(), {}
+        for event_type, data in events:
+            if event_type in ('call_created', 'call_status'):
+                transitions.append((data['id'], CallStatus(data['status'])))
+            elif event_type == 'unit_availability':
+                unit_pks.add(data['id'])
+            elif event_type == 'unit_positions':
+                positions.update((row['id'], row) for row in data)
+        if transitions:
+            calls = {call.id: call for call in EmergencyCall.query.options(joinedload(EmergencyCall.unit))
+                     .filter(EmergencyCall.id.in_({call_id for call_id, _ in transitions}))}
+            for call_id, status in transitions:
+                if call_id in calls:
+                    self.analytics.record_transition(calls[call_id], status)
+            for call in calls.values():
+                self.state_cache.put_call(call)
+        for unit in EmergencyUnit.query.filter(EmergencyUnit.id.in_(unit_pks)).all() if unit_pks else ():
+            view = self._write_through_unit(unit)
+            if view.availability_status and view.latitude is not None and view.longitude is not None:
+                self.spatial_index.insert(view.id, view.service_type, view.latitude, view.longitude)
+            else:
+                self.spatial_index.remove(view.id)
+        self.track_unit_positions({
+            unit_pk: Reading(row['latitude'], row['longitude'], datetime.datetime.fromisoformat(row['at']), None, None)
+            for unit_pk, row in positions.items() if unit_pk not in unit_pks
+        })
+        if transitions or unit_pks:
+            self._publish_stats()
+
+    @instrumented('dispatch')
     def update_unit_status(self, call_id, new_status):
         call = EmergencyCall.query.get(call_id)
         if not call:
             raise ValueError("Call not found")
-        fsm = CallStateMachine(call)
-        fsm.transition(new_status)
-        if new_status == CallStatus.COMPLETED and call.unit:
-            call.unit.availability_status = True
-        db.session.commit()
+        old_status = call.status
+        unit = call.unit
+        freed_unit = False
+        try:
+            CallStateMachine(call).transition(new_status)
+            if new_status == CallStatus.COMPLETED:
+                freed_unit = unit is not None and self._release_unit(unit)
+                self.rollups.record_completed([call])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        self.counters.call_status_changed(old_status, new_status)
+        view = None
+        if freed_unit:
+            self.counters.unit_availability_changed(1)
+            view = self._write_through_unit(unit)
+        self.state_cache.put_call(call)
+        self.analytics.record_transition(call, new_status)
+        self.broadcaster.publish('call_status', self._call_payload(call))
+        if freed_unit:
+            self.broadcaster.publish('unit_availability', self._unit_payload(unit))
+        self._publish_stats()
+        if view is not None and view.latitude is not None and view.longitude is not None:
+            self.spatial_index.insert(view.id, view.service_type, view.latitude, view.longitude)
 
+    @instrumented('dispatch')
+    def update_call_statuses(self, changes):
+        """Apply {call_id: new_status} to many calls in one transaction (e.g. closing every call at a scene)"""
+        try:
+            result = CallStateMachine.transition_many(changes)
+            completed = [call_id for call_id, _, _, new_status in result.changes if new_status == CallStatus.COMPLETED]
+            if completed:
+                self.rollups.record_completed(db.session.execute(
+                    db.select(EmergencyCall.timestamp, EmergencyCall.emergency_type, EmergencyCall.dispatched_at,
+                              EmergencyCall.on_scene_at, EmergencyCall.completed_at, EmergencyCall.unit_id)
+                    .where(EmergencyCall.id.in_(completed))
+                ).all())
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        for (old_status, new_status), count in collections.Counter(
+                (old_status, new_status) for _, _, old_status, new_status in result.changes).items():
+            self.counters.call_status_changed(old_status, new_status, count)
+        freed = set(result.freed_unit_ids)
+        if freed:
+            self.counters.unit_availability_changed(len(freed))
+        calls = EmergencyCall.query.options(joinedload(EmergencyCall.unit)).filter(
+            EmergencyCall.id.in_(list(changes))).all()
+        freed_units = {call.unit.id: self._write_through_unit(call.unit) for call in calls
+                       if call.unit is not None and call.unit.id in freed}
+        for call in calls:
+            self.state_cache.put_call(call)
+            self.analytics.record_transition(call, call.status)
+            self.broadcaster.publish('call_status', self._call_payload(call))
+        for unit in freed_units.values():
+            self.broadcaster.publish('unit_availability', self._unit_payload(unit))
+            if unit.latitude is not None and unit.longitude is not None:
+                self.spatial_index.insert(unit.id, unit.service_type, unit.latitude, unit.longitude)
+        self._publish_stats()
+        return result.changes
+
+    @instrumented('dispatch')
     def submit_intervention_report(self, call_id, report_data):
         report = InterventionReport(
             call_id=call_id,
@@ -92,8 +526,64 @@ class EnhancedDispatchService:
         )
         db.session.add(report)
         db.session.commit()
+        self.counters.report_filed()
+        self._publish_stats()
         return report
 
+    @instrumented('dispatch')
     def get_system_statistics(self):
+        """Metrics served from the in-process counters; nothing is queried or written"""
+        metrics = self.counters.metrics()
+        metrics['response_times'] = self.analytics.summary()
+        return metrics
+
+    @instrumented('dispatch')
+    def get_response_time_analytics(self):
+        """Per-interval response analytics (dispatch delay, travel, response, total)"""
+        return self.analytics.all_intervals()
+
+    @instrumented('dispatch')
+    def snapshot_statistics(self):
+        """Persist the current metrics as a Statistics row; response times come from the live sketches"""
         stats_obj = Statistics()
-        return stats_obj.calculate_metrics()
\ No newline at end of file
+        db.session.add(stats_obj)
+        return stats_obj.calculate_metrics(self.analytics, fleet=self.fleet)
+
+    def _publish_stats(self):
+        self.broadcaster.publish('stats', self.counters.snapshot())
+
+    @staticmethod
+    def _call_payload(call):
+        return {
+            "id": call.id,
+            "caller_name": call.caller_name,
+            "phone_number": call.phone_number,
+            "location": call.location,
+            "emergency_type": call.emergency_type.value,
+            "status": call.status.value,
+            "timestamp": call.timestamp.isoformat(),
+            "unit_id": call.unit.unit_id if call.unit else None
+        }
+
+    @staticmethod
+    def _notification_payload(dispatch_cmd, call, unit):
+        return {
+            "command_id": dispatch_cmd.command_id,
+            "unit_id": unit.unit_id,
+            "call_id": call.id,
+            "emergency_type": call.emergency_type.value,
+            "location": call.location,
+            "latitude": call.latitude,
+            "longitude": call.longitude,
+            "details": dispatch_cmd.details,
+            "dispatched_at": call.dispatched_at.isoformat()
+        }
+
+    @staticmethod
+    def _unit_payload(unit):
+        return {
+            "id": unit.id,
+            "unit_id": unit.unit_id,
+            "service_type": unit.service_type.value,
+            "available": unit.availability_status
+        }
@@ -0,0 +1,212 @@
+from models import EmergencyType, EmergencyUnit
+from database import db
+from services.spatial_index import KM_PER_DEGREE_LAT, KM_PER_DEGREE_LON
+from services.state_cache import UnitView
+from array import array
+import datetime
+import heapq
+import itertools
+import math
+import operator
+import threading
+
+TYPES = tuple(EmergencyType)
+TYPE_CODES = {emergency_type: code for code, emergency_type in enumerate(TYPES)}
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+class FleetSnapshot:
+    """Array-backed copy of the unit fleet: one typed array per field, one slot per unit.
+
+    Whole-fleet questions (which units are free, how many per type, how busy,
+    who is closest) are answered by passes over the columns built from
+    itertools/operator/map, which run in C without creating an object per
+    unit, so they stay cheap at 100k units and never materialize ORM rows.
+    Distances use the same local plane projection (kilometres) as the
+    SpatialIndex. The dispatch service updates slots in place after each unit
+    mutation; `load` rebuilds everything from one column-only SELECT.
+    """
+
+    def __init__(self, reference_latitude=45.75):
+        self._lon_scale = KM_PER_DEGREE_LON * math.cos(math.radians(reference_latitude))
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.ids = array('q')
+        self.types = array('b')
+        self.available = array('b')
+        self.positioned = array('b')
+        self.latitude = array('d')  # NaN when unknown
+        self.longitude = array('d')
+        self.last_update = array('d')  # seconds since EPOCH, NaN when unknown
+        self.codes = []  # unit_id strings
+        self._slots = {}  # unit pk -> slot
+        self._pks = {}  # unit_id string -> unit pk
+        self._totals = [0] * len(TYPES)
+        self._free = [0] * len(TYPES)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, unit_pk):
+        return unit_pk in self._slots
+
+    # Updates ---------------------------------------------------------------
+
+    def load(self):
+        """Rebuild from the database (startup / resync)"""
+        rows = db.session.execute(db.select(
+            EmergencyUnit.id, EmergencyUnit.unit_id, EmergencyUnit.service_type, EmergencyUnit.availability_status,
+            EmergencyUnit.latitude, EmergencyUnit.longitude, EmergencyUnit.last_update
+        ).order_by(EmergencyUnit.id))
+        with self._lock:
+            self._reset()
+            for row in rows:
+                self._put(UnitView(*row))
+
+    def put(self, unit):
+        """Insert or refresh one unit from an EmergencyUnit or UnitView"""
+        with self._lock:
+            self._put(unit)
+
+    def _put(self, unit):
+        code = TYPE_CODES[unit.service_type]
+        available = 1 if unit.availability_status else 0
+        positioned = unit.latitude is not None and unit.longitude is not None
+        latitude, longitude = (unit.latitude, unit.longitude) if positioned else (math.nan, math.nan)
+        updated = (unit.last_update - EPOCH).total_seconds() if unit.last_update else math.nan
+        slot = self._slots.get(unit.id)
+        if slot is None:
+            slot = self._slots[unit.id] = len(self.ids)
+            self.ids.append(unit.id)
+            for column, value in ((self.types, code), (self.available, available), (self.positioned, positioned),
+                                  (self.latitude, latitude), (self.longitude, longitude),
+                                  (self.last_update, updated)):
+                column.append(value)
+            self.codes.append(unit.unit_id)
+        else:
+            self._pks.pop(self.codes[slot], None)
+            self._count(slot, -1)
+            self.types[slot], self.available[slot], self.positioned[slot] = code, available, positioned
+            self.latitude[slot], self.longitude[slot], self.last_update[slot] = latitude, longitude, updated
+            self.codes[slot] = unit.unit_id
+        self._pks[unit.unit_id] = unit.id
+        self._count(slot, 1)
+
+    def _count(self, slot, sign):
+        code = self.types[slot]
+        self._totals[code] += sign
+        self._free[code] += sign * self.available[slot]
+
+    def set_available(self, unit_pks, available, at=None):
+        """Flip availability of units already in the snapshot (unknown ids are ignored)"""
+        updated = ((at or datetime.datetime.utcnow()) - EPOCH).total_seconds()
+        with self._lock:
+            for unit_pk in unit_pks:
+                slot = self._slots.get(unit_pk)
+                if slot is None:
+                    continue
+                self._count(slot, -1)
+                self.available[slot] = 1 if available else 0
+                self.last_update[slot] = updated
+                self._count(slot, 1)
+
+    def move(self, unit_pk, latitude, longitude, at):
+        """Set a unit's position (telemetry); returns its UnitView, or None if the unit is unknown"""
+        with self._lock:
+            slot = self._slots.get(unit_pk)
+            if slot is None:
+                return None
+            self.latitude[slot], self.longitude[slot], self.positioned[slot] = latitude, longitude, 1
+            self.last_update[slot] = (at - EPOCH).total_seconds()
+            return self._view(slot)
+
+    def remove(self, unit_pk):
+        """Drop a unit, moving the last slot into its place to keep the columns dense"""
+        with self._lock:
+            slot = self._slots.pop(unit_pk, None)
+            if slot is None:
+                return
+            self._count(slot, -1)
+            self._pks.pop(self.codes[slot], None)
+            last = len(self.ids) - 1
+            columns = (self.ids, self.types, self.available, self.positioned, self.latitude, self.longitude,
+                       self.last_update, self.codes)
+            if slot != last:
+                for column in columns:
+                    column[slot] = column[last]
+                self._slots[self.ids[slot]] = slot
+            for column in columns:
+                column.pop()
+
+    # Column passes -----------------------------------------------------------
+
+    def _mask(self, service_type=None, available=True, positioned=False):
+        """Per-slot booleans for the requested filters (an iterator, evaluated lazily)"""
+        mask = self.available if available else itertools.repeat(1, len(self.ids))
+        if positioned:
+            mask = map(operator.and_, mask, self.positioned)
+        if service_type is not None:
+            mask = map(operator.and_, mask, map(operator.eq, self.types, itertools.repeat(TYPE_CODES[service_type])))
+        return mask
+
+    def available_ids(self, service_type=None):
+        """Primary keys of available units (of one type), in snapshot order"""
+        with self._lock:
+            return list(itertools.compress(self.ids, self._mask(service_type)))
+
+    def counts(self):
+        """{type value: {'total': n, 'available': n}}, kept up to date on every change"""
+        with self._lock:
+            return {emergency_type.value: {'total': self._totals[code], 'available': self._free[code]}
+                    for code, emergency_type in enumerate(TYPES)}
+
+    def utilization(self):
+        """Same keys as Statistics._unit_utilization"""
+        with self._lock:
+            total = sum(self._totals)
+            busy = total - sum(self._free)
+        return {
+            "total": total,
+            "busy": busy,
+            "utilization_rate": (busy / total * 100) if total > 0 else 0
+        }
+
+    def rank(self, service_type, latitude, longitude, k=None, available=True):
+        """(distance_km, unit_pk) of positioned units closest to a point; all of them when k is None"""
+        with self._lock:
+            dx = map(operator.mul, map(operator.sub, self.longitude, itertools.repeat(longitude)),
+                     itertools.repeat(self._lon_scale))
+            dy = map(operator.mul, map(operator.sub, self.latitude, itertools.repeat(latitude)),
+                     itertools.repeat(KM_PER_DEGREE_LAT))
+            distances = map(math.hypot, dx, dy)
+            candidates = itertools.compress(zip(distances, self.ids),
+                                            self._mask(service_type, available, positioned=True))
+            return sorted(candidates) if k is None else heapq.nsmallest(k, candidates)
+
+    # Records -----------------------------------------------------------------
+
+    def lookup(self, unit_code):
+        """Primary key of the unit with this unit_id, or None"""
+        with self._lock:
+            return self._pks.get(unit_code)
+
+    def view(self, unit_pk):
+        """UnitView of one unit, or None"""
+        with self._lock:
+            slot = self._slots.get(unit_pk)
+            return None if slot is None else self._view(slot)
+
+    def _view(self, slot):
+        positioned, updated = self.positioned[slot], self.last_update[slot]
+        return UnitView(
+            self.ids[slot], self.codes[slot], TYPES[self.types[slot]], bool(self.available[slot]),
+            self.latitude[slot] if positioned else None, self.longitude[slot] if positioned else None,
+            None if math.isnan(updated) else EPOCH + datetime.timedelta(seconds=updated)
+        )
+
+    def available_units(self, service_type=None):
+        """UnitViews of available units, ordered by id"""
+        with self._lock:
+            return [self._view(self._slots[unit_pk]) for unit_pk in sorted(self.available_ids(service_type))]
@@ -0,0 +1,310 @@
+"""Latency histograms, SQL/commit accounting and an optional sampling profiler.
+
+Everything is recorded into the module-level `metrics` registry and served in
+Prometheus text exposition format at /metrics. Service methods are wrapped
+with @instrumented(component); Flask requests and SQLAlchemy engines are
+hooked by `init_app` / `watch_engine`. Each thread keeps a stack of open
+scopes (the current request and any instrumented calls inside it) and every
+SQL statement or commit is charged to all of them, so a request's query
+count includes the queries of the service methods it called.
+"""
+import bisect
+import collections
+import datetime
+import functools
+import os
+import sys
+import threading
+import time
+
+from flask import g, request
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100, 250, 1000)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Labelled histograms and counters, rendered in Prometheus text format"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}
+        self._histograms = collections.defaultdict(dict)  # name -> {labels: Histogram}
+        self._counters = collections.defaultdict(collections.Counter)  # name -> {labels: value}
+
+    def describe(self, name, text):
+        self._help[name] = text
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            histogram = self._histograms[name].get(key)
+            if histogram is None:
+                histogram = self._histograms[name][key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        with self._lock:
+            self._counters[name][tuple(sorted(labels.items()))] += amount
+
+    def histogram(self, name, **labels):
+        """(count, sum) of one labelled histogram, or None"""
+        with self._lock:
+            histogram = self._histograms.get(name, {}).get(tuple(sorted(labels.items())))
+            return (histogram.count, histogram.sum) if histogram else None
+
+    @staticmethod
+    def _labels(pairs):
+        if not pairs:
+            return ''
+        escaped = (f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                   for key, value in pairs)
+        return '{' + ','.join(escaped) + '}'
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name in sorted(self._counters):
+                lines.append(f"# HELP {name} {self._help.get(name, name)}")
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in sorted(self._counters[name].items()):
+                    lines.append(f"{name}{self._labels(labels)} {value}")
+            for name in sorted(self._histograms):
+                lines.append(f"# HELP {name} {self._help.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, histogram in sorted(self._histograms[name].items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{self._labels(labels + (('le', bound),))} {cumulative}")
+                    lines.append(f"{name}_bucket{self._labels(labels + (('le', '+Inf'),))} {histogram.count}")
+                    lines.append(f"{name}_sum{self._labels(labels)} {round(histogram.sum, 6)}")
+                    lines.append(f"{name}_count{self._labels(labels)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry()
+metrics.describe('dispatch_operation_seconds', 'Latency of instrumented service operations')
+metrics.describe('dispatch_operation_queries', 'SQL statements issued per service operation')
+metrics.describe('dispatch_operation_commits', 'Commits per service operation')
+metrics.describe('dispatch_operation_errors_total', 'Service operations that raised')
+metrics.describe('http_request_seconds', 'Latency of Flask requests by endpoint')
+metrics.describe('http_request_queries', 'SQL statements issued per request')
+metrics.describe('http_request_commits', 'Commits per request')
+metrics.describe('db_query_seconds', 'SQL statement execution time by statement kind')
+metrics.describe('profiler_slow_requests_total', 'Slow requests whose sampled stacks were dumped')
+
+
+class Scope:
+    __slots__ = ('queries', 'commits')
+
+    def __init__(self):
+        self.queries = 0
+        self.commits = 0
+
+
+_local = threading.local()
+
+
+def _scopes():
+    scopes = getattr(_local, 'scopes', None)
+    if scopes is None:
+        scopes = _local.scopes = []
+    return scopes
+
+
+def open_scope():
+    scope = Scope()
+    _scopes().append(scope)
+    return scope
+
+
+def close_scope(scope):
+    scopes = _scopes()
+    if scope in scopes:
+        scopes.remove(scope)
+
+
+def instrumented(component, name=None):
+    """Decorator recording latency, query and commit counts of a service method"""
+    def decorate(func):
+        operation = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            scope = open_scope()
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                metrics.inc('dispatch_operation_errors_total', component=component, operation=operation)
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+                close_scope(scope)
+                metrics.observe('dispatch_operation_seconds', elapsed, component=component, operation=operation)
+                metrics.observe('dispatch_operation_queries', scope.queries, COUNT_BUCKETS,
+                                component=component, operation=operation)
+                metrics.observe('dispatch_operation_commits', scope.commits, COUNT_BUCKETS,
+                                component=component, operation=operation)
+        return wrapper
+    return decorate
+
+
+# SQLAlchemy hooks ------------------------------------------------------------
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the execution context, not the connection, so a statement that
+    # raises (after_cursor_execute never fires) leaves nothing behind
+    if context is not None:
+        context.instrumentation_started = time.perf_counter()
+    for scope in _scopes():
+        scope.queries += 1
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, 'instrumentation_started', None)
+    if started is None:
+        return
+    kind = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else 'other'
+    metrics.observe('db_query_seconds', time.perf_counter() - started, kind=kind)
+
+
+def _on_commit(conn):
+    for scope in _scopes():
+        scope.commits += 1
+
+
+def watch_engine(engine):
+    """Count statements, their latency and commits on an engine (idempotent)"""
+    if event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        return
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'commit', _on_commit)
+
+
+# Sampling profiler -----------------------------------------------------------
+
+class SamplingProfiler:
+    """Samples the stacks of threads serving requests; dumps slow ones as folded stacks.
+
+    Output files hold one `frame;frame;frame count` line per distinct stack, the
+    input format of flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, interval=0.005, slow_seconds=0.5, output_dir='profiles'):
+        self.interval = interval
+        self.slow_seconds = slow_seconds
+        self.output_dir = output_dir
+        self.enabled = False
+        self._active = {}  # thread ident -> Counter of folded stacks
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        with self._lock:
+            self.enabled = True
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            self.enabled = False
+            thread, self._thread = self._thread, None
+            self._active.clear()
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+
+    def begin(self):
+        if self.enabled:
+            with self._lock:
+                self._active[threading.get_ident()] = collections.Counter()
+
+    def end(self, elapsed, label):
+        """Stop sampling this thread; returns the dump path if the request was slow"""
+        with self._lock:
+            samples = self._active.pop(threading.get_ident(), None)
+        if not samples or elapsed < self.slow_seconds:
+            return None
+        os.makedirs(self.output_dir, exist_ok=True)
+        safe_label = ''.join(char if char.isalnum() else '_' for char in label)
+        path = os.path.join(self.output_dir, f"{datetime.datetime.utcnow():%Y%m%dT%H%M%S%f}-{safe_label}-"
+                                             f"{int(elapsed * 1000)}ms.folded")
+        with open(path, 'w') as handle:
+            for stack, count in samples.most_common():
+                handle.write(f"{stack} {count}\n")
+        metrics.inc('profiler_slow_requests_total', endpoint=label)
+        return path
+
+    @staticmethod
+    def _fold(frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        return ';'.join(reversed(stack))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, samples in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        samples[self._fold(frame)] += 1
+
+
+# Flask wiring ----------------------------------------------------------------
+
+def init_app(app, profiler=None):
+    """Time every request and charge its SQL statements and commits to its endpoint"""
+
+    @app.before_request
+    def _start_request():
+        g.instrumentation_scope = open_scope()
+        g.instrumentation_started = time.perf_counter()
+        if profiler is not None:
+            profiler.begin()
+
+    @app.after_request
+    def _record_status(response):
+        g.instrumentation_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _finish_request(exc):
+        scope = g.pop('instrumentation_scope', None)
+        if scope is None:
+            return
+        elapsed = time.perf_counter() - g.pop('instrumentation_started')
+        close_scope(scope)
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        status = g.pop('instrumentation_status', 500 if exc else 200)
+        metrics.observe('http_request_seconds', elapsed, method=request.method, endpoint=endpoint, status=status)
+        metrics.observe('http_request_queries', scope.queries, COUNT_BUCKETS, endpoint=endpoint)
+        metrics.observe('http_request_commits', scope.commits, COUNT_BUCKETS, endpoint=endpoint)
+        if profiler is not None:
+            path = profiler.end(elapsed, f"{request.method} {endpoint}")
+            if path:
+                app.logger.warning("Slow request %s %s (%.0f ms), stacks in %s",
+                                   request.method, request.path, elapsed * 1000, path)
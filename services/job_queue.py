@@ -0,0 +1,152 @@
+from database import db
+import collections
+import datetime
+import itertools
+import queue
+import threading
+import uuid
+
+
+class Job:
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+
+    def __init__(self, kind, func, args, kwargs, priority):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.priority = priority
+        self.status = Job.QUEUED
+        self.result = None
+        self.error = None
+        self.created_at = datetime.datetime.utcnow()
+        self.started_at = None
+        self.finished_at = None
+        self._func = func
+        self._args = args
+        self._kwargs = kwargs
+        self._done = threading.Event()
+
+    def wait(self, timeout=None):
+        """Block until the job has finished; returns False on timeout"""
+        return self._done.wait(timeout)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'priority': self.priority,
+            'status': self.status,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class JobQueue:
+    """In-process priority job queue served by a pool of worker threads.
+
+    Jobs run inside an application context with their own database session, so
+    they can call the dispatch service exactly as a request would. Lower
+    priority numbers run first; equal priorities run in submission order.
+    Finished jobs stay queryable until `retain` newer ones have finished, and
+    every state change is published to the broadcaster (if any) as a `job`
+    event. In cluster mode the other workers' `job` events are fed to
+    `apply_remote_events`, so `status` knows about jobs running anywhere.
+    """
+
+    def __init__(self, app, workers=4, broadcaster=None, retain=10000):
+        self.app = app
+        self.broadcaster = broadcaster
+        self.retain = retain
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._jobs = {}
+        self._remote = collections.OrderedDict()  # job id -> latest to_dict() published by another worker
+        self._finished = collections.deque()
+        self._lock = threading.Lock()
+        self._workers = [
+            threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, kind, func, *args, priority=10, **kwargs):
+        """Queue func(*args, **kwargs) and return the Job immediately"""
+        job = Job(kind, func, args, kwargs, priority)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._queue.put((priority, next(self._sequence), job))
+        self._publish(job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def status(self, job_id):
+        """to_dict() of a job run by this worker or, in cluster mode, by another one; None if unknown"""
+        job = self.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        with self._lock:
+            return self._remote.get(job_id)
+
+    def apply_remote_events(self, events):
+        """Remember the job state changes published by other workers (DatabaseCoordinator listener)"""
+        with self._lock:
+            for event_type, data in events:
+                if event_type == 'job':
+                    self._remote[data['id']] = data
+                    self._remote.move_to_end(data['id'])
+            while len(self._remote) > self.retain:
+                self._remote.popitem(last=False)
+
+    @property
+    def pending(self):
+        return self._queue.qsize()
+
+    def _work(self):
+        while True:
+            _, _, job = self._queue.get()
+            if job is None:
+                return
+            job.status = Job.RUNNING
+            job.started_at = datetime.datetime.utcnow()
+            self._publish(job)
+            with self.app.app_context():
+                try:
+                    job.result = job._func(*job._args, **job._kwargs)
+                    job.status = Job.SUCCEEDED
+                except Exception as e:
+                    db.session.rollback()
+                    job.error = str(e)
+                    job.status = Job.FAILED
+                finally:
+                    db.session.remove()
+            job.finished_at = datetime.datetime.utcnow()
+            self._retire(job)
+            job._done.set()
+            self._publish(job)
+
+    def _retire(self, job):
+        with self._lock:
+            self._finished.append(job.id)
+            while len(self._finished) > self.retain:
+                self._jobs.pop(self._finished.popleft(), None)
+
+    def _publish(self, job):
+        if self.broadcaster is not None:
+            self.broadcaster.publish('job', job.to_dict())
+
+    def shutdown(self, wait=True):
+        """Stop the workers after the jobs already queued have run"""
+        for _ in self._workers:
+            self._queue.put((float('inf'), next(self._sequence), None))
+        if wait:
+            for worker in self._workers:
+                worker.join()
@@ -0,0 +1,263 @@
+"""Transactional outbox: notifications are stored with the change they announce and delivered afterwards.
+
+`enqueue` adds an OutboxMessage to the caller's session, so it commits (or
+rolls back) together with the dispatch that produced it and no network I/O
+ever happens inside that transaction. `OutboxRelay` drains the table in
+batches over a pluggable transport, retrying failures with exponential
+backoff. Delivery is at least once; every message carries an idempotency key
+derived from its dispatch command so receivers can drop repeats.
+"""
+from models import OutboxMessage
+from database import db
+from services.instrumentation import metrics
+import collections
+import datetime
+import json
+import os
+import random
+import threading
+import time
+
+metrics.describe('outbox_messages_total', 'Outbox delivery attempts by outcome')
+metrics.describe('outbox_batch_seconds', 'Time spent handing one outbox batch to the transport')
+
+# What a transport receives: one per message, in outbox order
+OutboundMessage = collections.namedtuple('OutboundMessage', 'key topic destination payload attempt')
+
+
+def unit_notification_key(command_id):
+    return f"{OutboxMessage.UNIT_NOTIFICATION}:{command_id}"
+
+
+def enqueue(topic, idempotency_key, destination, payload, now=None):
+    """Queue a message in the current transaction; the caller commits"""
+    message = OutboxMessage(idempotency_key=idempotency_key, topic=topic, destination=destination,
+                            payload=payload, status=OutboxMessage.PENDING, attempts=0,
+                            next_attempt_at=now or datetime.datetime.utcnow())
+    db.session.add(message)
+    return message
+
+
+class StubTransport:
+    """In-memory transport for development and tests; keeps one copy per idempotency key.
+
+    fail_batches makes the next n sends raise, to exercise the retry path.
+    """
+
+    name = 'stub'
+
+    def __init__(self, fail_batches=0):
+        self.fail_batches = fail_batches
+        self.delivered = collections.OrderedDict()
+        self.duplicates = 0
+        self._lock = threading.Lock()
+
+    def send(self, messages):
+        with self._lock:
+            if self.fail_batches > 0:
+                self.fail_batches -= 1
+                raise ConnectionError("Stub transport failure")
+            for message in messages:
+                if message.key in self.delivered:
+                    self.duplicates += 1
+                else:
+                    self.delivered[message.key] = message
+        return {}
+
+
+class FileTransport:
+    """Appends each batch as NDJSON lines to a file (one fsync per batch); readers dedupe on "key" """
+
+    name = 'file'
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def send(self, messages):
+        sent_at = datetime.datetime.utcnow().isoformat()
+        lines = "".join(json.dumps({'key': message.key, 'topic': message.topic, 'destination': message.destination,
+                                    'payload': message.payload, 'attempt': message.attempt, 'sent_at': sent_at}) + "\n"
+                        for message in messages)
+        with self._lock, open(self.path, 'a', encoding='utf-8') as output:
+            output.write(lines)
+            output.flush()
+            os.fsync(output.fileno())
+        return {}
+
+
+def make_transport(name, path=None):
+    if name == StubTransport.name:
+        return StubTransport()
+    if name == FileTransport.name:
+        if not path:
+            raise ValueError("The file transport needs a path (OUTBOX_FILE)")
+        return FileTransport(path)
+    raise ValueError(f"Unknown outbox transport: {name}")
+
+
+class OutboxRelay:
+    """Background thread that delivers pending outbox messages every `interval` seconds.
+
+    Each batch is claimed with one UPDATE (which bumps the attempt count and
+    leases the rows for `lease` seconds, so a second relay skips them), handed
+    to the transport outside any transaction, and settled with one more
+    write. A transport either raises (the whole batch failed) or returns
+    {idempotency_key: error} for the messages it could not deliver. Failed
+    messages are retried after backoff * 2 ** (attempts - 1) seconds (capped at
+    max_backoff, with jitter); after max_attempts they are marked dead. A relay
+    that crashes mid-batch leaves its messages to be retried once the lease
+    runs out.
+    """
+
+    def __init__(self, app, transport=None, batch_size=100, interval=1.0, max_attempts=10, backoff=1.0,
+                 max_backoff=300.0, lease=60.0):
+        self.app = app
+        self.transport = transport if transport is not None else StubTransport()
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.lease = lease
+        self.last_flush = None
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def backoff_delay(self, attempts):
+        delay = min(self.max_backoff, self.backoff * 2 ** max(attempts - 1, 0))
+        return delay * random.uniform(0.5, 1.0)
+
+    def flush(self, now=None, max_batches=None):
+        """Deliver due messages batch by batch until none are left; returns a summary"""
+        started = time.perf_counter()
+        totals = collections.Counter(delivered=0, retrying=0, dead=0)
+        batches = 0
+        with self._flush_lock:
+            while max_batches is None or batches < max_batches:
+                outcome, claimed = self.deliver_batch(now)
+                totals.update(outcome)
+                batches += 1 if claimed else 0
+                if claimed < self.batch_size:
+                    break
+        self.last_flush = dict(totals, batches=batches, seconds=round(time.perf_counter() - started, 4),
+                               at=datetime.datetime.utcnow().isoformat())
+        return self.last_flush
+
+    def deliver_batch(self, now=None):
+        """Claim, send and settle one batch; returns (Counter of outcomes, number of messages claimed)"""
+        claimed = self._claim(now or datetime.datetime.utcnow())
+        if not claimed:
+            return collections.Counter(), 0
+        batch = [OutboundMessage(row.idempotency_key, row.topic, row.destination, row.payload, row.attempts)
+                 for row in claimed]
+        sent = time.perf_counter()
+        try:
+            errors = self.transport.send(batch) or {}
+        except Exception as e:
+            errors = {message.key: f"{type(e).__name__}: {e}" for message in batch}
+        metrics.observe('outbox_batch_seconds', time.perf_counter() - sent, transport=self.transport.name)
+        outcome = self._settle(claimed, errors, datetime.datetime.utcnow())
+        for name, count in outcome.items():
+            metrics.inc('outbox_messages_total', count, outcome=name)
+        return outcome, len(claimed)
+
+    def _claim(self, now):
+        due = (db.select(OutboxMessage.id)
+               .where(OutboxMessage.status == OutboxMessage.PENDING, OutboxMessage.next_attempt_at <= now)
+               .order_by(OutboxMessage.id)
+               .limit(self.batch_size))
+        try:
+            claimed = db.session.execute(
+                db.update(OutboxMessage)
+                .where(OutboxMessage.id.in_(due.scalar_subquery()),
+                       OutboxMessage.status == OutboxMessage.PENDING, OutboxMessage.next_attempt_at <= now)
+                .values(attempts=OutboxMessage.attempts + 1,
+                        next_attempt_at=now + datetime.timedelta(seconds=self.lease))
+                .returning(OutboxMessage.id, OutboxMessage.idempotency_key, OutboxMessage.topic,
+                           OutboxMessage.destination, OutboxMessage.payload, OutboxMessage.attempts)
+                .execution_options(synchronize_session=False)
+            ).all()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return sorted(claimed, key=lambda row: row.id)
+
+    def _settle(self, claimed, errors, now):
+        outcome = collections.Counter()
+        delivered_ids = [row.id for row in claimed if row.idempotency_key not in errors]
+        failures = []
+        for row in claimed:
+            if row.idempotency_key not in errors:
+                continue
+            dead = row.attempts >= self.max_attempts
+            outcome['dead' if dead else 'retrying'] += 1
+            failures.append({
+                'id': row.id,
+                'status': OutboxMessage.DEAD if dead else OutboxMessage.PENDING,
+                'next_attempt_at': now + datetime.timedelta(seconds=0 if dead else self.backoff_delay(row.attempts)),
+                'last_error': str(errors[row.idempotency_key])[:500]
+            })
+        outcome['delivered'] = len(delivered_ids)
+        try:
+            if delivered_ids:
+                db.session.execute(
+                    db.update(OutboxMessage).where(OutboxMessage.id.in_(delivered_ids))
+                    .values(status=OutboxMessage.DELIVERED, delivered_at=now, last_error=None)
+                    .execution_options(synchronize_session=False)
+                )
+            if failures:
+                db.session.execute(db.update(OutboxMessage), failures)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return +outcome
+
+    def stats(self):
+        counts = dict(db.session.execute(
+            db.select(OutboxMessage.status, db.func.count()).group_by(OutboxMessage.status)
+        ).all())
+        return {
+            'pending': counts.get(OutboxMessage.PENDING, 0),
+            'delivered': counts.get(OutboxMessage.DELIVERED, 0),
+            'dead': counts.get(OutboxMessage.DEAD, 0),
+            'transport': self.transport.name,
+            'batch_size': self.batch_size,
+            'interval': self.interval,
+            'running': self.running,
+            'last_flush': self.last_flush
+        }
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='outbox-relay', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with self.app.app_context():
+                try:
+                    self.flush()
+                except Exception:
+                    db.session.rollback()
+                    self.app.logger.exception("Outbox relay flush failed")
+                finally:
+                    db.session.remove()
@@ -0,0 +1,283 @@
+from models import EmergencyUnit, EmergencyType
+from database import db, read_engine
+from services.response_analytics import INTERVALS
+from services.rollups import RollupStore
+from services.job_queue import Job
+import collections
+import datetime
+import hashlib
+import io
+import threading
+
+SUMMARY_COLUMNS = ('count', 'average', 'median', 'p90', 'p99', 'max')
+
+
+class ReportEngine:
+    """Builds the statistics PDF from pre-aggregated data and caches it by data version.
+
+    The cache key combines the counters' version (bumped by every call, unit and
+    report change), the requested period and the current hour, so repeated
+    downloads during a briefing are served from memory until something changes.
+    Reports for large fleets or long periods are built on the job queue. With a
+    shared `store` (cluster mode) built reports are also saved in the database,
+    so whichever worker gets the follow-up request can serve them.
+    """
+
+    def __init__(self, counters, analytics, job_queue=None, max_entries=8, large_units=500, large_days=31,
+                 chunk_size=64 * 1024, rollups=None, store=None):
+        self.counters = counters
+        self.analytics = analytics
+        self.rollups = rollups if rollups is not None else RollupStore()
+        self.job_queue = job_queue
+        self.max_entries = max_entries
+        self.large_units = large_units
+        self.large_days = large_days
+        self.chunk_size = chunk_size
+        self.store = store
+        self._cache = collections.OrderedDict()
+        self._pending = {}  # key -> Job building it
+        self._lock = threading.Lock()
+        self._stats = collections.Counter()
+
+    def cache_key(self, days, now=None):
+        now = now or datetime.datetime.utcnow()
+        return f"{self.counters.version}:{days}:{now:%Y%m%d%H}"
+
+    @staticmethod
+    def etag(key):
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    def cached(self, key):
+        with self._lock:
+            pdf = self._cache.get(key)
+            if pdf is not None:
+                self._cache.move_to_end(key)
+                self._stats['hits'] += 1
+                return pdf
+        if self.store is not None:
+            pdf = self.store.get(key)
+            if pdf is not None:
+                self._remember(key, pdf)
+                with self._lock:
+                    self._stats['hits'] += 1
+        return pdf
+
+    def _remember(self, key, pdf):
+        with self._lock:
+            self._cache[key] = pdf
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def is_large(self, days):
+        return days > self.large_days or self.counters.snapshot()['total_units'] > self.large_units
+
+    def get_or_build(self, days, key=None, job_id=None):
+        """(key, pdf bytes, None) when ready, or (key, None, job id) while a background build runs.
+
+        A `key` handed out with an earlier job is served as long as that report
+        is cached or still building (`job_id` may be another worker's job), even
+        though the data version has moved on.
+        """
+        if key is not None and key.split(':')[1:2] == [str(days)]:
+            pdf = self.cached(key)
+            if pdf is not None:
+                return key, pdf, None
+            with self._lock:
+                job = self._pending.get(key)
+            if job is not None:
+                return key, None, job.id
+            status = self.job_queue.status(job_id) if job_id and self.job_queue is not None else None
+            if status is not None and status['kind'] == 'report' and status['status'] in (Job.QUEUED, Job.RUNNING):
+                return key, None, job_id
+        key = self.cache_key(days)
+        pdf = self.cached(key)
+        if pdf is not None:
+            return key, pdf, None
+        if self.job_queue is not None and self.is_large(days):
+            with self._lock:
+                job = self._pending.get(key)
+                if job is None:
+                    job = self._pending[key] = self.job_queue.submit('report', self._build_job, days, key, priority=50)
+            return key, None, job.id
+        return key, self.build(days, key), None
+
+    def _build_job(self, days, key):
+        try:
+            return {'key': key, 'bytes': len(self.build(days, key))}
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def build(self, days, key=None):
+        """Collect, render and cache the report for the last `days` days"""
+        key = key or self.cache_key(days)
+        with self._lock:
+            self._stats['builds'] += 1
+        pdf = self.render(self.collect(days))
+        if self.store is not None:
+            self.store.put(key, pdf)
+        self._remember(key, pdf)
+        return pdf
+
+    def iter_chunks(self, pdf):
+        for start in range(0, len(pdf), self.chunk_size):
+            yield pdf[start:start + self.chunk_size]
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'cached_reports': len(self._cache),
+                'pending_builds': len(self._pending),
+                'hits': self._stats['hits'],
+                'builds': self._stats['builds']
+            }
+
+    # Data ------------------------------------------------------------------
+
+    def collect(self, days, now=None):
+        """Everything the report shows, as plain data: counters, sketches, rollups and open calls"""
+        now = now or datetime.datetime.utcnow()
+        since = now - datetime.timedelta(days=days)
+        granularity = 'day' if days > 2 else 'hour'
+        with read_engine().connect() as connection:
+            # Completed calls come from the rollups (whole periods), open ones from the live table
+            periods = self.rollups.periods(since, granularity, connection)
+            handled = self.rollups.handled_by_unit(since, connection)
+            units = [(unit_id, service_type, available, handled[unit_pk])
+                     for unit_pk, unit_id, service_type, available in connection.execute(
+                         db.select(EmergencyUnit.id, EmergencyUnit.unit_id, EmergencyUnit.service_type,
+                                   EmergencyUnit.availability_status)
+                         .order_by(EmergencyUnit.service_type, EmergencyUnit.unit_id))]
+        return {
+            'generated_at': now,
+            'since': since,
+            'days': days,
+            'granularity': granularity,
+            'snapshot': self.counters.snapshot(),
+            'metrics': self.counters.metrics(),
+            'intervals': self.analytics.all_intervals(),
+            'periods': sorted(periods.items()),
+            'units': units
+        }
+
+    # Rendering -------------------------------------------------------------
+
+    @staticmethod
+    def render(data):
+        """Multi-page PDF (bytes) from collect() output"""
+        # reportlab is imported here so the web workers only load it when a report is built
+        from reportlab.graphics.charts.barcharts import VerticalBarChart
+        from reportlab.graphics.charts.legends import Legend
+        from reportlab.graphics.shapes import Drawing
+        from reportlab.lib import colors
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib.styles import getSampleStyleSheet
+        from reportlab.lib.units import cm
+        from reportlab.platypus import LongTable, PageBreak, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+        styles = getSampleStyleSheet()
+        palette = [colors.HexColor('#0d6efd'), colors.HexColor('#dc3545'), colors.HexColor('#198754'),
+                   colors.HexColor('#6c757d')]
+        table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#343a40')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('FONTSIZE', (0, 0), (-1, -1), 8),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f2f2f2')]),
+            ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
+            ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+        ])
+
+        def table(rows, widths=None, long=False):
+            cls = LongTable if long else Table
+            result = cls(rows, colWidths=widths, repeatRows=1)
+            result.setStyle(table_style)
+            return result
+
+        def fmt(value):
+            return '-' if value is None else value
+
+        def bar_chart(categories, series, names, width=16 * cm, height=6 * cm):
+            drawing = Drawing(width, height + 1.2 * cm)
+            chart = VerticalBarChart()
+            chart.x, chart.y = 1.2 * cm, 1.2 * cm
+            chart.width, chart.height = width - 1.6 * cm, height - 0.4 * cm
+            chart.data = [[value or 0 for value in values] for values in series if values] or [[0]]
+            chart.categoryAxis.categoryNames = categories or ['']
+            chart.categoryAxis.labels.fontSize = 6
+            chart.categoryAxis.labels.angle = 45 if len(categories) > 12 else 0
+            chart.categoryAxis.labels.boxAnchor = 'ne' if len(categories) > 12 else 'n'
+            chart.valueAxis.valueMin = 0
+            chart.valueAxis.labels.fontSize = 7
+            for index in range(len(chart.data)):
+                chart.bars[index].fillColor = palette[index % len(palette)]
+            drawing.add(chart)
+            legend = Legend()
+            legend.x, legend.y = 1.4 * cm, height + 0.9 * cm
+            legend.fontSize = 7
+            legend.columnMaximum = 1
+            legend.deltax = 60
+            legend.alignment = 'right'
+            legend.colorNamePairs = [(palette[i % len(palette)], name) for i, name in enumerate(names)]
+            drawing.add(legend)
+            return drawing
+
+        story = [
+            Paragraph("System Statistics Report", styles['Title']),
+            Paragraph(f"Generated {data['generated_at']:%Y-%m-%d %H:%M} UTC, covering the last {data['days']} day(s) "
+                      f"since {data['since']:%Y-%m-%d %H:%M}", styles['Normal']),
+            Spacer(1, 0.5 * cm),
+            Paragraph("Current state", styles['Heading2']),
+        ]
+        snapshot, metrics = data['snapshot'], data['metrics']
+        story.append(table([['Metric', 'Value']] + [[key.replace('_', ' ').capitalize(), value]
+                                                     for key, value in snapshot.items()] + [
+            ['Unit utilization', f"{metrics['unit_utilization']['utilization_rate']:.1f}%"],
+            ['Completion rate', f"{metrics['completion_rate']['completion_rate']:.1f}%"],
+        ], widths=[8 * cm, 4 * cm]))
+
+        story += [Spacer(1, 0.5 * cm), Paragraph("Response times (minutes)", styles['Heading2'])]
+        intervals = data['intervals']
+        story.append(table([['Interval'] + [column.capitalize() for column in SUMMARY_COLUMNS]] + [
+            [name.replace('_', ' ')] + [fmt(intervals[name].get(column)) for column in SUMMARY_COLUMNS]
+            for name in INTERVALS
+        ]))
+        by_type = intervals['response_time']['by_type']
+        types = [emergency_type.value for emergency_type in EmergencyType]
+        story += [Spacer(1, 0.4 * cm), Paragraph("Response time by emergency type", styles['Heading3']),
+                  bar_chart(types, [[by_type.get(t, {}).get(q) for t in types] for q in ('median', 'p90', 'p99')],
+                            ['p50', 'p90', 'p99'])]
+
+        story += [PageBreak(), Paragraph(f"Calls per {data['granularity']}", styles['Heading2'])]
+        periods = data['periods']
+        if periods:
+            story.append(bar_chart([period[-5:] if data['granularity'] == 'hour' else period[5:]
+                                    for period, _ in periods],
+                                   [[counts[t] for _, counts in periods] for t in EmergencyType],
+                                   [t.value for t in EmergencyType]))
+        else:
+            story.append(Paragraph("No calls in this period.", styles['Normal']))
+        story.append(Spacer(1, 0.4 * cm))
+        story.append(table([['Period'] + types + ['Completed', 'Total']] + [
+            [period] + [counts[t] for t in EmergencyType] + [counts['completed'], sum(counts[t] for t in EmergencyType)]
+            for period, counts in periods
+        ], long=True))
+
+        story += [PageBreak(), Paragraph("Units", styles['Heading2'])]
+        by_unit = intervals['response_time']['by_unit']
+        story.append(table([['Unit', 'Type', 'Available', 'Calls in period', 'Responses', 'p50 (min)', 'p90 (min)']] + [
+            [unit_id, service_type.value, 'yes' if available else 'no', calls,
+             by_unit.get(unit_id, {}).get('count', 0), fmt(by_unit.get(unit_id, {}).get('median')),
+             fmt(by_unit.get(unit_id, {}).get('p90'))]
+            for unit_id, service_type, available, calls in data['units']
+        ], long=True))
+
+        def footer(canvas, doc):
+            canvas.setFont('Helvetica', 7)
+            canvas.drawRightString(A4[0] - 2 * cm, 1.2 * cm, f"Page {doc.page}")
+
+        buffer = io.BytesIO()
+        SimpleDocTemplate(buffer, pagesize=A4, title="System Statistics Report",
+                          leftMargin=2 * cm, rightMargin=2 * cm, topMargin=2 * cm, bottomMargin=2 * cm
+                          ).build(story, onFirstPage=footer, onLaterPages=footer)
+        return buffer.getvalue()
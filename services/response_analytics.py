@@ -0,0 +1,265 @@
+from models import EmergencyCall, EmergencyUnit, CallStatus
+from database import db
+from services.archive import archived_tables
+import collections
+import datetime
+import math
+import threading
+
+
+class QuantileSketch:
+    """Log-bucketed quantile sketch with bounded memory (DDSketch style).
+
+    Values are stored in geometric buckets so any quantile is returned within
+    `relative_accuracy` of the true value. When more than `max_buckets` are in
+    use the lowest buckets are folded together, which only costs accuracy on
+    the fast tail nobody reports on.
+    """
+
+    def __init__(self, relative_accuracy=0.01, max_buckets=512):
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._buckets = {}
+        self._zero_count = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value, count=1):
+        self.count += count
+        self.total += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if value <= 0:
+            self._zero_count += count
+            return
+        key = math.ceil(math.log(value) / self._log_gamma)
+        self._buckets[key] = self._buckets.get(key, 0) + count
+        if len(self._buckets) > self.max_buckets:
+            self._collapse()
+
+    def _collapse(self):
+        keys = sorted(self._buckets)
+        overflow = len(keys) - self.max_buckets
+        folded = sum(self._buckets.pop(key) for key in keys[:overflow + 1])
+        self._buckets[keys[overflow]] = folded
+
+    def merge(self, other):
+        for key, bucket_count in other._buckets.items():
+            self._buckets[key] = self._buckets.get(key, 0) + bucket_count
+        self._zero_count += other._zero_count
+        self.count += other.count
+        self.total += other.total
+        if other.count:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        while len(self._buckets) > self.max_buckets:
+            self._collapse()
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self._zero_count
+        if rank < seen:
+            return 0.0
+        for key in sorted(self._buckets):
+            seen += self._buckets[key]
+            if rank < seen:
+                value = 2 * self._gamma ** key / (self._gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def summary(self):
+        if not self.count:
+            return {"count": 0, "average": None, "median": None, "p90": None, "p99": None, "max": None}
+        return {
+            "count": self.count,
+            "average": round(self.total / self.count, 2),
+            "median": round(self.quantile(0.5), 2),
+            "p90": round(self.quantile(0.9), 2),
+            "p99": round(self.quantile(0.99), 2),
+            "max": round(self.max, 2)
+        }
+
+
+class RollingWindow:
+    """Sketches for the last `window` of time, kept as fixed-width slots"""
+
+    def __init__(self, window=datetime.timedelta(hours=1), slot=datetime.timedelta(minutes=1), **sketch_options):
+        self.window = window
+        self.slot = slot
+        self._sketch_options = sketch_options
+        self._slots = collections.deque()  # (slot_start, QuantileSketch), oldest first
+
+    def _slot_start(self, at):
+        slot_seconds = self.slot.total_seconds()
+        epoch = at.timestamp() if at.tzinfo else (at - datetime.datetime(1970, 1, 1)).total_seconds()
+        return epoch - epoch % slot_seconds
+
+    def add(self, value, at):
+        start = self._slot_start(at)
+        if self._slots and self._slots[-1][0] == start:
+            sketch = self._slots[-1][1]
+        elif not self._slots or self._slots[-1][0] < start:
+            sketch = QuantileSketch(**self._sketch_options)
+            self._slots.append((start, sketch))
+        else:
+            # Late value for an older slot; rare enough that a scan is fine
+            sketch = next((s for slot_start, s in self._slots if slot_start == start), None)
+            if sketch is None:
+                return
+        sketch.add(value)
+        self._expire(start)
+
+    def _expire(self, now_start):
+        horizon = now_start - self.window.total_seconds()
+        while self._slots and self._slots[0][0] <= horizon:
+            self._slots.popleft()
+
+    def sketch(self, now=None):
+        now = now or datetime.datetime.utcnow()
+        self._expire(self._slot_start(now))
+        merged = QuantileSketch(**self._sketch_options)
+        for _, sketch in self._slots:
+            merged.merge(sketch)
+        return merged
+
+
+# Interval name -> (EmergencyCall column it starts at, column it ends at). Dispatched
+# calls closed without an explicit ON_SCENE transition count completion as arrival.
+INTERVALS = {
+    'dispatch_delay': ('timestamp', 'dispatched_at'),
+    'travel_time': ('dispatched_at', 'on_scene_at'),
+    'response_time': ('timestamp', 'on_scene_at'),
+    'total_time': ('timestamp', 'completed_at'),
+}
+INTERVAL_ENDS = {
+    CallStatus.DISPATCHED: ('dispatch_delay',),
+    CallStatus.ON_SCENE: ('travel_time', 'response_time'),
+    CallStatus.COMPLETED: ('total_time',),
+}
+
+
+class ResponseTimeAnalytics:
+    """Streaming response-time aggregation fed by call state transitions.
+
+    Every completed interval (in minutes) is added to an all-time sketch, a
+    rolling-window sketch, and per emergency type and per unit sketches, so
+    percentile queries never touch the database.
+    """
+
+    def __init__(self, window=datetime.timedelta(hours=1), relative_accuracy=0.01):
+        self.window = window
+        self.relative_accuracy = relative_accuracy
+        self._lock = threading.Lock()
+        self._overall = {}
+        self._windows = {}
+        self._by_type = {}
+        self._by_unit = {}
+
+    def _sketch(self, store, key):
+        sketch = store.get(key)
+        if sketch is None:
+            sketch = store[key] = QuantileSketch(self.relative_accuracy)
+        return sketch
+
+    @staticmethod
+    def _arrival(call):
+        return call.on_scene_at or call.completed_at
+
+    def _intervals(self, call, new_status):
+        names = list(INTERVAL_ENDS.get(new_status, ()))
+        if new_status == CallStatus.COMPLETED and call.on_scene_at is None and call.dispatched_at is not None:
+            names += ['travel_time', 'response_time']
+        for name in names:
+            start_attr, end_attr = INTERVALS[name]
+            start = getattr(call, start_attr)
+            end = self._arrival(call) if end_attr == 'on_scene_at' else getattr(call, end_attr)
+            if start is not None and end is not None:
+                yield name, (end - start).total_seconds() / 60, end
+
+    def record_transition(self, call, new_status):
+        """Feed the intervals closed by a call entering new_status"""
+        self._record(call, new_status, call.unit.unit_id if call.unit else None)
+
+    def _record(self, call, new_status, unit_key):
+        with self._lock:
+            for name, minutes, at in self._intervals(call, new_status):
+                self._sketch(self._overall, name).add(minutes)
+                window = self._windows.get(name)
+                if window is None:
+                    window = self._windows[name] = RollingWindow(self.window, relative_accuracy=self.relative_accuracy)
+                window.add(minutes, at)
+                self._sketch(self._by_type, (name, call.emergency_type.value)).add(minutes)
+                if unit_key:
+                    self._sketch(self._by_unit, (name, unit_key)).add(minutes)
+
+    def warm(self, since=None, rollups=None):
+        """Rebuild the sketches after a restart.
+
+        With a RollupStore, only calls logged since `since` (default: the start of
+        the day the rolling window begins in) and calls still open are replayed;
+        the all-time and per-type response times of older calls are seeded from
+        the daily response histograms, so start-up cost does not grow with the
+        history. Without one, every call since `since` is replayed, archived ones
+        included.
+        """
+        if rollups is not None:
+            since = since or datetime.datetime.utcnow() - self.window
+            since = since.replace(hour=0, minute=0, second=0, microsecond=0)
+            self._seed(rollups.response_history(since))
+            self._replay([EmergencyCall.__table__], since, include_open=True)
+        else:
+            self._replay([EmergencyCall.__table__] + [tables.calls for tables in archived_tables(since)], since)
+
+    def _seed(self, history):
+        with self._lock:
+            overall = self._sketch(self._overall, 'response_time')
+            for emergency_type, (values, response_total, response_max) in history.items():
+                seeded = QuantileSketch(self.relative_accuracy)
+                for minutes, count in values:
+                    seeded.add(minutes, count)
+                if seeded.count:
+                    # Exact figures from the rollups rather than the bucket midpoints
+                    seeded.total, seeded.max = response_total, response_max
+                self._sketch(self._by_type, ('response_time', emergency_type.value)).merge(seeded)
+                overall.merge(seeded)
+
+    def _replay(self, tables, since, include_open=False):
+        for calls in tables:
+            # Plain rows with the unit code joined in: no ORM objects, no per-call unit lookups
+            stmt = db.select(
+                calls.c.emergency_type, calls.c.timestamp, calls.c.dispatched_at, calls.c.on_scene_at,
+                calls.c.completed_at, EmergencyUnit.unit_id.label('unit_key')
+            ).outerjoin(EmergencyUnit, calls.c.unit_id == EmergencyUnit.id).where(calls.c.dispatched_at.isnot(None))
+            order = calls.c.id
+            if since is not None:
+                recent = calls.c.timestamp >= since
+                stmt = stmt.where(db.or_(recent, calls.c.status != CallStatus.COMPLETED) if include_open else recent)
+                order = calls.c.id + 0  # search the timestamp index instead of walking every id
+            for call in db.session.execute(stmt.order_by(order).execution_options(yield_per=1000)):
+                for status in (CallStatus.DISPATCHED, CallStatus.ON_SCENE, CallStatus.COMPLETED):
+                    if status == CallStatus.ON_SCENE and call.on_scene_at is None:
+                        continue
+                    if status == CallStatus.COMPLETED and call.completed_at is None:
+                        continue
+                    self._record(call, status, call.unit_key)
+
+    def summary(self, interval='response_time'):
+        """Response time summary in minutes: all-time, rolling window, per type and per unit"""
+        with self._lock:
+            overall = self._overall.get(interval) or QuantileSketch(self.relative_accuracy)
+            window = self._windows.get(interval)
+            result = overall.summary()
+            result['window'] = (window.sketch() if window else QuantileSketch(self.relative_accuracy)).summary()
+            result['window_minutes'] = int(self.window.total_seconds() // 60)
+            result['by_type'] = {key[1]: s.summary() for key, s in self._by_type.items() if key[0] == interval}
+            result['by_unit'] = {key[1]: s.summary() for key, s in self._by_unit.items() if key[0] == interval}
+            return result
+
+    def all_intervals(self):
+        return {name: self.summary(name) for name in INTERVALS}
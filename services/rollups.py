@@ -0,0 +1,408 @@
+"""Hourly and daily statistics rollups of completed calls.
+
+Every call is rolled up exactly once, when it completes, into the period (hour
+and day) it was logged in: `RollupStore.record_completed` upserts the
+increments in the same transaction as the completion. Calls still open are few
+and covered by the partial open-calls index, so readers add them from the live
+table. `backfill` rebuilds a range from the live and archived call tables and
+is safe to re-run. Historical questions ("calls per day by type this year",
+"p90 response last quarter", "which units worked hardest") then read a few
+hundred rollup rows instead of scanning the call history.
+"""
+from models import (CallRollupDaily, CallRollupHourly, CallStatus, EmergencyCall, EmergencyType, EmergencyUnit,
+                    ResponseHistogramDaily, UnitWorkloadDaily, UnitWorkloadMonthly)
+from database import db
+from services.archive import archived_tables
+import bisect
+import collections
+import datetime
+import math
+import threading
+import time
+
+# Upper bounds (minutes) of the response-time histogram buckets; the last one is open-ended
+RESPONSE_BUCKETS = (1, 2, 3, 4, 5, 6, 7, 8, 10, 12, 15, 20, 25, 30, 45, 60, 90, 120, 240, math.inf)
+ROLLUP_COUNTERS = ('calls', 'dispatched', 'dispatch_delay_total', 'responded', 'response_total', 'total_time_total')
+
+
+def floor_hour(timestamp):
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def floor_day(timestamp):
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def floor_month(timestamp):
+    return floor_day(timestamp).replace(day=1)
+
+
+def next_month(timestamp):
+    month = floor_month(timestamp)
+    return month.replace(year=month.year + month.month // 12, month=month.month % 12 + 1)
+
+
+def _minutes(start, end):
+    return (end - start).total_seconds() / 60
+
+
+def contributions(calls):
+    """Rollup increments for completed calls (anything with the EmergencyCall timestamp columns and unit_id)"""
+    periods = {'hourly': {}, 'daily': {}}
+    histogram = collections.Counter()
+    workload = {UnitWorkloadDaily: {}, UnitWorkloadMonthly: {}}
+    for call in calls:
+        day = floor_day(call.timestamp)
+        arrived = call.on_scene_at or call.completed_at
+        # Like ResponseTimeAnalytics: a call closed without a dispatch has no response time
+        response = (_minutes(call.timestamp, arrived)
+                    if arrived is not None and call.dispatched_at is not None else None)
+        for granularity, period in (('hourly', floor_hour(call.timestamp)), ('daily', day)):
+            row = periods[granularity].get((period, call.emergency_type))
+            if row is None:
+                row = periods[granularity][(period, call.emergency_type)] = dict.fromkeys(ROLLUP_COUNTERS, 0)
+                row.update(period_start=period, emergency_type=call.emergency_type, response_max=0)
+            row['calls'] += 1
+            if call.dispatched_at is not None:
+                row['dispatched'] += 1
+                row['dispatch_delay_total'] += _minutes(call.timestamp, call.dispatched_at)
+            if response is not None:
+                row['responded'] += 1
+                row['response_total'] += response
+                row['response_max'] = max(row['response_max'], response)
+            if call.completed_at is not None:
+                row['total_time_total'] += _minutes(call.timestamp, call.completed_at)
+        if response is not None:
+            histogram[(day, call.emergency_type, bisect.bisect_left(RESPONSE_BUCKETS, response))] += 1
+        if call.unit_id is not None:
+            busy = (_minutes(call.dispatched_at, call.completed_at)
+                    if call.dispatched_at is not None and call.completed_at is not None else 0)
+            for model, period in ((UnitWorkloadDaily, day), (UnitWorkloadMonthly, day.replace(day=1))):
+                row = workload[model].get((period, call.unit_id))
+                if row is None:
+                    row = workload[model][(period, call.unit_id)] = {'period_start': period, 'unit_id': call.unit_id,
+                                                                     'calls': 0, 'busy_minutes': 0}
+                row['calls'] += 1
+                row['busy_minutes'] += busy
+    return {
+        CallRollupHourly: list(periods['hourly'].values()),
+        CallRollupDaily: list(periods['daily'].values()),
+        ResponseHistogramDaily: [{'period_start': day, 'emergency_type': emergency_type, 'bucket': bucket,
+                                  'calls': count} for (day, emergency_type, bucket), count in histogram.items()],
+        UnitWorkloadDaily: list(workload[UnitWorkloadDaily].values()),
+        UnitWorkloadMonthly: list(workload[UnitWorkloadMonthly].values())
+    }
+
+
+def _increment(model, rows):
+    """Add rows into model's table (insert, or add the counters to an existing row) in the current transaction"""
+    if not rows:
+        return
+    table = model.__table__
+    keys = [column.name for column in table.primary_key.columns]
+    summed = [name for name in rows[0] if name not in keys and name != 'response_max']
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+            greatest = db.func.greatest
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+            greatest = db.func.max  # SQLite's two-argument max() is a scalar function
+        stmt = insert(table)
+        values = {name: table.c[name] + stmt.excluded[name] for name in summed}
+        if 'response_max' in rows[0]:
+            values['response_max'] = greatest(table.c.response_max, stmt.excluded.response_max)
+        db.session.execute(stmt.on_conflict_do_update(index_elements=keys, set_=values), rows)
+        return
+    for row in rows:
+        match = [table.c[name] == row[name] for name in keys]
+        values = {name: table.c[name] + row[name] for name in summed}
+        if 'response_max' in row:
+            values['response_max'] = db.case((table.c.response_max < row['response_max'], row['response_max']),
+                                             else_=table.c.response_max)
+        if db.session.execute(db.update(table).where(*match).values(values)).rowcount == 0:
+            db.session.execute(db.insert(table).values(row))
+
+
+def _quantile(counts, q, observed_max):
+    """Estimate a quantile from histogram bucket counts by interpolating inside the bucket"""
+    total = sum(counts.values())
+    if not total:
+        return None
+    rank = q * total
+    seen = 0
+    for bucket in sorted(counts):
+        count = counts[bucket]
+        if seen + count >= rank:
+            upper = RESPONSE_BUCKETS[bucket]
+            lower = RESPONSE_BUCKETS[bucket - 1] if bucket else 0
+            if math.isinf(upper):
+                return round(observed_max, 2)
+            return round(min(lower + (upper - lower) * (rank - seen) / count, observed_max), 2)
+        seen += count
+    return round(observed_max, 2)
+
+
+class RollupStore:
+    """Reads and maintains the rollup tables"""
+
+    def __init__(self, context_ttl=5.0):
+        self.context_ttl = context_ttl
+        self._context = {}  # (emergency_type, day) -> (expires, dispatch_context() result)
+        self._context_lock = threading.Lock()
+
+    # Maintenance -------------------------------------------------------------
+
+    def record_completed(self, calls):
+        """Roll up calls that just completed; part of the caller's transaction"""
+        for model, rows in contributions(calls).items():
+            _increment(model, rows)
+        with self._context_lock:
+            self._context.clear()
+
+    def backfill(self, since=None, until=None):
+        """Rebuild the rollups of calls logged in the months overlapping [since, until) (default: all
+        history), one month per transaction; returns the number of calls rolled up"""
+        if since is None:
+            since = self._oldest_call()
+            if since is None:
+                return 0
+        until = until or datetime.datetime.utcnow()
+        start, end = floor_month(since), next_month(until - datetime.timedelta(microseconds=1))
+        rolled = 0
+        while start < end:
+            chunk_end = next_month(start)
+            try:
+                rolled += self._rebuild(start, chunk_end)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            start = chunk_end
+        return rolled
+
+    @staticmethod
+    def _oldest_call():
+        oldest = [db.session.execute(db.select(db.func.min(EmergencyCall.timestamp))).scalar()]
+        oldest += [db.session.execute(db.select(db.func.min(tables.calls.c.timestamp))).scalar()
+                   for tables in archived_tables()[:1]]
+        oldest = [timestamp for timestamp in oldest if timestamp is not None]
+        return min(oldest) if oldest else None
+
+    def _rebuild(self, start, end):
+        for model in (CallRollupHourly, CallRollupDaily, ResponseHistogramDaily, UnitWorkloadDaily,
+                      UnitWorkloadMonthly):
+            db.session.execute(db.delete(model).where(model.period_start >= start, model.period_start < end))
+        calls = []
+        for table in [EmergencyCall.__table__] + [tables.calls for tables in archived_tables(start, end)]:
+            calls.extend(db.session.execute(
+                db.select(table.c.timestamp, table.c.emergency_type, table.c.dispatched_at, table.c.on_scene_at,
+                          table.c.completed_at, table.c.unit_id)
+                .where(table.c.status == CallStatus.COMPLETED, table.c.timestamp >= start, table.c.timestamp < end)
+            ).all())
+        self.record_completed(calls)
+        return len(calls)
+
+    # Reads -------------------------------------------------------------------
+
+    @staticmethod
+    def _type_filter(stmt, model, emergency_type):
+        return stmt if emergency_type is None else stmt.where(model.emergency_type == emergency_type)
+
+    def series(self, since, until, granularity='day', emergency_type=None):
+        """Per-period completed-call aggregates: [{'period', 'calls', 'by_type', 'response_average', ...}]"""
+        model = CallRollupDaily if granularity == 'day' else CallRollupHourly
+        floor = floor_day if granularity == 'day' else floor_hour
+        stmt = self._type_filter(
+            db.select(model.period_start, model.emergency_type, model.calls, model.dispatched, model.responded,
+                      model.response_total, model.response_max)
+            .where(model.period_start >= floor(since), model.period_start < until), model, emergency_type)
+        periods = collections.OrderedDict()
+        for row in db.session.execute(stmt.order_by(model.period_start)):
+            period = periods.get(row.period_start)
+            if period is None:
+                period = periods[row.period_start] = {'calls': 0, 'dispatched': 0, 'responded': 0,
+                                                      'response_total': 0.0, 'response_max': 0.0, 'by_type': {}}
+            period['by_type'][row.emergency_type.value] = row.calls
+            for name in ('calls', 'dispatched', 'responded', 'response_total'):
+                period[name] += getattr(row, name)
+            period['response_max'] = max(period['response_max'], row.response_max)
+        return [{
+            'period': period_start.isoformat(),
+            'calls': period['calls'],
+            'dispatched': period['dispatched'],
+            'by_type': period['by_type'],
+            'response_average': round(period['response_total'] / period['responded'], 2) if period['responded']
+            else None,
+            'response_max': round(period['response_max'], 2) if period['responded'] else None
+        } for period_start, period in periods.items()]
+
+    def summary(self, since=None, until=None, emergency_type=None):
+        """Totals over a range from the daily rollups, plus the still-open calls logged in it"""
+        until = until or datetime.datetime.utcnow() + datetime.timedelta(days=1)
+        since_day = floor_day(since) if since is not None else datetime.datetime.min
+
+        def in_range(model):
+            return (model.period_start >= since_day, model.period_start < until)
+
+        totals = db.session.execute(self._type_filter(
+            db.select(*[db.func.coalesce(db.func.sum(getattr(CallRollupDaily, name)), 0) for name in ROLLUP_COUNTERS],
+                      db.func.coalesce(db.func.max(CallRollupDaily.response_max), 0))
+            .where(*in_range(CallRollupDaily)), CallRollupDaily, emergency_type)).one()
+        by_type = dict(db.session.execute(self._type_filter(
+            db.select(CallRollupDaily.emergency_type, db.func.sum(CallRollupDaily.calls))
+            .where(*in_range(CallRollupDaily)).group_by(CallRollupDaily.emergency_type),
+            CallRollupDaily, emergency_type)).all())
+        buckets = dict(db.session.execute(self._type_filter(
+            db.select(ResponseHistogramDaily.bucket, db.func.sum(ResponseHistogramDaily.calls))
+            .where(*in_range(ResponseHistogramDaily)).group_by(ResponseHistogramDaily.bucket),
+            ResponseHistogramDaily, emergency_type)).all())
+
+        open_stmt = db.select(EmergencyCall.emergency_type, db.func.count()).where(
+            EmergencyCall.status != CallStatus.COMPLETED).group_by(EmergencyCall.emergency_type)
+        if since is not None:
+            open_stmt = open_stmt.where(EmergencyCall.timestamp >= since)
+        open_stmt = self._type_filter(open_stmt.where(EmergencyCall.timestamp < until), EmergencyCall, emergency_type)
+        open_calls = dict(db.session.execute(open_stmt).all())
+
+        calls, dispatched, dispatch_delay, responded, response_total, total_time, response_max = totals
+        return {
+            'since': since.isoformat() if since is not None else None,
+            'until': until.isoformat(),
+            'completed_calls': calls,
+            'completed_by_type': {t.value: by_type.get(t, 0) for t in EmergencyType if emergency_type in (None, t)},
+            'open_calls': sum(open_calls.values()),
+            'open_by_type': {t.value: open_calls.get(t, 0) for t in EmergencyType if emergency_type in (None, t)},
+            'dispatch_delay_average': round(dispatch_delay / dispatched, 2) if dispatched else None,
+            'total_time_average': round(total_time / calls, 2) if calls else None,
+            'response_times': {
+                'count': responded,
+                'average': round(response_total / responded, 2) if responded else None,
+                'median': _quantile(buckets, 0.5, response_max),
+                'p90': _quantile(buckets, 0.9, response_max),
+                'p99': _quantile(buckets, 0.99, response_max),
+                'max': round(response_max, 2) if responded else None
+            }
+        }
+
+    @staticmethod
+    def _workload_ranges(since, until):
+        """(model, start, end) pieces covering [since, until): whole months from the monthly table, the ragged
+        ends from the daily one"""
+        start = floor_day(since) if since is not None else None
+        end = until
+        first_month = next_month(start - datetime.timedelta(microseconds=1)) if start is not None else None
+        last_month = floor_month(end) if end is not None else None
+        if first_month is not None and last_month is not None and first_month >= last_month:
+            return [(UnitWorkloadDaily, start, end)]
+        ranges = [(UnitWorkloadMonthly, first_month, last_month)]
+        if start is not None and start < first_month:
+            ranges.append((UnitWorkloadDaily, start, first_month))
+        if end is not None:
+            ranges.append((UnitWorkloadDaily, last_month, end))
+        return ranges
+
+    def _workload(self, since, until, executor, service_type=None):
+        """{unit pk: [calls, busy minutes]} of completed calls over [since, until)"""
+        totals = {}
+        for model, start, end in self._workload_ranges(since, until):
+            stmt = (db.select(model.unit_id, db.func.sum(model.calls), db.func.sum(model.busy_minutes))
+                    .group_by(model.unit_id))
+            if start is not None:
+                stmt = stmt.where(model.period_start >= start)
+            if end is not None:
+                stmt = stmt.where(model.period_start < end)
+            if service_type is not None:
+                stmt = stmt.where(model.unit_id.in_(
+                    db.select(EmergencyUnit.id).where(EmergencyUnit.service_type == service_type)))
+            for unit_pk, calls, busy in executor.execute(stmt):
+                total = totals.setdefault(unit_pk, [0, 0.0])
+                total[0] += calls
+                total[1] += busy
+        return totals
+
+    def unit_workload(self, since=None, until=None, service_type=None, limit=None):
+        """{unit code: {'calls', 'busy_minutes'}} of completed calls handled, busiest first"""
+        totals = self._workload(since, until, db.session, service_type)
+        codes = dict(db.session.execute(
+            db.select(EmergencyUnit.id, EmergencyUnit.unit_id).where(EmergencyUnit.id.in_(list(totals)))).all())
+        ranked = sorted(((codes[unit_pk], calls, busy) for unit_pk, (calls, busy) in totals.items()
+                         if unit_pk in codes), key=lambda item: (-item[1], item[0]))
+        return {unit_id: {'calls': calls, 'busy_minutes': round(busy, 1)} for unit_id, calls, busy in ranked[:limit]}
+
+    def handled_by_unit(self, since, connection=None):
+        """{unit pk: calls} handled since a time: completed ones from the rollups, open ones from the live table"""
+        executor = connection if connection is not None else db.session
+        handled = collections.Counter({unit_pk: calls for unit_pk, (calls, _) in
+                                       self._workload(since, None, executor).items()})
+        handled.update(dict(executor.execute(
+            db.select(EmergencyCall.unit_id, db.func.count())
+            .where(EmergencyCall.status != CallStatus.COMPLETED, EmergencyCall.timestamp >= since,
+                   EmergencyCall.unit_id.isnot(None))
+            .group_by(EmergencyCall.unit_id)).all()))
+        return handled
+
+    def periods(self, since, granularity, connection=None):
+        """{period label: {EmergencyType: calls, 'completed': n}} in the ReportEngine's layout"""
+        executor = connection if connection is not None else db.session
+        model, floor, label = ((CallRollupDaily, floor_day, '%Y-%m-%d') if granularity == 'day'
+                               else (CallRollupHourly, floor_hour, '%Y-%m-%d %H:00'))
+        periods = collections.defaultdict(lambda: dict.fromkeys(list(EmergencyType) + ['completed'], 0))
+        for period_start, emergency_type, calls in executor.execute(
+                db.select(model.period_start, model.emergency_type, model.calls)
+                .where(model.period_start >= floor(since))):
+            period = periods[period_start.strftime(label)]
+            period[emergency_type] += calls
+            period['completed'] += calls
+        for timestamp, emergency_type in executor.execute(
+                db.select(EmergencyCall.timestamp, EmergencyCall.emergency_type)
+                .where(EmergencyCall.status != CallStatus.COMPLETED, EmergencyCall.timestamp >= since)):
+            periods[timestamp.strftime(label)][emergency_type] += 1
+        return periods
+
+    def response_history(self, until):
+        """{emergency type: ([(minutes, calls)], response total, response max)} of the completed calls logged
+        before a day, read from the daily response histograms (each bucket stands at its midpoint)"""
+        totals = {emergency_type: (responded, response_total, response_max) for
+                  emergency_type, responded, response_total, response_max in db.session.execute(
+                      db.select(CallRollupDaily.emergency_type, db.func.sum(CallRollupDaily.responded),
+                                db.func.sum(CallRollupDaily.response_total), db.func.max(CallRollupDaily.response_max))
+                      .where(CallRollupDaily.period_start < until).group_by(CallRollupDaily.emergency_type))}
+        history = {}
+        for emergency_type, bucket, calls in db.session.execute(
+                db.select(ResponseHistogramDaily.emergency_type, ResponseHistogramDaily.bucket,
+                          db.func.sum(ResponseHistogramDaily.calls))
+                .where(ResponseHistogramDaily.period_start < until)
+                .group_by(ResponseHistogramDaily.emergency_type, ResponseHistogramDaily.bucket)):
+            _, response_total, response_max = totals.get(emergency_type, (0, 0.0, 0.0))
+            lower = RESPONSE_BUCKETS[bucket - 1] if bucket else 0
+            upper = min(RESPONSE_BUCKETS[bucket], max(response_max, lower))
+            entry = history.setdefault(emergency_type, ([], response_total, response_max))
+            entry[0].append(((lower + upper) / 2, calls))
+        return history
+
+    def dispatch_context(self, emergency_type, now=None):
+        """(today's response summary for a type, today's completed calls per unit of that type) for DispatchCommand.
+
+        Kept in memory for `context_ttl` seconds (dropped early by local completions),
+        so a dispatch normally runs no rollup queries at all.
+        """
+        day = floor_day(now or datetime.datetime.utcnow())
+        with self._context_lock:
+            cached = self._context.get((emergency_type, day))
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+        row = db.session.get(CallRollupDaily, (day, emergency_type))
+        response_times = {
+            'day': day.date().isoformat(),
+            'completed_calls': row.calls if row else 0,
+            'response_average': round(row.response_total / row.responded, 2) if row and row.responded else None,
+            'response_max': round(row.response_max, 2) if row and row.responded else None
+        }
+        workload = {unit_id: usage['calls'] for unit_id, usage in
+                    self.unit_workload(since=day, service_type=emergency_type).items()}
+        with self._context_lock:
+            self._context = {key: value for key, value in self._context.items() if key[1] == day}
+            self._context[(emergency_type, day)] = (time.monotonic() + self.context_ttl, (response_times, workload))
+        return response_times, workload
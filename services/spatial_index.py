@@ -0,0 +1,134 @@
+import heapq
+import math
+import threading
+
+KM_PER_DEGREE_LAT = 110.574
+KM_PER_DEGREE_LON = 111.320
+
+
+class SpatialIndex:
+    """Uniform grid index of available unit positions, bucketed per service type.
+
+    Positions are projected onto a local equirectangular plane (kilometres) around
+    a reference latitude, which is accurate enough for ranking units within a
+    dispatch region. Each service type keeps its own sparse grid so a query only
+    ever touches units that could actually be dispatched to the call.
+    """
+
+    def __init__(self, cell_km=2.0, reference_latitude=45.75):
+        self.cell_km = cell_km
+        self._lon_scale = KM_PER_DEGREE_LON * math.cos(math.radians(reference_latitude))
+        self._grids = {}      # service_type -> {(cx, cy): {unit_pk: (x, y)}}
+        self._entries = {}    # unit_pk -> (service_type, cell, x, y)
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, unit_pk):
+        return unit_pk in self._entries
+
+    def project(self, latitude, longitude):
+        """Project a coordinate onto the local plane in kilometres"""
+        return longitude * self._lon_scale, latitude * KM_PER_DEGREE_LAT
+
+    def _cell(self, x, y):
+        return int(math.floor(x / self.cell_km)), int(math.floor(y / self.cell_km))
+
+    def insert(self, unit_pk, service_type, latitude, longitude):
+        """Add a unit to the index, replacing any previous entry"""
+        x, y = self.project(latitude, longitude)
+        self.insert_point(unit_pk, service_type, x, y)
+
+    def insert_point(self, unit_pk, service_type, x, y):
+        """Add an entry by its already projected plane coordinates"""
+        cell = self._cell(x, y)
+        with self._lock:
+            self._discard(unit_pk)
+            self._grids.setdefault(service_type, {}).setdefault(cell, {})[unit_pk] = (x, y)
+            self._entries[unit_pk] = (service_type, cell, x, y)
+
+    def remove(self, unit_pk):
+        """Drop a unit from the index; unknown units are ignored"""
+        with self._lock:
+            self._discard(unit_pk)
+
+    def _discard(self, unit_pk):
+        entry = self._entries.pop(unit_pk, None)
+        if entry is None:
+            return
+        service_type, cell, _, _ = entry
+        grid = self._grids[service_type]
+        bucket = grid[cell]
+        del bucket[unit_pk]
+        if not bucket:
+            del grid[cell]
+
+    def count(self, service_type=None):
+        """Number of indexed units, optionally restricted to one service type"""
+        with self._lock:
+            if service_type is None:
+                return len(self._entries)
+            return sum(len(bucket) for bucket in self._grids.get(service_type, {}).values())
+
+    def nearest(self, service_type, latitude, longitude, k=1):
+        """Return up to k (distance_km, unit_pk) pairs closest to the given point"""
+        qx, qy = self.project(latitude, longitude)
+        return self.nearest_point(service_type, qx, qy, k)
+
+    def nearest_point(self, service_type, qx, qy, k=1):
+        """Like nearest(), for a point already projected onto the plane"""
+        with self._lock:
+            grid = self._grids.get(service_type)
+            if not grid or k <= 0:
+                return []
+            qcx, qcy = self._cell(qx, qy)
+            best = []  # max-heap of (-distance, unit_pk)
+            ring = 0
+            while True:
+                # Walking rings costs 8 * ring cells; once that exceeds the number of
+                # occupied cells a direct pass over the sparse grid is cheaper.
+                if ring > 0 and 8 * ring > len(grid):
+                    best.clear()
+                    self._scan(grid.values(), qx, qy, k, best)
+                    break
+                for cell in self._ring_cells(qcx, qcy, ring):
+                    bucket = grid.get(cell)
+                    if bucket:
+                        self._scan((bucket,), qx, qy, k, best)
+                # Anything outside the rings visited so far is at least ring * cell_km away.
+                if len(best) == k and -best[0][0] <= ring * self.cell_km:
+                    break
+                ring += 1
+            return sorted((-negative, unit_pk) for negative, unit_pk in best)
+
+    @staticmethod
+    def _scan(buckets, qx, qy, k, best):
+        for bucket in buckets:
+            for unit_pk, (x, y) in bucket.items():
+                distance = math.hypot(x - qx, y - qy)
+                if len(best) < k:
+                    heapq.heappush(best, (-distance, unit_pk))
+                elif distance < -best[0][0]:
+                    heapq.heapreplace(best, (-distance, unit_pk))
+
+    @staticmethod
+    def _ring_cells(cx, cy, ring):
+        if ring == 0:
+            yield cx, cy
+            return
+        for dx in range(-ring, ring + 1):
+            yield cx + dx, cy - ring
+            yield cx + dx, cy + ring
+        for dy in range(-ring + 1, ring):
+            yield cx - ring, cy + dy
+            yield cx + ring, cy + dy
+
+    def rebuild(self, units):
+        """Reload the index from an iterable of available EmergencyUnit rows"""
+        with self._lock:
+            self._grids.clear()
+            self._entries.clear()
+            for unit in units:
+                if unit.availability_status and unit.latitude is not None and unit.longitude is not None:
+                    self.insert(unit.id, unit.service_type, unit.latitude, unit.longitude)
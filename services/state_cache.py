@@ -0,0 +1,156 @@
+from models import EmergencyCall, EmergencyUnit, CallStatus
+import collections
+import threading
+
+UnitView = collections.namedtuple(
+    'UnitView', 'id unit_id service_type availability_status latitude longitude last_update'
+)
+CallView = collections.namedtuple(
+    'CallView', 'id caller_name phone_number location emergency_type status timestamp '
+                'latitude longitude unit_pk unit'
+)
+
+
+def unit_view(unit):
+    return UnitView(unit.id, unit.unit_id, unit.service_type, unit.availability_status,
+                    unit.latitude, unit.longitude, unit.last_update)
+
+
+class HotStateCache:
+    """Write-through cache of open calls and the unit roster.
+
+    Entries are immutable snapshots (named tuples), not ORM objects, so they can
+    be shared between request threads and handed to templates directly. The
+    dispatch service writes every mutation through after its commit; reads never
+    touch the database except for calls that are neither open nor among the
+    `completed_capacity` most recently completed ones.
+    """
+
+    def __init__(self, completed_capacity=1000):
+        self.completed_capacity = completed_capacity
+        self._lock = threading.RLock()
+        self._active = {}
+        self._completed = collections.OrderedDict()
+        self._units = {}
+        self._unit_calls = {}  # unit pk -> id of the open call it is assigned to
+        self._stats = collections.Counter()
+
+    def load(self):
+        """Fill the cache from the database (startup / resync)"""
+        units = {unit.id: unit_view(unit) for unit in EmergencyUnit.query.all()}
+        active_calls = EmergencyCall.query.filter(EmergencyCall.status != CallStatus.COMPLETED).all()
+        with self._lock:
+            self._units = units
+            self._active = {}
+            self._unit_calls = {}
+            self._completed.clear()
+            for call in active_calls:
+                self._store_active(self._call_view(call))
+
+    def _call_view(self, call):
+        unit = self._units.get(call.unit_id) if call.unit_id is not None else None
+        return CallView(call.id, call.caller_name, call.phone_number, call.location, call.emergency_type,
+                        call.status, call.timestamp, call.latitude, call.longitude, call.unit_id, unit)
+
+    def _store_active(self, view):
+        self._active[view.id] = view
+        if view.unit_pk is not None:
+            self._unit_calls[view.unit_pk] = view.id
+
+    def _store(self, view):
+        if view.status == CallStatus.COMPLETED:
+            self._active.pop(view.id, None)
+            if view.unit_pk is not None and self._unit_calls.get(view.unit_pk) == view.id:
+                del self._unit_calls[view.unit_pk]
+            self._remember_completed(view)
+        else:
+            self._store_active(view)
+
+    # Write-through -------------------------------------------------------
+
+    def put_call(self, call):
+        with self._lock:
+            self._store(self._call_view(call))
+
+    def put_calls(self, views):
+        """Insert pre-built CallView records (bulk intake)"""
+        with self._lock:
+            for view in views:
+                self._store(view)
+
+    def put_unit(self, unit):
+        with self._lock:
+            self._store_unit(unit_view(unit))
+
+    def move_unit(self, unit_pk, latitude, longitude, at):
+        """Update a cached unit's position (telemetry); unknown units are ignored"""
+        with self._lock:
+            view = self._units.get(unit_pk)
+            if view is not None:
+                self._store_unit(view._replace(latitude=latitude, longitude=longitude, last_update=at))
+
+    def _store_unit(self, view):
+        self._units[view.id] = view
+        # Keep the unit shown on its open call in step with the roster
+        call_id = self._unit_calls.get(view.id)
+        if call_id in self._active:
+            self._active[call_id] = self._active[call_id]._replace(unit=view)
+
+    def _remember_completed(self, view):
+        self._completed[view.id] = view
+        self._completed.move_to_end(view.id)
+        while len(self._completed) > self.completed_capacity:
+            self._completed.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    # Reads -----------------------------------------------------------------
+
+    def active_calls(self):
+        with self._lock:
+            self._stats['active_calls.hits'] += 1
+            return [self._active[call_id] for call_id in sorted(self._active)]
+
+    def all_units(self):
+        with self._lock:
+            self._stats['units.hits'] += 1
+            return [self._units[unit_pk] for unit_pk in sorted(self._units)]
+
+    def available_units(self, service_type=None):
+        with self._lock:
+            self._stats['units.hits'] += 1
+            return [unit for unit_pk, unit in sorted(self._units.items())
+                    if unit.availability_status and (service_type is None or unit.service_type == service_type)]
+
+    def get_call(self, call_id):
+        """Snapshot of a call, falling back to the database on a miss; None if it does not exist"""
+        with self._lock:
+            view = self._active.get(call_id)
+            if view is None and call_id in self._completed:
+                view = self._completed[call_id]
+                self._completed.move_to_end(call_id)
+            if view is not None:
+                self._stats['calls.hits'] += 1
+                return view
+            self._stats['calls.misses'] += 1
+        call = EmergencyCall.query.get(call_id)
+        if call is None:
+            return None
+        with self._lock:
+            view = self._call_view(call)
+            self._store(view)
+            return view
+
+    def metrics(self):
+        with self._lock:
+            hits = sum(count for key, count in self._stats.items() if key.endswith('.hits'))
+            misses = sum(count for key, count in self._stats.items() if key.endswith('.misses'))
+            return {
+                'active_calls': len(self._active),
+                'units': len(self._units),
+                'recent_completed': len(self._completed),
+                'hits': hits,
+                'misses': misses,
+                'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else None,
+                'evictions': self._stats['evictions'],
+                'by_operation': {key: count for key, count in self._stats.items() if key != 'evictions'}
+            }
@@ -0,0 +1,183 @@
+"""Unit telemetry: batched GPS / status pings, coalesced in memory and written to the database on an interval.
+
+A fleet reporting every few seconds would otherwise mean one commit per ping.
+`TelemetryPipeline.ingest` keeps only the newest reading per unit and moves the
+unit in the in-memory views (fleet snapshot, spatial index, hot state cache)
+straight away, so dispatch selection and the dashboard always see the latest
+position. `flush` writes whatever accumulated since the last flush through the
+dispatch service, one transaction per max_batch units: one bulk UPDATE for the
+positions plus two guarded UPDATEs for availability changes.
+"""
+from database import db
+from services.instrumentation import metrics
+import collections
+import datetime
+import threading
+import time
+
+metrics.describe('telemetry_readings_total', 'Telemetry readings by outcome')
+metrics.describe('telemetry_flush_seconds', 'Time to write one coalesced telemetry batch')
+
+# Newest known values for one unit; either half may be missing (None)
+Reading = collections.namedtuple('Reading', 'latitude longitude position_at available status_at')
+
+
+def merge(older, newer):
+    """Field-wise newest of two readings for the same unit"""
+    if older is None:
+        return newer
+    position = newer if newer.position_at is not None and (
+        older.position_at is None or newer.position_at >= older.position_at) else older
+    status = newer if newer.status_at is not None and (
+        older.status_at is None or newer.status_at >= older.status_at) else older
+    return Reading(position.latitude, position.longitude, position.position_at, status.available, status.status_at)
+
+
+class TelemetryPipeline:
+    """Coalescing buffer between the telemetry endpoint and the database, flushed by a background thread"""
+
+    def __init__(self, app, service, interval=1.0, max_batch=10000):
+        self.app = app
+        self.service = service
+        self.interval = interval
+        self.max_batch = max_batch
+        self.last_flush = None
+        self._pending = {}  # unit pk -> Reading not yet written
+        self._flushing = {}  # readings being written by the current flush
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stats = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _parse(self, update, now):
+        unit = update.get('unit_id')
+        unit_pk = unit if isinstance(unit, int) and unit in self.service.fleet else self.service.fleet.lookup(unit)
+        if unit_pk is None:
+            raise ValueError(f"Unknown unit {unit!r}")
+        recorded_at = update.get('timestamp')
+        recorded_at = datetime.datetime.fromisoformat(recorded_at) if recorded_at else now
+        if recorded_at.tzinfo is not None:
+            recorded_at = recorded_at.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        latitude, longitude = update.get('latitude'), update.get('longitude')
+        if (latitude is None) != (longitude is None):
+            raise ValueError("latitude and longitude must be sent together")
+        if latitude is not None:
+            latitude, longitude = float(latitude), float(longitude)
+            if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+                raise ValueError("Coordinates out of range")
+        available = update.get('available')
+        if available is not None and not isinstance(available, bool):
+            raise ValueError("available must be true or false")
+        if latitude is None and available is None:
+            raise ValueError("Nothing to update: send a position and/or available")
+        return unit_pk, Reading(latitude, longitude, recorded_at if latitude is not None else None,
+                                available, recorded_at if available is not None else None)
+
+    def ingest(self, updates, now=None):
+        """Buffer a batch of {unit_id, latitude, longitude, available, timestamp} updates.
+
+        unit_id is the unit's primary key or its code. Returns counts of
+        accepted, rejected and superseded readings plus per-item errors.
+        """
+        now = now or datetime.datetime.utcnow()
+        readings = {}
+        errors = []
+        for index, update in enumerate(updates):
+            try:
+                unit_pk, reading = self._parse(update, now)
+            except (AttributeError, TypeError, ValueError) as e:
+                errors.append({'index': index, 'error': str(e)})
+                continue
+            readings[unit_pk] = merge(readings.get(unit_pk), reading)
+        moved = {}
+        with self._lock:
+            for unit_pk, reading in readings.items():
+                current = self._pending.get(unit_pk) or self._flushing.get(unit_pk)
+                merged = merge(current, reading)
+                self._pending[unit_pk] = merged
+                if reading.position_at is not None and merged.position_at == reading.position_at:
+                    moved[unit_pk] = merged
+            self._stats['accepted'] += len(updates) - len(errors)
+            self._stats['rejected'] += len(errors)
+        self.service.track_unit_positions(moved)
+        superseded = len(updates) - len(errors) - len(readings)
+        metrics.inc('telemetry_readings_total', len(updates) - len(errors), outcome='accepted')
+        if errors:
+            metrics.inc('telemetry_readings_total', len(errors), outcome='rejected')
+        return {'accepted': len(updates) - len(errors), 'units': len(readings), 'superseded': superseded,
+                'rejected': len(errors), 'errors': errors[:100]}
+
+    def latest(self, unit_pk):
+        """The buffered (not yet written) reading of a unit, or None"""
+        with self._lock:
+            return self._pending.get(unit_pk) or self._flushing.get(unit_pk)
+
+    def flush(self):
+        """Write buffered readings, max_batch units per transaction; returns a summary"""
+        started = time.perf_counter()
+        totals = collections.Counter(positions=0, went_available=0, went_unavailable=0)
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    if not self._pending:
+                        break
+                    batch = dict(list(self._pending.items())[:self.max_batch])
+                    for unit_pk in batch:
+                        del self._pending[unit_pk]
+                    self._flushing = batch
+                try:
+                    totals.update(self.service.apply_unit_telemetry(batch))
+                except Exception:
+                    with self._lock:
+                        # Put the batch back under anything newer that arrived meanwhile
+                        for unit_pk, reading in batch.items():
+                            self._pending[unit_pk] = merge(reading, self._pending.get(unit_pk) or reading)
+                    raise
+                finally:
+                    with self._lock:
+                        self._flushing = {}
+        elapsed = time.perf_counter() - started
+        if totals['positions'] or totals['went_available'] or totals['went_unavailable']:
+            metrics.observe('telemetry_flush_seconds', elapsed)
+        self.last_flush = dict(totals, seconds=round(elapsed, 4), at=datetime.datetime.utcnow().isoformat())
+        return self.last_flush
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pending_units': len(self._pending),
+                'accepted': self._stats['accepted'],
+                'rejected': self._stats['rejected'],
+                'interval': self.interval,
+                'running': self.running,
+                'last_flush': self.last_flush
+            }
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='telemetry-flush', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with self.app.app_context():
+                try:
+                    self.flush()
+                except Exception:
+                    db.session.rollback()
+                    self.app.logger.exception("Telemetry flush failed")
+                finally:
+                    db.session.remove()
@@ -1,20 +1,126 @@
-from models import CallStatus
+from models import CallStatus, CallTransition, EmergencyCall, EmergencyUnit
+from database import db
+from services.instrumentation import instrumented
+from sqlalchemy.orm.attributes import set_committed_value
+import collections
+import datetime
+
+# Column on EmergencyCall stamped when a call enters each state
+STATUS_TIMESTAMPS = {
+    CallStatus.DISPATCHED: 'dispatched_at',
+    CallStatus.EN_ROUTE: 'en_route_at',
+    CallStatus.ON_SCENE: 'on_scene_at',
+    CallStatus.COMPLETED: 'completed_at',
+}
+
+# Built once and shared: state -> states it may move to. A call can be closed
+# (COMPLETED) from any open state.
+TRANSITIONS = {
+    CallStatus.LOGGED: frozenset({CallStatus.DISPATCHED, CallStatus.COMPLETED}),
+    CallStatus.DISPATCHED: frozenset({CallStatus.EN_ROUTE, CallStatus.COMPLETED}),
+    CallStatus.EN_ROUTE: frozenset({CallStatus.ON_SCENE, CallStatus.COMPLETED}),
+    CallStatus.ON_SCENE: frozenset({CallStatus.COMPLETED}),
+    CallStatus.COMPLETED: frozenset(),
+}
+# Inverse table: target state -> states a call may be in to enter it
+SOURCES = {status: frozenset(old for old, targets in TRANSITIONS.items() if status in targets)
+           for status in CallStatus}
+
+BulkResult = collections.namedtuple('BulkResult', 'changes freed_unit_ids')
+
+
+def can_transition(old_status, new_status):
+    return new_status in TRANSITIONS.get(old_status, ())
+
 
 class CallStateMachine:
     def __init__(self, call):
         self.call = call
 
-    def transition(self, new_status):
-        valid_transitions = {
-            CallStatus.LOGGED: [CallStatus.DISPATCHED],
-            CallStatus.DISPATCHED: [CallStatus.EN_ROUTE],
-            CallStatus.EN_ROUTE: [CallStatus.ON_SCENE],
-            CallStatus.ON_SCENE: [CallStatus.COMPLETED],
-        }
-        # Allow transition to COMPLETED from any state except COMPLETED itself
-        if new_status == CallStatus.COMPLETED and self.call.status != CallStatus.COMPLETED:
-            self.call.status = new_status
-        elif new_status in valid_transitions.get(self.call.status, []):
-            self.call.status = new_status
-        else:
-            raise ValueError(f"Invalid transition from {self.call.status} to {new_status}")
\ No newline at end of file
+    @instrumented('state_machine')
+    def transition(self, new_status, now=None):
+        """Move the call to new_status and queue its audit row in the current session.
+
+        The UPDATE is guarded on the states new_status may be entered from, like
+        transition_many, so of two concurrent changes only one applies; the other
+        raises ValueError and its caller rolls back.
+        """
+        old_status = self.call.status
+        if not can_transition(old_status, new_status):
+            raise ValueError(f"Invalid transition from {old_status} to {new_status}")
+        now = now or datetime.datetime.utcnow()
+        timestamp_column = STATUS_TIMESTAMPS[new_status]
+        result = db.session.execute(
+            db.update(EmergencyCall)
+            .where(EmergencyCall.id == self.call.id, EmergencyCall.status.in_(SOURCES[new_status]))
+            .values({'status': new_status, timestamp_column: now})
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            raise ValueError(f"Call {self.call.id} changed status concurrently while moving to {new_status}")
+        set_committed_value(self.call, 'status', new_status)
+        set_committed_value(self.call, timestamp_column, now)
+        unit_id = self.call.unit.id if self.call.unit is not None else None
+        db.session.add(CallTransition(call_id=self.call.id, unit_id=unit_id, from_status=old_status,
+                                      to_status=new_status, timestamp=now))
+
+    @staticmethod
+    @instrumented('state_machine')
+    def transition_many(changes, now=None):
+        """Validate and apply {call_id: new_status} in the current transaction.
+
+        Issues one UPDATE per target state (guarded on the states it may come
+        from, so a concurrent change makes it fail rather than skip a call),
+        frees the units of completed calls with one more UPDATE and writes the
+        audit rows with a single multi-row INSERT. Nothing is applied if any
+        change is invalid. The caller commits.
+
+        Returns BulkResult(changes=[(call_id, unit_id, old, new)], freed_unit_ids).
+        """
+        if not changes:
+            return BulkResult([], [])
+        now = now or datetime.datetime.utcnow()
+        current = {call_id: (status, unit_id) for call_id, status, unit_id in db.session.execute(
+            db.select(EmergencyCall.id, EmergencyCall.status, EmergencyCall.unit_id)
+            .where(EmergencyCall.id.in_(list(changes)))
+        )}
+        missing = sorted(set(changes) - set(current))
+        if missing:
+            raise ValueError(f"Calls not found: {missing}")
+        invalid = [f"{call_id}: {current[call_id][0].value} to {new_status.value}"
+                   for call_id, new_status in changes.items() if not can_transition(current[call_id][0], new_status)]
+        if invalid:
+            raise ValueError(f"Invalid transitions: {', '.join(invalid)}")
+
+        by_target = collections.defaultdict(list)
+        for call_id, new_status in changes.items():
+            by_target[new_status].append(call_id)
+        for new_status, call_ids in by_target.items():
+            result = db.session.execute(
+                db.update(EmergencyCall)
+                .where(EmergencyCall.id.in_(call_ids), EmergencyCall.status.in_(SOURCES[new_status]))
+                .values({'status': new_status, STATUS_TIMESTAMPS[new_status]: now})
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount != len(call_ids):
+                raise ValueError(f"Calls changed status concurrently while moving to {new_status}")
+
+        freed_unit_ids = []
+        closing_units = {current[call_id][1] for call_id in by_target.get(CallStatus.COMPLETED, ())} - {None}
+        if closing_units:
+            freed_unit_ids = list(db.session.execute(
+                db.update(EmergencyUnit)
+                .where(EmergencyUnit.id.in_(closing_units), EmergencyUnit.availability_status.is_(False))
+                .values(availability_status=True, last_update=now)
+                .returning(EmergencyUnit.id)
+                .execution_options(synchronize_session=False)
+            ).scalars())
+
+        applied = [(call_id, current[call_id][1], current[call_id][0], new_status)
+                   for call_id, new_status in changes.items()]
+        db.session.execute(db.insert(CallTransition), [
+            {'call_id': call_id, 'unit_id': unit_id, 'from_status': old_status, 'to_status': new_status,
+             'timestamp': now}
+            for call_id, unit_id, old_status, new_status in applied
+        ])
+        return BulkResult(applied, freed_unit_ids)